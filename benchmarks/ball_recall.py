@@ -0,0 +1,93 @@
+"""
+Мяч: полнокадровая детекция против BallTracker (окно + обход плитками).
+
+Детектор мяча — StubBallDetector (см. benchmarks/synthetic.py): ищет мяч по
+пикселям после ресайза входа до imgsz, поэтому мелкий мяч на полном кадре
+теряется так же, как у настоящей модели. Три режима на одном ролике:
+  - full    — только полный кадр
+  - tracker — полный кадр + BallTracker
+  - highres — полный кадр с тем же увеличением, что у окна (то, что дорого)
+Вывод — JSON lines: recall / precision по истинной позиции мяча, вызовы
+детектора и цена в долях полного прохода в высоком разрешении (время заглушки
+ничего не говорит о времени модели, поэтому цена — во входах детектора).
+
+    python benchmarks/ball_recall.py --res 1280x720 1920x1080 --frames 300
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import warnings
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import numpy as np  # noqa: E402
+import supervision as sv  # noqa: E402
+
+from benchmarks.synthetic import SyntheticMatch, StubBallDetector, _apply  # noqa: E402
+from src.futai.constants import BALL_WINDOW_PX  # noqa: E402
+from src.futai.detector.ball import BallTracker  # noqa: E402
+
+
+def score(found: list[np.ndarray | None], truth: np.ndarray, tol: float) -> dict[str, float]:
+    hits = sum(f is not None and np.linalg.norm(f - t) <= tol for f, t in zip(found, truth))
+    returned = sum(f is not None for f in found)
+    return {"recall": hits / len(truth), "precision": hits / returned if returned else 0.0}
+
+
+def _center(det: sv.Detections) -> np.ndarray | None:
+    if not len(det):
+        return None
+    x1, y1, x2, y2 = det.xyxy[int(np.argmax(det.confidence))]
+    return np.array([(x1 + x2) / 2, (y1 + y2) / 2])
+
+
+def bench(width: int, height: int, args) -> list[dict]:
+    match = SyntheticMatch(width, height, n_frames=args.frames, seed=args.seed)
+    truth = np.array([_apply(match.homography(i), match.ball[i][None])[0] for i in range(args.frames)])
+    tol = max(height * 0.012, 6.0)  # ~ диаметр мяча
+    frames = [match.frame(i) for i in range(args.frames)]
+    rows = []
+
+    det = StubBallDetector(args.imgsz, seed=args.seed)
+    full = [det.infer(f)[0] for f in frames]
+    base = {"resolution": f"{width}x{height}", "frames": args.frames}
+    rows.append({**base, "mode": "full", **score([_center(d) for d in full], truth, tol),
+                 "detector_inputs_per_frame": 1.0})
+
+    tracker = BallTracker(det, imgsz=args.imgsz)
+    found = [_center(tracker.update(f, d, i)) for i, (f, d) in enumerate(zip(frames, full))]
+    stats = tracker.stats()
+    rows.append({**base, "mode": "tracker", **score(found, truth, tol),
+                 "detector_inputs_per_frame": 1 + tracker.inputs / len(frames),
+                 "cost_vs_highres": stats["cost_vs_full"], "found": stats["found"]})
+
+    # тот же кадр, но вход детектора крупнее во столько же раз, во сколько окно увеличивает мяч
+    hi = StubBallDetector(int(max(width, height) * args.imgsz / BALL_WINDOW_PX), seed=args.seed)
+    found = [_center(hi.infer(f)[0]) for f in frames]
+    rows.append({**base, "mode": "highres", **score(found, truth, tol),
+                 "input_px": hi.imgsz})
+    return rows
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--res", nargs="+", default=["1280x720", "1920x1080"], help="WxH")
+    ap.add_argument("--frames", type=int, default=300)
+    ap.add_argument("--imgsz", type=int, default=640, help="сторона входа детектора")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    warnings.filterwarnings("ignore", category=FutureWarning)
+    warnings.filterwarnings("ignore", category=sv.utils.internal.SupervisionWarnings)
+    for res in args.res:
+        width, height = map(int, res.lower().split("x"))
+        for row in bench(width, height, args):
+            print(json.dumps(row), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+Доля поля команд: подсчёт пикселей маски Вороного против pitch.control.
+
+Координаты игроков синтетических матчей (см. benchmarks/synthetic.py, судья
+не в счёт): --frames кадров кусками по --clip (длинное блуждание сгоняет игроков
+в углы, поэтому новый seed на каждый кусок):
+  - raster — VoronoiEngine.team_mask на канве радара (--scale см -> px, как
+             draw_pitch_voronoi_diagram) и доля пикселей поля за каждой командой
+  - exact  — team_control одной пачкой по всем кадрам
+Плюс расхождение долей (max / mean по кадрам) и проверка offcanvas: маска
+VoronoiEngine (полный и инкрементальный пересчёт) против int64 перебора, когда
+один игрок далеко за канвой (плохая гомография); ненулевой код при расхождении.
+Вывод — JSON lines.
+
+    python benchmarks/control.py --frames 500
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import numpy as np  # noqa: E402
+
+from benchmarks.synthetic import SyntheticMatch  # noqa: E402
+from src.futai.constants import FIELD_PADDING, FIELD_SCALE  # noqa: E402
+from src.futai.pitch.config import SoccerPitchConfiguration as CFG  # noqa: E402
+from src.futai.pitch.control import team_control  # noqa: E402
+from src.futai.pitch.voronoi import VoronoiEngine  # noqa: E402
+
+
+def raster_share(xy: np.ndarray, team: np.ndarray, scale: float, cfg: CFG) -> np.ndarray:
+    """(F,) доля команды 0 по пикселям — как считали по картинке Вороного."""
+    pad = FIELD_PADDING
+    h, w = int(cfg.width * scale), int(cfg.length * scale)
+    shape = (h + 2 * pad, w + 2 * pad)
+    engine = VoronoiEngine()
+    out = np.empty(len(xy))
+    for f in range(len(xy)):
+        px = np.trunc(xy[f] * scale).astype(np.int64) + pad
+        mask = engine.team_mask(px[team == 0], px[team == 1], shape)
+        out[f] = mask[pad:pad + h, pad:pad + w].mean()
+    return out
+
+
+def brute_mask(team1_px: np.ndarray, team2_px: np.ndarray, shape: tuple[int, int]) -> np.ndarray:
+    """Эталон: int64 N × H × W, как до VoronoiEngine."""
+    rows, cols = np.mgrid[:shape[0], :shape[1]].astype(np.int64)
+
+    def nearest(px: np.ndarray) -> np.ndarray:
+        if not len(px):
+            return np.full(shape, np.iinfo(np.int64).max)
+        return ((rows[None] - px[:, 1, None, None]) ** 2 + (cols[None] - px[:, 0, None, None]) ** 2).min(axis=0)
+
+    return nearest(team1_px) < nearest(team2_px)
+
+
+def offcanvas_check(seed: int, shape: tuple[int, int] = (800, 1300), far_x: int = 60000) -> dict:
+    """
+    Пикселей не как у перебора: кадр с игроком на x=far_x (полный пересчёт),
+    сдвиг только его (инкрементальный), возврат на канву.
+    """
+    rng = np.random.default_rng(seed)
+    h, w = shape
+    team1 = rng.integers(0, (w, h), size=(11, 2))
+    team2 = rng.integers(0, (w, h), size=(11, 2))
+    engine = VoronoiEngine()
+    bad = {}
+    for case, far in (("rebuild", far_x), ("update", far_x + 5), ("back", w // 2)):
+        team1[0] = (far, h // 2)
+        mask = engine.team_mask(team1, team2, shape)
+        bad[f"{case}_bad"] = int((mask != brute_mask(team1, team2, shape)).sum())
+    return bad
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--frames", type=int, default=500)
+    ap.add_argument("--clip", type=int, default=250)
+    ap.add_argument("--players", type=int, default=22)
+    ap.add_argument("--scale", type=float, default=FIELD_SCALE)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    cfg = CFG()
+    xy, team = [], None
+    for k, start in enumerate(range(0, args.frames, args.clip)):
+        match = SyntheticMatch(640, 360, n_players=args.players,
+                               n_frames=min(args.clip, args.frames - start), seed=args.seed + k)
+        keep = match.team < 2  # судья не владеет пространством
+        xy.append(match.pos[:, keep].astype(float))
+        team = match.team[keep]
+    xy = np.concatenate(xy)
+
+    t0 = time.perf_counter()
+    raster = raster_share(xy, team, args.scale, cfg)
+    raster_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    series = team_control(xy, team)
+    exact_s = time.perf_counter() - t0
+
+    diff = np.abs(series.share[:, 0] - raster)
+    for case, sec in (("raster", raster_s), ("exact", exact_s)):
+        print(json.dumps({"case": case, "frames": len(xy), "players": xy.shape[1],
+                          "total_s": sec, "ms_per_frame": 1e3 * sec / len(xy)}), flush=True)
+    print(json.dumps({"case": "agreement", "scale": args.scale, "speedup": raster_s / exact_s,
+                      "max_share_diff": float(diff.max()), "mean_share_diff": float(diff.mean()),
+                      **series.summary()}), flush=True)
+    bad = offcanvas_check(args.seed)
+    print(json.dumps({"case": "offcanvas", **bad}), flush=True)
+    return 1 if any(bad.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Кэш детекций (detector.cache): холодный прогон против тёплого.
+
+Синтетический ролик (см. benchmarks/synthetic.py), детектор-заглушка с
+искусственной задержкой --model-ms на кадр (как у YOLO на CPU). Два прогона
+TeamVideoProcessor.iter_batches с одним cache_dir: время на кадр, сколько
+кадров ушло в модель, попадания кэша и размер кэша на диске на кадр.
+Вывод — JSON lines.
+
+    python benchmarks/detection_cache.py --frames 500 --model-ms 40
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import supervision as sv  # noqa: E402
+
+from benchmarks.synthetic import SyntheticMatch, StubDetector  # noqa: E402
+from src.futai.detector.cache import DetectionCache  # noqa: E402
+from src.futai.handmodel import build_team_classifier  # noqa: E402
+from src.futai.processor import TeamVideoProcessor  # noqa: E402
+
+
+class SlowDetector:
+    """StubDetector + model_ms на кадр; считает кадры, дошедшие до модели."""
+
+    def __init__(self, match: SyntheticMatch, model_ms: float):
+        self.stub = StubDetector(match)
+        self.model_ms = model_ms
+        self.frames = 0
+
+    def infer(self, frame, *, confidence: float = 0.3, **kwargs):
+        n = len(frame) if isinstance(frame, list) else 1
+        self.frames += n
+        time.sleep(self.model_ms * n / 1e3)
+        return self.stub.infer(frame, confidence=confidence)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--res", default="1280x720", help="WxH")
+    ap.add_argument("--frames", type=int, default=500)
+    ap.add_argument("--model-ms", type=float, default=40.0)
+    ap.add_argument("--batch", type=int, default=8)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    warnings.filterwarnings("ignore", category=FutureWarning)
+    warnings.filterwarnings("ignore", category=sv.utils.internal.SupervisionWarnings)
+
+    width, height = map(int, args.res.lower().split("x"))
+    match = SyntheticMatch(width, height, n_frames=args.frames, seed=args.seed)
+    clf = build_team_classifier("hist")
+    clf.fit([c for i in range(0, args.frames, 50) for c in match.player_crops(i)[0]])
+    with tempfile.TemporaryDirectory() as tmp:
+        video = match.write_video(Path(tmp) / "match.mp4")
+        cache_dir = Path(tmp) / "cache"
+        for run in ("cold", "warm"):
+            det = SlowDetector(match, args.model_ms)
+            proc = TeamVideoProcessor(None, str(video), detector=det, team_clf=clf,
+                                      cache_dir=str(cache_dir))
+            t0 = time.perf_counter()
+            n = sum(1 for _ in proc.iter_batches(args.batch))
+            proc.detector.flush()
+            sec = time.perf_counter() - t0
+            print(json.dumps({"run": run, "frames": n, "ms_per_frame": 1e3 * sec / n,
+                              "model_frames": det.frames, **proc.detector.stats,
+                              "cache_bytes_per_frame": DetectionCache(cache_dir).size() / n}), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Проверка бюджета импорта: лёгкие модули (поле, рисование, конвейер без моделей)
+не должны тянуть ultralytics / torch / transformers / umap / sklearn и должны
+импортироваться быстро.
+
+Каждый модуль импортируется в чистом интерпретаторе. Бюджет считается сверх
+базовой линии — импорта numpy / cv2 / supervision, без которых не живёт даже
+рисование поля. Код выхода 1 — бюджет нарушен.
+
+    python benchmarks/import_budget.py [--budget 0.25] [--json]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# модули, которые обязаны грузиться без ML-стека
+LIGHT_MODULES = (
+    "src.futai.constants",
+    "src.futai.pitch.config",
+    "src.futai.pitch.draw",
+    "src.futai.pitch.pitch_projector",
+    "src.futai.visualizer.visualizer",
+    "src.futai.detector",
+    "src.futai.handmodel",
+    "src.futai.processor",
+    "src.futai.pipeline",
+)
+# тяжёлые пакеты, которые появляются только при создании детектора/классификатора
+FORBIDDEN = ("ultralytics", "torch", "transformers", "umap", "sklearn")
+# базовая линия: лёгкие зависимости, которые нужны всем модулям
+BASELINE = "numpy, cv2, supervision"
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+dt = time.perf_counter() - t0
+heavy = sorted({{m.split('.')[0] for m in sys.modules}} & set({forbidden!r}))
+print(json.dumps({{"seconds": dt, "heavy": heavy}}))
+"""
+
+
+def probe(module: str, repeat: int = 3) -> dict:
+    """
+    Импортировать модуль в отдельном процессе (repeat раз, берём минимум —
+    холодный кэш ФС и соседние процессы дают большой разброс).
+    Возвращает время и найденные тяжёлые зависимости.
+    """
+    code = _PROBE.format(module=module, forbidden=FORBIDDEN)
+    best = None
+    for _ in range(repeat):
+        res = subprocess.run([sys.executable, "-c", code], cwd=ROOT,
+                             capture_output=True, text=True)
+        if res.returncode:
+            return {"module": module, "error": res.stderr.strip().splitlines()[-1:]}
+        rep = json.loads(res.stdout)
+        if best is None or rep["seconds"] < best["seconds"]:
+            best = rep
+    return {"module": module, **best}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--budget", type=float, default=0.25,
+                    help="секунд на импорт модуля сверх numpy/cv2/supervision")
+    ap.add_argument("--repeat", type=int, default=3, help="запусков на модуль (берём минимум)")
+    ap.add_argument("--json", action="store_true", help="вывод в JSON lines")
+    args = ap.parse_args()
+
+    base = probe(BASELINE, args.repeat)
+    if "error" in base:
+        print(f"FAIL baseline ({BASELINE}): {base['error']}")
+        return 1
+    failed = False
+    for module in LIGHT_MODULES:
+        rep = probe(module, args.repeat)
+        if "error" not in rep:
+            rep["own_seconds"] = max(rep["seconds"] - base["seconds"], 0.0)
+        ok = "error" not in rep and not rep["heavy"] and rep["own_seconds"] <= args.budget
+        rep["ok"] = ok
+        failed |= not ok
+        if args.json:
+            print(json.dumps(rep))
+        elif "error" in rep:
+            print(f"FAIL {module}: {rep['error']}")
+        else:
+            extra = f" heavy={rep['heavy']}" if rep["heavy"] else ""
+            print(f"{'ok  ' if ok else 'FAIL'} {module}: {rep['seconds'] * 1e3:.0f} ms "
+                  f"(+{rep['own_seconds'] * 1e3:.0f} ms over baseline){extra}")
+    return int(failed)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,315 @@
+"""
+Поэтапный бенчмарк конвейера на синтетическом матче (см. benchmarks/synthetic.py).
+
+Каждая стадия меряется отдельно: decode, infer (заглушка), with_nms, ByteTrack,
+кропы, эмбеддинги, UMAP, KMeans, вратари, аннотации, проекция (по кадру и
+temporal), радар, Вороной. Сетка: число игроков × разрешение × бэкенд команд
+(по умолчанию оба: "hist" и "siglip" — stub_siglip, та же архитектура со
+случайными весами, эмбеддинги + UMAP.transform + KMeans.predict).
+
+Два прохода на конфигурацию: время (без tracemalloc — он замедляет Python)
+и память — пик tracemalloc внутри стадии. Аллокации torch / onnxruntime
+tracemalloc не видит, для них есть общий ru_maxrss в строке "summary".
+
+Вывод — JSON lines (одна строка на стадию), их удобно сравнивать между релизами:
+
+    python benchmarks/pipeline_stages.py --players 10 22 --res 1280x720 1920x1080 --out new.jsonl
+    python benchmarks/pipeline_stages.py --compare old.jsonl new.jsonl [--threshold 1.2]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+import supervision as sv  # noqa: E402
+
+from benchmarks.synthetic import SyntheticMatch, StubDetector, StubFieldModel, stub_siglip  # noqa: E402
+from src.futai.constants import (  # noqa: E402
+    BALL_CLASS_ID,
+    GK_CLASS_ID,
+    PLAYER_CLASS_ID,
+    REFEREE_CLASS_ID
+)
+from src.futai.detector import as_detections  # noqa: E402
+from src.futai.detector.annotation import build_annotators, annotate_frame  # noqa: E402
+from src.futai.detector.tracking import Tracker  # noqa: E402
+from src.futai.handmodel import build_team_classifier  # noqa: E402
+from src.futai.pipeline import render_radar  # noqa: E402
+from src.futai.pitch.config import SoccerPitchConfiguration as CFG  # noqa: E402
+from src.futai.pitch.draw import PitchDrawer as PD  # noqa: E402
+from src.futai.pitch.pitch_projector import PitchProjector  # noqa: E402
+from src.futai.pitch.voronoi import VoronoiEngine  # noqa: E402
+from src.futai.utils.gk_resolver import GoalkeeperResolver as GKRes  # noqa: E402
+
+POS = sv.Position.BOTTOM_CENTER
+
+
+class StageTimer:
+    """Сэмплы времени по стадиям; memory=True — ещё и пик tracemalloc внутри стадии."""
+
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        self.items: dict[str, int] = defaultdict(int)
+        self.peak: dict[str, int] = defaultdict(int)
+
+    @contextmanager
+    def __call__(self, stage: str, items: int = 1):
+        if self.memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        t0 = time.perf_counter()
+        yield
+        self.samples[stage].append(time.perf_counter() - t0)
+        self.items[stage] += items
+        if self.memory:
+            self.peak[stage] = max(self.peak[stage], tracemalloc.get_traced_memory()[1] - base)
+
+
+def _fit_classifier(backend: str, match: SyntheticMatch, device: str):
+    """Классификатор команд, обученный на кропах первых кадров (вне замеров)."""
+    kwargs = {}
+    if backend == "siglip":
+        model, processor = stub_siglip()
+        kwargs = {"features_model": model, "processor": processor, "device": device or "cpu"}
+    clf = build_team_classifier(backend, **kwargs)
+    crops = [c for i in range(min(5, match.n_frames)) for c in match.player_crops(i)[0]]
+    clf.fit(crops)
+    return clf
+
+
+def run_stages(match: SyntheticMatch, video: Path, clf, timer: StageTimer,
+               n_frames: int, embed_frames: int) -> int:
+    """Один проход по видео со всеми стадиями. Возвращает число кадров."""
+    t = timer
+    detector = StubDetector(match)
+    projector = PitchProjector(StubFieldModel(match))
+    temporal = PitchProjector(StubFieldModel(match), temporal=True)
+    tracker = Tracker()
+    annotators = build_annotators()
+    engine = VoronoiEngine()
+    cfg = CFG()
+    reducer = getattr(clf, "reducer", None)  # у "hist" UMAP нет
+    voronoi_buf = None
+
+    gen = sv.get_video_frames_generator(str(video))
+    done = 0
+    for i in range(n_frames):
+        with t("decode"):
+            frame = next(gen, None)
+        if frame is None:
+            break
+        with t("infer"):
+            dets = as_detections(detector.infer(frame)[0])
+
+        ball = dets[dets.class_id == BALL_CLASS_ID]
+        others = dets[dets.class_id != BALL_CLASS_ID]
+        with t("with_nms", len(others)):
+            others = others.with_nms(0.5, class_agnostic=True)
+        with t("tracker_update", len(others)):
+            others = tracker.update(others)
+        players = others[others.class_id == PLAYER_CLASS_ID]
+        gk = others[others.class_id == GK_CLASS_ID]
+        ref = others[others.class_id == REFEREE_CLASS_ID]
+
+        # эмбеддинги — на первых embed_frames кадрах (SigLIP на CPU — секунды на кадр),
+        # дальше команды по чётности, чтобы остальные стадии видели две команды
+        if i < embed_frames and len(players):
+            with t("crop", len(players)):
+                crops = [sv.crop_image(frame, xy) for xy in players.xyxy]
+            with t("extract_features", len(crops)):
+                feats = clf.extract_features(crops)
+            if reducer is not None:
+                with t("umap_transform", len(crops)):
+                    feats = reducer.transform(feats)
+            with t("kmeans_predict", len(crops)):
+                players.class_id = clf.cluster_model.predict(feats).astype(int)
+        else:
+            players.class_id = np.arange(len(players)) % 2
+
+        if len(gk) and len(players):
+            with t("gk_resolve", len(gk)):
+                gk.class_id = GKRes.resolve(players, gk)
+        ref.class_id = ref.class_id - 1
+        all_det = sv.Detections.merge([players, gk, ref])
+        all_det.class_id = all_det.class_id.astype(int)
+
+        with t("annotate", len(all_det)):
+            annotate_frame(annotators, frame, ball, all_det)
+
+        points = {"ball": ball.get_anchors_coordinates(POS),
+                  "player": all_det.get_anchors_coordinates(POS)}
+        with t("project", len(all_det)):
+            proj = projector.project(frame, points)
+        with t("project_temporal", len(all_det)):
+            temporal.project(frame, points)
+
+        if len(proj["player"]) != len(all_det):
+            proj["player"] = np.empty((0, 2))
+        with t("radar", len(all_det)):
+            render_radar(cfg, ball, all_det, proj)
+
+        pl_xy, team = proj["player"], all_det.class_id[:len(proj["player"])]
+        with t("voronoi", len(pl_xy)):
+            voronoi_buf = PD.draw_pitch(cfg, background=sv.Color.WHITE,
+                                        line_color=sv.Color.BLACK, out=voronoi_buf)
+            PD.draw_pitch_voronoi_diagram(cfg, pl_xy[team == 0], pl_xy[team == 1],
+                                          sv.Color.from_hex("00BFFF"), sv.Color.from_hex("FF1493"),
+                                          pitch=voronoi_buf, out=voronoi_buf, engine=engine)
+        done += 1
+    return done
+
+
+def _percentile_ms(samples: list[float], q: float) -> float:
+    return float(np.percentile(samples, q) * 1e3) if samples else 0.0
+
+
+def bench_config(width: int, height: int, n_players: int, team: str, args, tmp: Path) -> list[dict]:
+    """Все строки отчёта для одной конфигурации (игроки × разрешение × бэкенд команд)."""
+    match = SyntheticMatch(width, height, n_players, args.frames, seed=args.seed)
+    video = match.write_video(tmp / f"synthetic_{width}x{height}_{n_players}.mp4")
+    clf = _fit_classifier(team, match, args.device)
+    base = {"bench": "pipeline_stages", "resolution": f"{width}x{height}",
+            "players": n_players, "team": team}
+
+    # прогрев: ленивые импорты, lru_cache шаблонов, первые аллокации
+    run_stages(match, video, clf, StageTimer(), min(3, args.frames), min(1, args.embed_frames))
+
+    timer = StageTimer()
+    t0 = time.perf_counter()
+    frames = run_stages(match, video, clf, timer, args.frames, args.embed_frames)
+    wall = time.perf_counter() - t0
+
+    mem = StageTimer(memory=True)
+    if args.mem_frames:
+        tracemalloc.start()
+        run_stages(match, video, clf, mem, args.mem_frames, min(args.embed_frames, args.mem_frames))
+        tracemalloc.stop()
+
+    rows = []
+    for stage, samples in timer.samples.items():
+        total = float(np.sum(samples))
+        rows.append({
+            **base, "stage": stage,
+            "calls": len(samples),
+            "items": timer.items[stage],
+            "total_s": total,
+            "mean_ms": total / len(samples) * 1e3,
+            "p50_ms": _percentile_ms(samples, 50),
+            "p95_ms": _percentile_ms(samples, 95),
+            # кадров/с для стадии в одиночку; items/с — кропов, боксов, точек
+            "calls_per_s": len(samples) / total if total else None,
+            "items_per_s": timer.items[stage] / total if total else None,
+            "peak_mem_mb": mem.peak[stage] / 2 ** 20 if stage in mem.peak else None
+        })
+    rows.append({
+        **base, "stage": "summary",
+        "frames": frames,
+        "wall_s": wall,
+        "fps": frames / wall if wall else None,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    })
+    return rows
+
+
+def environment() -> dict:
+    """Первая строка отчёта: на чём меряли."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "bench": "pipeline_stages", "stage": "environment",
+        "commit": commit,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": cv2.getNumberOfCPUs(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "supervision": sv.__version__
+    }
+
+
+def compare(old_path: str, new_path: str, threshold: float) -> int:
+    """
+    Сравнить два отчёта по mean_ms стадий. Код выхода 1, если какая-то стадия
+    стала медленнее в threshold раз.
+    """
+    def load(path):
+        rows = [json.loads(line) for line in Path(path).read_text().splitlines() if line.strip()]
+        return {(r["resolution"], r["players"], r["team"], r["stage"]): r
+                for r in rows if "mean_ms" in r}
+
+    old, new = load(old_path), load(new_path)
+    failed = False
+    for key in sorted(old.keys() & new.keys()):
+        a, b = old[key]["mean_ms"], new[key]["mean_ms"]
+        ratio = b / a if a else float("inf")
+        slow = ratio > threshold
+        failed |= slow
+        res, players, team, stage = key
+        print(f"{'SLOW' if slow else 'ok  '} {res:>9} p={players:<3} {team:<6} {stage:<17} "
+              f"{a:9.3f} -> {b:9.3f} ms  x{ratio:.2f}")
+    for key in sorted(old.keys() ^ new.keys()):
+        print(f"only in {'old' if key in old else 'new'}: {key}")
+    return int(failed)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--players", type=int, nargs="+", default=[10, 22], help="полевых игроков")
+    ap.add_argument("--res", nargs="+", default=["1280x720", "1920x1080"], help="WxH")
+    ap.add_argument("--frames", type=int, default=60, help="кадров на конфигурацию")
+    ap.add_argument("--embed-frames", type=int, default=10,
+                    help="на скольких кадрах считать эмбеддинги (SigLIP на CPU медленный)")
+    ap.add_argument("--mem-frames", type=int, default=10, help="кадров в проходе с tracemalloc (0 — не мерить)")
+    ap.add_argument("--team", nargs="+", default=["hist", "siglip"], choices=("hist", "siglip"),
+                    help="бэкенды команд; siglip — случайные веса, нужны torch + transformers")
+    ap.add_argument("--device", default=None)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=None, help="файл JSON lines (по умолчанию stdout)")
+    ap.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="сравнить два отчёта")
+    ap.add_argument("--threshold", type=float, default=1.2, help="порог замедления для --compare")
+    args = ap.parse_args()
+    # deprecation-предупреждения supervision на каждом кадре забивают вывод
+    warnings.filterwarnings("ignore", category=FutureWarning)
+    warnings.filterwarnings("ignore", category=sv.utils.internal.SupervisionWarnings)
+
+    if args.compare:
+        return compare(*args.compare, args.threshold)
+
+    out = open(args.out, "w") if args.out else sys.stdout
+    try:
+        print(json.dumps(environment()), file=out, flush=True)
+        with tempfile.TemporaryDirectory() as tmp:
+            for res in args.res:
+                width, height = map(int, res.lower().split("x"))
+                for n_players in args.players:
+                    for team in args.team:
+                        for row in bench_config(width, height, n_players, team, args, Path(tmp)):
+                            print(json.dumps(row), file=out, flush=True)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Рендер кадров для видео: copy + annotate / новый радар / resize-вставка против Compositor.
+
+Кадры синтетического матча (см. benchmarks/synthetic.py), детекции и
+координаты на поле — истинные. Замеры на кадр:
+  - copy   — annotate_frame в копию кадра, радар в новый массив, композит:
+             ещё копия кадра + cv2.resize радара во вставку
+  - inplace — аннотации прямо в кадр, радар в буферы BufferRing,
+             Compositor рисует радар сразу в вырез кадра
+  - plot   — (--plot) Visualizer без headless: то же + sv.plot_image (Agg)
+Кадр генерируется вне замера. Вывод — JSON lines.
+
+    python benchmarks/render.py --res 1280x720 --frames 100
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+import warnings
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+import supervision as sv  # noqa: E402
+
+from benchmarks.synthetic import SyntheticMatch  # noqa: E402
+from src.futai.constants import DEFAULT_QUEUE_SIZE  # noqa: E402
+from src.futai.detector.annotation import build_annotators, annotate_frame  # noqa: E402
+from src.futai.pipeline import render_radar  # noqa: E402
+from src.futai.pitch.config import SoccerPitchConfiguration as CFG  # noqa: E402
+from src.futai.visualizer.visualizer import (  # noqa: E402
+    BufferRing, Compositor, Visualizer, radar_shape
+)
+
+
+def _scene(match: SyntheticMatch, i: int):
+    people, ball = match.boxes(i)
+    all_det = sv.Detections(xyxy=people, class_id=match.team.copy(),
+                            tracker_id=np.arange(1, len(people) + 1))
+    ball_det = sv.Detections(xyxy=ball, class_id=np.zeros(1, int))
+    return ball_det, all_det, {"ball": match.ball[i][None], "player": match.pos[i]}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--res", default="1280x720", help="WxH")
+    ap.add_argument("--frames", type=int, default=100)
+    ap.add_argument("--plot", action="store_true", help="ещё и путь через sv.plot_image")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    warnings.filterwarnings("ignore", category=FutureWarning)
+    warnings.filterwarnings("ignore", category=sv.utils.internal.SupervisionWarnings)
+
+    width, height = map(int, args.res.lower().split("x"))
+    match = SyntheticMatch(width, height, n_frames=args.frames, seed=args.seed)
+    cfg, annotators = CFG(), build_annotators()
+    comp = Compositor(annotators, (width, height), cfg)
+    ring = BufferRing(DEFAULT_QUEUE_SIZE + 2)
+    shape = radar_shape(cfg)
+    ih, iw = comp.roi[0].stop - comp.roi[0].start, comp.roi[1].stop - comp.roi[1].start
+
+    def copy_path(frame, ball_det, all_det, proj):
+        annotated = annotate_frame(annotators, frame, ball_det, all_det)
+        radar = render_radar(cfg, ball_det, all_det, proj)
+        out = annotated.copy()
+        out[comp.roi] = cv2.resize(radar, (iw, ih), interpolation=cv2.INTER_AREA)
+        return out, radar
+
+    def inplace_path(frame, ball_det, all_det, proj):
+        radar = render_radar(cfg, ball_det, all_det, proj, out=ring.next(shape))
+        return comp.compose(frame, ball_det, all_det, proj, out=frame), radar
+
+    cases = {"copy": copy_path, "inplace": inplace_path}
+    if args.plot:
+        import matplotlib
+        import matplotlib.pyplot as plt
+        matplotlib.use("Agg")
+        vis = Visualizer(annotators["ellipse"], annotators["triangle"], annotators["label"])
+
+        def plot_path(frame, ball_det, all_det, proj):
+            out = vis.frame(frame, ball_det, all_det)
+            radar = vis.radar(proj["ball"], proj["player"], all_det.class_id)
+            plt.close("all")
+            return out, radar
+
+        cases["plot"] = plot_path
+
+    for case, fn in cases.items():
+        times = []
+        for i in range(args.frames):
+            frame = match.frame(i)
+            scene = _scene(match, i)
+            t0 = time.perf_counter()
+            fn(frame, *scene)
+            times.append(time.perf_counter() - t0)
+        print(json.dumps({"case": case, "frames": args.frames, "res": [width, height],
+                          "ms_per_frame": 1e3 * float(np.median(times)),
+                          "p95_ms": 1e3 * float(np.percentile(times, 95))}), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
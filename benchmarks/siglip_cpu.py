@@ -0,0 +1,82 @@
+"""
+CPU-режим SigLIP в TeamClassifier: fp32 против INT8 / trace / уменьшенного входа.
+
+Кропы игроков синтетического матча (см. benchmarks/synthetic.py), модель —
+stub_siglip (архитектура siglip-base-patch16-224 со случайными весами) или
+--pretrained (веса SIGLIP_MODEL_NAME из HF). KMeans (projection="pca")
+обучается один раз на fp32-эмбеддингах и подставляется в каждый режим. На
+режим — TeamClassifier.embedding_report: мс на кроп против fp32 на 224,
+косинус / L2 дрейфа эмбеддингов и доля кропов с той же командой. Плюс строка
+preprocess — подготовка кропов без PIL (handmodel.preprocess) против самого
+процессора HF: мс на кроп и расхождение pixel_values. Вывод — JSON lines.
+
+    python benchmarks/siglip_cpu.py --frames 40 --threads 4     # нужны torch + transformers
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import warnings
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import supervision as sv  # noqa: E402
+
+from benchmarks.synthetic import SyntheticMatch, stub_siglip  # noqa: E402
+from src.futai.constants import SIGLIP_CPU_IMAGE_SIZE  # noqa: E402
+from src.futai.handmodel import build_team_classifier  # noqa: E402
+from src.futai.handmodel.preprocess import compare_with_processor  # noqa: E402
+
+CASES = {
+    "fp32": {},
+    "int8": {"quantize": True},
+    "script": {"compile_mode": "script"},
+    "int8+script": {"quantize": True, "compile_mode": "script"},
+    "small": {"image_size": SIGLIP_CPU_IMAGE_SIZE},
+    "int8+small": {"quantize": True, "image_size": SIGLIP_CPU_IMAGE_SIZE},
+    "int8+script+small": {"quantize": True, "compile_mode": "script", "image_size": SIGLIP_CPU_IMAGE_SIZE}
+}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--res", default="1280x720", help="WxH")
+    ap.add_argument("--frames", type=int, default=40)
+    ap.add_argument("--step", type=int, default=10, help="шаг по кадрам для кропов")
+    ap.add_argument("--threads", type=int, default=None, help="intra_op_threads")
+    ap.add_argument("--torch-compile", action="store_true", help="ещё и compile_mode='torch'")
+    ap.add_argument("--pretrained", action="store_true", help="настоящие веса вместо stub_siglip")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    warnings.filterwarnings("ignore", category=FutureWarning)
+    warnings.filterwarnings("ignore", category=UserWarning)
+    warnings.filterwarnings("ignore", category=sv.utils.internal.SupervisionWarnings)
+
+    width, height = map(int, args.res.lower().split("x"))
+    match = SyntheticMatch(width, height, n_frames=args.frames, seed=args.seed)
+    crops = [c for i in range(0, args.frames, args.step) for c in match.player_crops(i)[0]]
+    model, processor = (None, None) if args.pretrained else stub_siglip(args.seed)
+
+    cases = dict(CASES)
+    if args.torch_compile:
+        cases["torch"] = {"compile_mode": "torch"}
+    fitted = None
+    for case, opts in cases.items():
+        clf = build_team_classifier("siglip", features_model=model, processor=processor, device="cpu",
+                                    projection="pca", intra_op_threads=args.threads, **opts)
+        model, processor = clf.features_model, clf.processor  # --pretrained: грузим один раз
+        if fitted is None:
+            clf.fit(crops)
+            fitted = clf
+        clf.reducer, clf.cluster_model = fitted.reducer, fitted.cluster_model
+        print(json.dumps({"case": case, **opts, **clf.embedding_report(crops)}), flush=True)
+    print(json.dumps({"case": "preprocess", "crops": len(crops),
+                      **compare_with_processor(processor, crops)}), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Режим stride против детекции на каждом кадре (синтетический матч, веса не нужны).
+
+Один и тот же ролик прогоняется полностью и с TeamVideoProcessor(stride=K)
+для каждого K из --stride. На каждом кадре боксы stride-прогона сопоставляются
+с боксами полного прогона (ближайший центр) и с истинными боксами матча.
+Вывод — JSON lines: доля вызовов детектора, ошибка центра (px) отдельно для
+опорных и промежуточных кадров, время на кадр.
+
+    python benchmarks/stride_error.py --res 1280x720 --frames 250 --stride 3 5 8
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import numpy as np  # noqa: E402
+import supervision as sv  # noqa: E402
+
+from benchmarks.synthetic import SyntheticMatch, StubDetector  # noqa: E402
+from src.futai.handmodel import build_team_classifier  # noqa: E402
+from src.futai.processor import TeamVideoProcessor  # noqa: E402
+
+
+class CountingDetector(StubDetector):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = 0
+
+    def infer(self, frame, **kwargs):
+        self.calls += 1
+        return super().infer(frame, **kwargs)
+
+
+def _centers(xyxy: np.ndarray) -> np.ndarray:
+    return (xyxy[:, :2] + xyxy[:, 2:]) / 2
+
+
+def match_error(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Жадно: каждой точке a — ближайшая свободная из b. Расстояния пар, px."""
+    if not len(a) or not len(b):
+        return np.zeros(0)
+    d = np.linalg.norm(a[:, None] - b[None], axis=2)
+    out = []
+    for _ in range(min(len(a), len(b))):
+        i, j = np.unravel_index(np.argmin(d), d.shape)
+        out.append(d[i, j])
+        d[i, :] = d[:, j] = np.inf
+    return np.asarray(out)
+
+
+def _summary(err: list[np.ndarray]) -> dict[str, float]:
+    e = np.concatenate(err) if err else np.zeros(0)
+    if not e.size:
+        return {"n": 0}
+    return {"n": int(e.size), "mean": float(e.mean()),
+            "p95": float(np.percentile(e, 95)), "max": float(e.max())}
+
+
+def run(match: SyntheticMatch, video: Path, clf, stride: int | None):
+    """Прогон: [(центры людей, interpolated)] по кадрам, вызовы детектора, сек, stats."""
+    det = CountingDetector(match)
+    proc = TeamVideoProcessor(None, str(video), detector=det, team_clf=clf, stride=stride)
+    out = []
+    t0 = time.perf_counter()
+    for frame in proc.frame_gen:
+        if stride:
+            _, all_det = proc._strided(frame)
+            interpolated = bool(all_det.data["interpolated"].any())
+        else:
+            _, all_det = proc._track(frame, det.infer(frame, confidence=proc.confidence)[0])
+            interpolated = False
+        out.append((_centers(all_det.xyxy), interpolated))
+    elapsed = time.perf_counter() - t0
+    return out, det.calls, elapsed, proc.stride.stats() if stride else None
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--res", default="1280x720", help="WxH")
+    ap.add_argument("--players", type=int, default=22)
+    ap.add_argument("--frames", type=int, default=250)
+    ap.add_argument("--stride", type=int, nargs="+", default=[3, 5, 8], help="максимальные K")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    warnings.filterwarnings("ignore", category=FutureWarning)
+    warnings.filterwarnings("ignore", category=sv.utils.internal.SupervisionWarnings)
+
+    width, height = map(int, args.res.lower().split("x"))
+    match = SyntheticMatch(width, height, args.players, args.frames, args.seed)
+    truth = [_centers(match.boxes(i)[0]) for i in range(args.frames)]
+    clf = build_team_classifier("hist")
+    crops = [c for i in range(0, args.frames, max(args.frames // 6, 1)) for c in match.player_crops(i)[0]]
+    clf.fit(crops)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video = match.write_video(Path(tmp) / "match.mp4")
+        full, full_calls, full_s, _ = run(match, video, clf, None)
+        print(json.dumps({"mode": "full", "frames": len(full), "detector_calls": full_calls,
+                          "ms_per_frame": full_s / len(full) * 1e3,
+                          "truth_err_px": _summary([match_error(c, t) for (c, _), t in zip(full, truth)])}),
+              flush=True)
+        for k in args.stride:
+            res, calls, sec, stats = run(match, video, clf, k)
+            vs_full = {True: [], False: []}
+            vs_truth = {True: [], False: []}
+            for (c, interp), (ref, _), t in zip(res, full, truth):
+                vs_full[interp].append(match_error(c, ref))
+                vs_truth[interp].append(match_error(c, t))
+            print(json.dumps({
+                "mode": "stride", "max_stride": k, "frames": len(res), "detector_calls": calls,
+                "detector_ratio": calls / full_calls, "mean_k": stats["mean_k"],
+                "ms_per_frame": sec / len(res) * 1e3,
+                "vs_full_px": {"keyframes": _summary(vs_full[False]),
+                               "interpolated": _summary(vs_full[True])},
+                "truth_err_px": {"keyframes": _summary(vs_truth[False]),
+                                 "interpolated": _summary(vs_truth[True])},
+                "keyframe_err_px": stats["keyframe_err_px"]
+            }), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""
+Синтетический матч для бенчмарков: видео + заглушки моделей, без весов и GPU.
+
+  - SyntheticMatch — игроки ходят по полю (координаты в см), камера плавно
+                     панорамирует; из одного состояния строятся и кадры,
+                     и «ответы» моделей, поэтому трекинг / команды / гомография
+                     работают на осмысленных данных
+  - StubDetector   — infer() как у ONNXDetector: список sv.Detections на кадр
+                     (с дублями боксов, чтобы NMS было что делать)
+  - StubBallDetector — мяч по пикселям (белое круглое пятно) после ресайза
+                     входа до imgsz: мелкий мяч на полном кадре теряется,
+                     в увеличенном окне — находится, как у настоящего детектора
+  - StubFieldModel — 32 точки поля через истинную гомографию кадра
+  - stub_siglip    — SigLIP-base со случайными весами (та же архитектура и
+                     препроцессинг, что у SIGLIP_MODEL_NAME; скачивать нечего)
+
+Номер кадра зашит в сам кадр (штрихкод в левом верхнем углу), заглушки
+читают его оттуда — ответы верные при любом порядке вызовов: temporal-режим,
+шарды, перемотка, пропуск кадров.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+
+import cv2
+import numpy as np
+import supervision as sv
+
+from src.futai.constants import (
+    BALL_CLASS_ID,
+    GK_CLASS_ID,
+    PLAYER_CLASS_ID,
+    REFEREE_CLASS_ID,
+    FIELD_SCALE,
+    FIELD_PADDING
+)
+from src.futai.pitch.config import SoccerPitchConfiguration as CFG
+from src.futai.pitch.draw import PitchDrawer as PD
+
+_CFG = CFG()
+_VERTICES = np.asarray(_CFG.vertices, dtype=np.float32)
+
+# цвета формы (BGR): команда 0, команда 1, вратари, судья
+_KIT = {0: (230, 160, 30), 1: (60, 20, 200), "gk": (40, 220, 240), "ref": (20, 20, 20)}
+_GRASS = (40, 120, 40)
+
+
+def _apply(H: np.ndarray, xy: np.ndarray) -> np.ndarray:
+    return cv2.perspectiveTransform(np.asarray(xy, np.float32).reshape(-1, 1, 2), H).reshape(-1, 2)
+
+
+class SyntheticMatch:
+    """
+    n_players полевых игроков (пополам на две команды) + 2 вратаря + судья + мяч.
+    Всё детерминировано seed'ом: одинаковые конфигурации дают одинаковые кадры.
+    """
+
+    def __init__(self, width: int, height: int, n_players: int = 22,
+                 n_frames: int = 100, seed: int = 0, fps: int = 25):
+        self.width, self.height = width, height
+        self.n_frames, self.fps = n_frames, fps
+        rng = np.random.default_rng(seed)
+        L, W = _CFG.length, _CFG.width
+
+        # роли и команды: полевые, два вратаря, судья
+        n = n_players + 3
+        self.role = np.array([PLAYER_CLASS_ID] * n_players + [GK_CLASS_ID] * 2 + [REFEREE_CLASS_ID])
+        self.team = np.array([i % 2 for i in range(n_players)] + [0, 1, 2])
+
+        # траектории: случайное блуждание со сглаженной скоростью, см
+        start = rng.uniform([0.1 * L, 0.1 * W], [0.9 * L, 0.9 * W], (n, 2))
+        start[n_players:n_players + 2] = [[0.05 * L, W / 2], [0.95 * L, W / 2]]  # вратари у ворот
+        vel = np.cumsum(rng.normal(0, 8, (n_frames, n, 2)), axis=0) * 0.2
+        self.pos = np.clip(start + np.cumsum(vel, axis=0), [0, 0], [L, W]).astype(np.float32)
+        ball_vel = np.cumsum(rng.normal(0, 25, (n_frames, 2)), axis=0) * 0.3
+        self.ball = np.clip([L / 2, W / 2] + np.cumsum(ball_vel, axis=0), [0, 0], [L, W]).astype(np.float32)
+
+        # камера: поле -> трапеция кадра, плюс медленная панорама по x
+        dst = np.float32([[0.12 * width, 0.14 * height], [0.88 * width, 0.14 * height],
+                          [1.25 * width, 1.05 * height], [-0.25 * width, 1.05 * height]])
+        src = np.float32([[0, 0], [L, 0], [L, W], [0, W]])
+        self._H0 = cv2.getPerspectiveTransform(src, dst)
+        self.pan = (0.08 * width * np.sin(np.linspace(0, 2 * np.pi, n_frames))).astype(np.float32)
+
+        # фон рисуем из шаблона радара: тот же набор линий, что у PitchDrawer
+        self._template = PD.draw_pitch(_CFG)
+        # штрихкод номера кадра: bits квадратов по block px
+        self._bits = max(int(n_frames - 1).bit_length(), 1)
+        self._block = max(height // 90, 4)
+
+    def frame_index(self, frame: np.ndarray) -> int:
+        """Номер кадра по штрихкоду (переживает сжатие mp4)."""
+        b = self._block
+        bits = [frame[:b, k * b:(k + 1) * b].mean() > 127 for k in range(self._bits)]
+        return sum(1 << k for k, bit in enumerate(bits) if bit)
+
+    def homography(self, i: int) -> np.ndarray:
+        """Поле (см) -> кадр i (px)."""
+        T = np.array([[1, 0, self.pan[i]], [0, 1, 0], [0, 0, 1]], np.float64)
+        return T @ self._H0
+
+    def boxes(self, i: int) -> tuple[np.ndarray, np.ndarray]:
+        """Боксы (N, 4) людей и (1, 4) мяча на кадре i."""
+        H = self.homography(i)
+        feet = _apply(H, self.pos[i])
+        # рост в кадре растёт к нижнему краю (ближе к камере)
+        h = self.height * (0.05 + 0.08 * np.clip(feet[:, 1] / self.height, 0, 1))
+        w = 0.4 * h
+        people = np.stack([feet[:, 0] - w / 2, feet[:, 1] - h, feet[:, 0] + w / 2, feet[:, 1]], axis=1)
+        b = _apply(H, self.ball[i][None])[0]
+        r = max(self.height * 0.006, 2.0)
+        ball = np.array([[b[0] - r, b[1] - r, b[0] + r, b[1] + r]], np.float32)
+        return people.astype(np.float32), ball
+
+    def frame(self, i: int) -> np.ndarray:
+        H = self.homography(i)
+        # шаблон в px радара -> см -> кадр
+        S = np.array([[FIELD_SCALE, 0, FIELD_PADDING], [0, FIELD_SCALE, FIELD_PADDING], [0, 0, 1]])
+        img = cv2.warpPerspective(self._template, H @ np.linalg.inv(S), (self.width, self.height),
+                                  borderValue=_GRASS)
+        people, ball = self.boxes(i)
+        for (x1, y1, x2, y2), team, role in zip(people.astype(int), self.team, self.role):
+            kit = _KIT["gk"] if role == GK_CLASS_ID else _KIT["ref"] if role == REFEREE_CLASS_ID else _KIT[team]
+            torso = y1 + (y2 - y1) * 6 // 10
+            cv2.rectangle(img, (x1, y1), (x2, torso), kit, -1)
+            cv2.rectangle(img, (x1, torso), (x2, y2), (30, 30, 30), -1)
+        (x1, y1, x2, y2), = ball.astype(int)
+        cv2.circle(img, ((x1 + x2) // 2, (y1 + y2) // 2), max((x2 - x1) // 2, 1), (255, 255, 255), -1)
+        b = self._block
+        for k in range(self._bits):
+            img[:b, k * b:(k + 1) * b] = 255 if (i >> k) & 1 else 0
+        return img
+
+    def write_video(self, path: str | Path) -> Path:
+        path = Path(path)
+        info = sv.VideoInfo(width=self.width, height=self.height, fps=self.fps)
+        with sv.VideoSink(str(path), info) as sink:
+            for i in range(self.n_frames):
+                sink.write_frame(self.frame(i))
+        return path
+
+    def player_crops(self, i: int) -> tuple[list[np.ndarray], np.ndarray]:
+        """Кропы полевых игроков кадра i и их истинные команды (для fit)."""
+        img = self.frame(i)
+        people, _ = self.boxes(i)
+        mask = self.role == PLAYER_CLASS_ID
+        return [sv.crop_image(img, xy) for xy in people[mask]], self.team[mask]
+
+
+class StubDetector:
+    """
+    Детектор-заглушка: истинные боксы + шум, часть боксов продублирована
+    (как сырой выход до class-agnostic NMS).
+    """
+
+    def __init__(self, match: SyntheticMatch, dup_ratio: float = 0.2, seed: int = 0, ball: bool = True):
+        self.match = match
+        self.dup_ratio = dup_ratio
+        self.ball = ball  # False — мяч не отдаём (его ищет StubBallDetector)
+        self._rng = np.random.default_rng(seed)
+
+    def infer(self, frame, *, confidence: float = 0.3, **kwargs) -> list[sv.Detections]:
+        frames = frame if isinstance(frame, (list, tuple)) else [frame]
+        return [self._one(self.match.frame_index(f), confidence) for f in frames]
+
+    def _one(self, i: int, confidence: float) -> sv.Detections:
+        people, ball = self.match.boxes(i)
+        rng = self._rng
+        xyxy = people + rng.normal(0, 1.5, people.shape).astype(np.float32)
+        cls = self.match.role.copy()
+        conf = rng.uniform(0.6, 0.95, len(xyxy)).astype(np.float32)
+
+        dup = rng.random(len(xyxy)) < self.dup_ratio
+        xyxy = np.vstack([xyxy, xyxy[dup] + rng.normal(0, 3, (dup.sum(), 4)).astype(np.float32), ball])
+        cls = np.concatenate([cls, cls[dup], [BALL_CLASS_ID]])
+        conf = np.concatenate([conf, conf[dup] * 0.8, [0.7]]).astype(np.float32)
+        keep = (conf >= confidence) & (self.ball | (cls != BALL_CLASS_ID))
+        return sv.Detections(xyxy=xyxy[keep], class_id=cls[keep].astype(int), confidence=conf[keep])
+
+
+class StubBallDetector:
+    """
+    Мяч без знания номера кадра — работает и на кропах. Вход ужимается
+    (или растягивается) до imgsz, как letterbox у детектора; пятно диаметром
+    d px на входе находится с вероятностью clip((d - min_px) / ramp_px, 0, 1).
+    """
+
+    def __init__(self, imgsz: int = 640, min_px: float = 2.0, ramp_px: float = 6.0, seed: int = 0):
+        self.imgsz = imgsz
+        self.min_px, self.ramp_px = min_px, ramp_px
+        self._rng = np.random.default_rng(seed)
+
+    def infer(self, frame, *, confidence: float = 0.3, **kwargs) -> list[sv.Detections]:
+        frames = frame if isinstance(frame, (list, tuple)) else [frame]
+        return [self._one(f, confidence) for f in frames]
+
+    def _one(self, frame: np.ndarray, confidence: float) -> sv.Detections:
+        r = self.imgsz / max(frame.shape[:2])
+        white = (frame.min(axis=2) > 200).astype(np.uint8)
+        n, _, st, _ = cv2.connectedComponentsWithStats(white)
+        boxes, conf = [], []
+        for x, y, w, h, area in st[1:n]:
+            d = max(w, h) * r  # диаметр на входе детектора
+            # круглое сплошное пятно: не линия разметки, не кольцо центрального круга
+            # и не квадрат штрихкода (у круга заполнено ~π/4 рамки)
+            if not (0.6 < w / h < 1.6 and 0.5 * w * h < area < 0.9 * w * h
+                    and d < 0.1 * self.imgsz):
+                continue
+            p = float(np.clip((d - self.min_px) / self.ramp_px, 0, 1))
+            if self._rng.random() < p and p >= confidence:
+                boxes.append([x, y, x + w, y + h])
+                conf.append(p)
+        xyxy = np.asarray(boxes, np.float32).reshape(-1, 4)
+        return sv.Detections(xyxy=xyxy, confidence=np.asarray(conf, np.float32),
+                             class_id=np.full(len(xyxy), BALL_CLASS_ID))
+
+
+class StubFieldModel:
+    """Модель точек поля: 32 вершины через истинную гомографию, вне кадра — низкая уверенность."""
+
+    def __init__(self, match: SyntheticMatch, noise_px: float = 1.0, seed: int = 0):
+        self.match = match
+        self.noise_px = noise_px
+        self._rng = np.random.default_rng(seed)
+
+    def infer(self, frame, *, confidence: float = 0.3, **kwargs) -> list[sv.KeyPoints]:
+        frames = frame if isinstance(frame, (list, tuple)) else [frame]
+        out = []
+        for f in frames:
+            xy = _apply(self.match.homography(self.match.frame_index(f)), _VERTICES)
+            xy += self._rng.normal(0, self.noise_px, xy.shape).astype(np.float32)
+            inside = ((xy >= 0) & (xy < [self.match.width, self.match.height])).all(axis=1)
+            conf = np.where(inside, 0.9, 0.1).astype(np.float32)
+            out.append(sv.KeyPoints(xy=xy[None], confidence=conf[None], class_id=np.zeros(1, int)))
+        return out
+
+
+def stub_siglip(seed: int = 0):
+    """
+    (features_model, processor) для TeamClassifier без скачивания весов:
+    конфиг по умолчанию — это и есть siglip-base-patch16-224.
+    Скорость та же, эмбеддинги — случайные, но от seed повторяются.
+    Нужны torch + transformers.
+    """
+    import torch
+    from transformers import SiglipImageProcessor, SiglipVisionConfig, SiglipVisionModel
+
+    torch.manual_seed(seed)
+    model = SiglipVisionModel(SiglipVisionConfig()).eval()
+    return model, SiglipImageProcessor()
@@ -0,0 +1,104 @@
+"""
+Fit модели команд: все кропы списком против потокового fit_from_video.
+
+На синтетическом ролике (см. benchmarks/synthetic.py) два режима:
+  - full   — кропы со всех кадров с шагом --stride в один список -> fit()
+  - stream — fit_from_video: те же кадры, partial_fit порциями, остановка,
+             когда центры команд устоялись
+Вывод — JSON lines: сколько кадров прочитано и кропов посчитано, время,
+пик памяти Python (tracemalloc) на fit, точность по истинным командам на
+отложенных кадрах и согласие stream с full.
+
+    python benchmarks/team_fit.py --frames 1500 --stride 25
+    python benchmarks/team_fit.py --team siglip    # нужны torch + transformers + umap
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import numpy as np  # noqa: E402
+import supervision as sv  # noqa: E402
+
+from benchmarks.synthetic import SyntheticMatch, StubDetector, stub_siglip  # noqa: E402
+from src.futai.handmodel import build_team_classifier, compare_team_classifiers, label_agreement  # noqa: E402
+from src.futai.handmodel.streaming import fit_from_video, player_crops  # noqa: E402
+
+
+def _build(backend: str, device: str | None):
+    if backend != "siglip":
+        return build_team_classifier(backend)
+    model, processor = stub_siglip()
+    return build_team_classifier(backend, features_model=model, processor=processor, device=device or "cpu")
+
+
+def accuracy(clf, crops: list[np.ndarray], truth: np.ndarray) -> float:
+    return label_agreement(truth, clf.predict(crops))[0]  # номера кластеров произвольные
+
+
+def fit_full(clf, video: Path, detector, stride: int) -> dict:
+    crops, n_frames = [], 0
+    for frame in sv.get_video_frames_generator(str(video), stride=stride):
+        n_frames += 1
+        crops += player_crops(frame, detector.infer(frame)[0])
+    clf.fit(crops)
+    return {"frames": n_frames, "crops": len(crops)}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--res", default="1280x720", help="WxH")
+    ap.add_argument("--frames", type=int, default=1500)
+    ap.add_argument("--stride", type=int, default=25)
+    ap.add_argument("--team", default="hist", choices=["hist", "siglip"])
+    ap.add_argument("--device", default=None)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    warnings.filterwarnings("ignore", category=FutureWarning)
+    warnings.filterwarnings("ignore", category=sv.utils.internal.SupervisionWarnings)
+
+    width, height = map(int, args.res.lower().split("x"))
+    match = SyntheticMatch(width, height, n_frames=args.frames, seed=args.seed)
+    detector = StubDetector(match, ball=False)
+    held = [match.player_crops(i) for i in range(args.stride // 2, args.frames, args.stride * 4)]
+    held_crops = [c for crops, _ in held for c in crops]
+    held_truth = np.concatenate([t for _, t in held])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video = match.write_video(Path(tmp) / "match.mp4")
+        models = {}
+        for mode in ("full", "stream"):
+            clf = _build(args.team, args.device)
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            if mode == "full":
+                info = fit_full(clf, video, detector, args.stride)
+            else:
+                stats = fit_from_video(clf, str(video), detector, stride=args.stride)
+                info = {"frames": stats["frames"], "crops": stats["seen"],
+                        "reservoir": stats["reservoir"], "updates": stats["updates"],
+                        "converged": stats["converged"]}
+            sec = time.perf_counter() - t0
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            models[mode] = clf
+            print(json.dumps({"mode": mode, "team": args.team, **info, "seconds": sec,
+                              "peak_mb": peak / 2 ** 20,
+                              "accuracy": accuracy(clf, held_crops, held_truth)}), flush=True)
+
+    cmp = compare_team_classifiers(models["full"], models["stream"], held_crops)
+    print(json.dumps({"mode": "stream_vs_full", "agreement": cmp["agreement"], "n": cmp["n"]}), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
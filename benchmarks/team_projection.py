@@ -0,0 +1,90 @@
+"""
+Проекция перед KMeans в TeamClassifier: UMAP.transform против PCA и линейной карты.
+
+Эмбеддинги SigLIP (stub_siglip — та же архитектура со случайными весами)
+кропов синтетического матча считаются один раз; на них для каждого
+projection ("umap" | "pca" | "parametric") — fit на первой половине кадров,
+затем на второй: время проекции + KMeans.predict на кроп, согласие меток с
+путём через UMAP и с истинными командами (по лучшей перестановке номеров
+кластеров); у "pca" / "parametric" ещё fit_report — то же согласие на
+обучающей выборке. UMAP / PCA / KMeans сидируются --seed. Веса случайные — кластеры слабее, чем у обученной SigLIP. Для сравнения —
+время самого эмбеддинга на кроп. Вывод — JSON lines.
+
+    python benchmarks/team_projection.py --frames 120     # нужны torch + transformers + umap
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+import warnings
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import numpy as np  # noqa: E402
+import supervision as sv  # noqa: E402
+
+from benchmarks.synthetic import SyntheticMatch, stub_siglip  # noqa: E402
+from src.futai.handmodel import build_team_classifier, label_agreement  # noqa: E402
+from src.futai.handmodel.classification import PROJECTIONS  # noqa: E402
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--res", default="1280x720", help="WxH")
+    ap.add_argument("--frames", type=int, default=120)
+    ap.add_argument("--step", type=int, default=5, help="шаг по кадрам для кропов")
+    ap.add_argument("--repeat", type=int, default=5, help="повторов замера проекции")
+    ap.add_argument("--device", default="cpu")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    warnings.filterwarnings("ignore", category=FutureWarning)
+    warnings.filterwarnings("ignore", category=UserWarning)
+    warnings.filterwarnings("ignore", category=sv.utils.internal.SupervisionWarnings)
+
+    width, height = map(int, args.res.lower().split("x"))
+    match = SyntheticMatch(width, height, n_frames=args.frames, seed=args.seed)
+    idx = list(range(0, args.frames, args.step))
+    half = len(idx) // 2
+    train = [c for i in idx[:half] for c in match.player_crops(i)[0]]
+    test = [c for i in idx[half:] for c in match.player_crops(i)[0]]
+    truth = np.concatenate([match.player_crops(i)[1] for i in idx[half:]])
+
+    model, processor = stub_siglip(args.seed)
+    clf = build_team_classifier("siglip", features_model=model, processor=processor, device=args.device,
+                               seed=args.seed)
+    t0 = time.perf_counter()
+    train_f = clf.extract_features(train)
+    test_f = clf.extract_features(test)
+    embed_ms = 1e3 * (time.perf_counter() - t0) / (len(train) + len(test))
+    print(json.dumps({"stage": "embedding", "crops": len(train) + len(test),
+                      "ms_per_crop": embed_ms}), flush=True)
+
+    ref = None
+    for mode in PROJECTIONS:
+        clf._set_projection(mode)
+        t0 = time.perf_counter()
+        clf._fit_features(train_f)
+        fit_s = time.perf_counter() - t0
+        times = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            labels = clf.cluster_model.predict(clf.reducer.transform(test_f))
+            times.append(time.perf_counter() - t0)
+        ref = labels if ref is None else ref  # первый — "umap"
+        print(json.dumps({
+            "projection": mode, "train": len(train), "test": len(test), "fit_s": fit_s,
+            "ms_per_crop": 1e3 * float(np.median(times)) / len(test),
+            "batch_ms": 1e3 * float(np.median(times)),
+            "agreement_vs_umap": label_agreement(ref, labels)[0],
+            "accuracy": label_agreement(truth, labels)[0],
+            **({"fit_report": clf.fit_report} if clf.fit_report else {})
+        }), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
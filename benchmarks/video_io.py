@@ -0,0 +1,116 @@
+"""
+Чтение / запись видео: sv.get_video_frames_generator + sv.VideoSink против utils.video.
+
+Синтетический ролик (см. benchmarks/synthetic.py) пишется в H.264 с ключевым
+кадром раз в --gop кадров (как у трансляций), затем замеры:
+  - index  — построение индекса кадров и чтение готового файла индекса
+  - window — последние --window кадров ролика
+  - sample — каждый --stride-й кадр всего ролика (сэмплы для fit команд)
+  - decode — весь ролик подряд: полное разрешение и --scale от него
+  - write  — запись кадров: sv.VideoSink (mp4v) против VideoWriter
+Номер кадра зашит в сам кадр — каждый прочитанный кадр сверяется с ожидаемым.
+Вывод — JSON lines.
+
+    python benchmarks/video_io.py --res 1280x720 --frames 1500
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import supervision as sv  # noqa: E402
+
+from benchmarks.synthetic import SyntheticMatch  # noqa: E402
+from src.futai.constants import VIDEO_INDEX_SUFFIX  # noqa: E402
+from src.futai.utils.video import VideoSource, VideoWriter, load_index  # noqa: E402
+
+
+def _timed(fn) -> tuple[float, object]:
+    t0 = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - t0, out
+
+
+def _read(match: SyntheticMatch, frames, expected: list[int]) -> tuple[float, int]:
+    """Прочитать кадры (не держа их в памяти): время и сколько не совпало с ожидаемыми номерами."""
+    t0 = time.perf_counter()
+    got = [match.frame_index(f) for f in frames]
+    sec = time.perf_counter() - t0
+    return sec, sum(g != e for g, e in zip(got, expected)) + abs(len(got) - len(expected))
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--res", default="1280x720", help="WxH")
+    ap.add_argument("--frames", type=int, default=1500)
+    ap.add_argument("--gop", type=int, default=50, help="ключевой кадр раз в столько кадров")
+    ap.add_argument("--window", type=int, default=125)
+    ap.add_argument("--stride", type=int, default=50)
+    ap.add_argument("--scale", type=float, default=0.5)
+    ap.add_argument("--backend", default="auto", help="auto | av | cv2")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    warnings.filterwarnings("ignore", category=FutureWarning)
+    warnings.filterwarnings("ignore", category=sv.utils.internal.SupervisionWarnings)
+
+    width, height = map(int, args.res.lower().split("x"))
+    match = SyntheticMatch(width, height, n_frames=args.frames, seed=args.seed)
+    n = args.frames
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "match.mp4"
+        writer = VideoWriter(path, 25, gop=args.gop)  # иначе у libx264 GOP 250 и ключевые кадры по сценам
+        sink_s = writer_s = 0.0
+        with writer, sv.VideoSink(str(Path(tmp) / "sink.mp4"), sv.VideoInfo(width, height, 25)) as sink:
+            for i in range(n):
+                frame = match.frame(i)
+                sink_s += _timed(lambda: sink.write_frame(frame))[0]
+                writer_s += _timed(lambda: writer.write_frame(frame))[0]
+            writer_s += _timed(writer.close)[0]
+        print(json.dumps({"case": "write", "frames": n, "writer": writer.backend,
+                          "sv_sink_ms_per_frame": 1e3 * sink_s / n,
+                          "sv_sink_mb": (Path(tmp) / "sink.mp4").stat().st_size / 2 ** 20,
+                          "writer_ms_per_frame": 1e3 * writer_s / n,
+                          "writer_mb": path.stat().st_size / 2 ** 20}), flush=True)
+
+        cold, index = _timed(lambda: load_index(path))
+        warm, _ = _timed(lambda: load_index(path))
+        print(json.dumps({"case": "index", "frames": index.total_frames, "keyframes": len(index.keyframes),
+                          "exact": index.exact, "build_ms": 1e3 * cold, "cached_ms": 1e3 * warm,
+                          "sidecar": path.with_name(path.name + VIDEO_INDEX_SUFFIX).exists()}), flush=True)
+
+        cases = {
+            "window": (n - args.window, n, 1),
+            "sample": (0, n, args.stride),
+            "decode": (0, n, 1)
+        }
+        for case, (start, end, stride) in cases.items():
+            expected = list(range(start, end, stride))
+            sv_s, sv_bad = _read(match, sv.get_video_frames_generator(
+                str(path), stride=stride, start=start, end=end), expected)
+            row = {"case": case, "frames": len(expected), "sv_s": sv_s, "sv_bad": sv_bad}
+            src = VideoSource(path, backend=args.backend)
+            row["source_s"], row["source_bad"] = _read(match, src.frames(start, end, stride), expected)
+            row["speedup"] = sv_s / row["source_s"]
+            row.update(src.stats())
+            if case == "decode":
+                size = (int(width * args.scale) // 2 * 2, int(height * args.scale) // 2 * 2)
+                small = VideoSource(path, size=size, backend=args.backend)
+                row["reduced_s"], _ = _timed(lambda: sum(1 for _ in small.frames(start, end, stride)))
+                row["reduced_size"] = list(size)
+                small.close()
+            src.close()
+            print(json.dumps(row), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,5 +15,11 @@ setup(
         'umap-learn',
         'scikit-learn',
         'tqdm'
-    ]
+    ],
+    extras_require={
+        # CPU-бэкенд детектора: build_detector("onnx", ...)
+        'onnx': ['onnx', 'onnxruntime'],
+        # индекс кадров + seek по ключевым кадрам и H.264-запись в futai.utils.video
+        'video': ['av']
+    }
 )
\ No newline at end of file
@@ -3,18 +3,180 @@
 #  Detection settings
 # Порог отсечения детекций по уверенности
 DEFAULT_CONFIDENCE_THRESHOLD: float = 0.3
+# Сколько кадров отдаём детектору за один вызов в батч-режиме
+DEFAULT_INFER_BATCH: int = 8
+
+#  Adaptive stride (detector.stride)
+# Максимальный шаг K между опорными кадрами (детекция раз в K кадров)
+STRIDE_MAX: int = 5
+# Сдвиг за кадр (медиана по боксам, в долях высоты бокса), выше которого K уменьшаем
+STRIDE_MOTION_HIGH: float = 0.08
+# Доля треков, пропавших к опорному кадру, выше которой K уменьшаем
+STRIDE_LOST_HIGH: float = 0.1
+# Ошибка предсказания на опорном кадре (p90, в долях высоты бокса), выше которой K уменьшаем на 1
+STRIDE_ERR_HIGH: float = 0.15
+# ... и ниже которой K растёт (между порогами K держим — гистерезис)
+STRIDE_ERR_LOW: float = 0.13
+# Сетка точек для оптического потока внутри бокса (grid × grid) и окно Лукаса-Канаде
+STRIDE_FLOW_GRID: int = 4
+STRIDE_FLOW_WIN: int = 15
+
+#  Мяч отдельной стадией (detector.ball)
+# Сторона окна вокруг предсказанной позиции мяча, px исходного кадра
+# (детектор растягивает окно до своего входа — мяч становится в разы крупнее)
+BALL_WINDOW_PX: int = 256
+# На сколько (доля стороны) окно растёт за каждый кадр без мяча
+BALL_WINDOW_GROW: float = 0.5
+# Сколько последних позиций мяча берём для оценки скорости
+BALL_HISTORY: int = 5
+# Кадров без мяча в окне, после которых переходим на обход плитками
+BALL_MAX_LOST: int = 8
+# Плитки обхода: сторона, перекрытие (px) и сколько плиток проверяем за кадр
+BALL_TILE_PX: int = 640
+BALL_TILE_OVERLAP: int = 64
+BALL_TILES_PER_FRAME: int = 2
+
+#  ONNX Runtime backend
+# Размер входа при экспорте .pt -> .onnx
+ONNX_IMGSZ: int = 640
+# IoU для NMS и максимум детекций на кадр (как у Ultralytics по умолчанию)
+ONNX_IOU: float = 0.7
+ONNX_MAX_DET: int = 300
+# Цвет серых полей letterbox
+LETTERBOX_FILL: int = 114
+
+#  Pipeline
+# Ёмкость очередей между стадиями decode/infer/render/encode (в кадрах)
+DEFAULT_QUEUE_SIZE: int = 16
+# Имена выходных видео
+DETECT_OUT_NAME: str = 'detect_out.mp4'
+RADARS_OUT_NAME: str = 'radars_out.mp4'
+# Строк в одном куске хранилища траекторий (~25 объектов × 2600 кадров)
+TRAJECTORY_CHUNK_ROWS: int = 65536
+
+#  Кэш детекций и точек поля на диске (detector.cache)
+# Кадров в одном куске (один .npy на кусок)
+DETECTION_CACHE_CHUNK: int = 256
+# Лимит размера каталога кэша, байт; сверх него вытесняются давно не читанные куски
+DETECTION_CACHE_MAX_BYTES: int = 4 << 30
+# Блок частичного отпечатка видео (начало / середина / конец файла), байт
+CACHE_HASH_BLOCK: int = 1 << 20
+
+#  Видео (utils.video)
+# Суффикс файла индекса кадров рядом с видео (<video>.futai-index.npz)
+VIDEO_INDEX_SUFFIX: str = '.futai-index.npz'
+# Без индекса (cv2): цель дальше стольких кадров — seek, ближе — дочитываем grab()
+VIDEO_SEEK_MIN_GAP: int = 50
+# Запись через PyAV: кодек, качество (crf) и скорость энкодера
+VIDEO_CODEC: str = 'libx264'
+VIDEO_CRF: int = 23
+VIDEO_PRESET: str = 'superfast'
+# Запись без PyAV (cv2.VideoWriter) — как у sv.VideoSink
+VIDEO_FALLBACK_FOURCC: str = 'mp4v'
+
+#  Матч по шардам (futai.match)
+# Сколько кадров перед началом шарда прогоняем повторно — на них сшиваем треки
+MATCH_SHARD_OVERLAP: int = 50
+# Сколько кадров шарда брать для fit классификатора команд, если нет team_model
+MATCH_FIT_FRAMES: int = 30
+# Сшивка: макс. среднее расстояние на поле (см) и мин. число общих кадров у пары треков
+STITCH_MAX_DIST_CM: float = 150.0
+STITCH_MIN_FRAMES: int = 5
+
+#  Мультипоточный сервер (futai.server)
+# Динамический батчинг: максимум кадров / кропов в батче и сколько ждём добора, мс
+SERVER_MAX_BATCH: int = 16
+SERVER_CROP_BATCH: int = 64
+SERVER_MAX_LATENCY_MS: float = 20.0
+# SLO на латентность кадра (от поступления до результата), мс
+SERVER_SLO_MS: float = 250.0
+# Окно кадров для квантилей латентности потока
+SERVER_LATENCY_WINDOW: int = 500
+
+#  Метрики (utils.metrics)
+# Скользящее окно для гистограмм / квантилей латентности (в кадрах)
+METRICS_WINDOW: int = 300
+# Границы бакетов гистограммы латентности стадий, секунды (как у Prometheus)
+METRICS_BUCKETS_S: tuple[float, ...] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                                        0.1, 0.25, 0.5, 1.0, 2.5)
+# Раз в сколько кадров переписывать текстовый файл для Prometheus
+METRICS_EXPORT_EVERY: int = 100
 
 #  SigLIP + clustering
 # Ппуть до предобученной SigLIP-модели в HF Hub
 SIGLIP_MODEL_NAME: str = 'google/siglip-base-patch16-224'
+# Как сворачиваем токены SigLIP в один эмбеддинг
+SIGLIP_POOLING: str = 'mean'
+# Версия формата файла с обученной моделью команд (save/load)
+TEAM_MODEL_FORMAT_VERSION: int = 1
 # Количество компонент для UMAP
 UMAP_N_COMPONENTS: int = 3
+# Регуляризация линейной карты эмбеддинги -> UMAP (projection="parametric"),
+# в долях среднего собственного значения X^T X
+PROJECTION_RIDGE_ALPHA: float = 1e-3
 # Количество кластеров (команд)
 KMEANS_N_CLUSTERS: int = 2
 # Девайс по умолчанию
 DEFAULT_DEVICE: str = 'cuda'
 # Размер батча для извлечения эмбеддингов
 DEFAULT_BATCH_SIZE: int = 32
+# Уменьшенный вход SigLIP для CPU (TeamClassifier(image_size=...)): 100 токенов вместо 196
+SIGLIP_CPU_IMAGE_SIZE: int = 160
+
+#  Потоковый fit модели команд (handmodel.streaming)
+# Шаг по кадрам ролика при сэмплировании (соседние кадры почти одинаковые)
+TEAM_FIT_STRIDE: int = 25
+# Сколько признаков кропов держим в резервуаре (SigLIP: 2000 × 768 float32 ≈ 6 МБ)
+TEAM_FIT_RESERVOIR: int = 2000
+# Не раньше стольких кропов считаем, что модель сошлась
+TEAM_FIT_MIN_SAMPLES: int = 200
+# Сдвиг центров за порцию (в долях расстояния между ними), ниже которого центры «стоят»
+TEAM_FIT_TOL: float = 0.05
+# Сколько порций подряд центры должны стоять, чтобы остановиться
+TEAM_FIT_PATIENCE: int = 2
+
+#  Гистограммный классификатор команд (бэкенд "hist")
+# Торс внутри кропа игрока: (x0, y0, x1, y1) в долях ширины/высоты
+HIST_TORSO_BOX: tuple[float, float, float, float] = (0.2, 0.15, 0.8, 0.55)
+# До какого размера (w, h) ужимаем торс перед гистограммой
+HIST_PATCH_SIZE: tuple[int, int] = (16, 24)
+# Бины гистограмм: H×S из HSV и a×b из Lab
+HIST_HUE_BINS: int = 18
+HIST_SAT_BINS: int = 4
+HIST_AB_BINS: int = 8
+# Диапазон тона газона (OpenCV hue 0..180) — такие пиксели не считаем
+HIST_GRASS_HUE: tuple[int, int] = (35, 85)
+
+#  Кэш команды по tracker_id
+# Сколько голосов классификатора нужно, чтобы закрепить команду за треком
+TEAM_CACHE_MIN_VOTES: int = 3
+# Окно последних голосов, по которому считаем большинство
+TEAM_CACHE_WINDOW: int = 15
+# Раз в сколько кадров перепроверяем уже закрепленный трек
+TEAM_CACHE_RECHECK_EVERY: int = 50
+# Ниже этой средней уверенности трек классифицируем каждый кадр
+TEAM_CACHE_LOW_CONFIDENCE: float = 0.2
+# Через сколько кадров без трека забываем его (как lost_track_buffer у ByteTrack)
+TRACK_MAX_AGE: int = 30
+
+#  Проекция на поле (PitchProjector)
+# Порог детекции поля и порог уверенности отдельной точки
+FIELD_DET_CONFIDENCE: float = 0.3
+FIELD_KP_CONFIDENCE: float = 0.5
+# temporal-режим: не дольше стольких кадров без модели точек поля
+HOMOGRAPHY_MAX_SKIP: int = 25
+# накопленный сдвиг камеры (px полного кадра), после которого зовём модель
+HOMOGRAPHY_MOTION_PX: float = 40.0
+# средняя ошибка репроекции точек (см на поле), выше — новую H не принимаем
+HOMOGRAPHY_REPROJ_CM: float = 200.0
+# накопленная ошибка предсказанной H (см на поле: медианный остаток LK-точек
+# под движением камеры), после которой зовём модель точек
+HOMOGRAPHY_DRIFT_CM: float = 100.0
+# вес предсказанной H при смешивании с H от модели (0 — без сглаживания)
+HOMOGRAPHY_SMOOTHING: float = 0.3
+# ширина уменьшенного кадра для оценки движения камеры и мин. число точек потока
+MOTION_FRAME_WIDTH: int = 320
+MOTION_MIN_POINTS: int = 12
 
 #  Class IDs
 BALL_CLASS_ID: int = 0
@@ -38,3 +200,12 @@ LABEL_TEXT_POSITION = None  # будем брать sv.Position.BOTTOM_CENTER в
 # Визуализация поля
 FIELD_SCALE: float = 0.10  # сантиметр -> пиксель
 FIELD_PADDING: int = 50  # px вокруг мини-карты
+# Радар-вставка в кадре (visualizer.Compositor): ширина в долях кадра и отступ снизу, px
+RADAR_INSET_WIDTH: float = 0.3
+RADAR_INSET_MARGIN: int = 16
+# Сколько разных отрисованных шаблонов поля держим в кэше
+PITCH_TEMPLATE_CACHE_SIZE: int = 16
+# Вороной: если сдвинулась бОльшая доля игроков команды — полный пересчёт
+VORONOI_MAX_CHANGED_RATIO: float = 0.5
+# Контроль пространства (pitch.control): кадров за один проход отсечения ячеек
+CONTROL_CHUNK_FRAMES: int = 256
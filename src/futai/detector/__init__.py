@@ -3,13 +3,20 @@ futai.detector
 ==============
 
 Здесь живёт единая «фабрика» детекторов.
-Сейчас factory оборачивает Ultralytics-YOLO,
-при желании можно добавить OpenVINO/ONNX/SAM и т.п.
+Backend'ы: Ultralytics-YOLO ("yolo") и ONNX Runtime на CPU ("onnx"),
+при желании можно добавить OpenVINO/SAM и т.п.
+
+Ultralytics отдаёт сырые `Results`, ONNX — уже sv.Detections / sv.KeyPoints;
+конвейер приводит и то и другое через as_detections / as_keypoints.
+
+ultralytics (а с ним torch) импортируется только при создании детектора —
+`import futai.detector` остаётся лёгким.
 """
 from __future__ import annotations
 from pathlib import Path
 from typing import Protocol, Any
-from ultralytics import YOLO
+
+import supervision as sv
 
 
 class Detector(Protocol):
@@ -17,23 +24,52 @@ class Detector(Protocol):
     def infer(self, frame: Any, *, confidence: float) -> Any: ...
 
 
+# Параметры predict Ultralytics, которые YOLODetector принимает как detector_options
+YOLO_PREDICT_OPTIONS = ("imgsz", "iou", "max_det", "half", "agnostic_nms", "augment")
+
+
 class YOLODetector:                       # <— раньше это был PlayerDetectionModel
-    """Обёртка над Ultralytics-YOLO с единым методом infer."""
-    def __init__(self, weights: str | Path, device: str | None = None) -> None:
+    """
+    Обёртка над Ultralytics-YOLO с единым методом infer.
+    **options — параметры predict из YOLO_PREDICT_OPTIONS, на каждый вызов infer.
+    """
+    def __init__(self, weights: str | Path, device: str | None = None, **options) -> None:
+        unknown = sorted(set(options) - set(YOLO_PREDICT_OPTIONS))
+        if unknown:
+            raise ValueError(f"Unsupported YOLO detector options: {unknown} "
+                             f"(expected any of {YOLO_PREDICT_OPTIONS}; quantize / threads — only for 'onnx')")
+        from ultralytics import YOLO  # тяжёлый импорт — только здесь
         self.model = YOLO(str(weights))
+        self.weights = weights
+        self.options = options
         if device:
             self.model.to(device)
 
     def infer(self, frame, *, confidence: float = 0.3, **kwargs):
         """Возвращает raw-`Results` Ultralytics."""
-        return self.model(frame, conf=confidence, verbose=False, **kwargs)
+        return self.model(frame, conf=confidence, verbose=False, **{**self.options, **kwargs})
 
 
-def build_detector(kind: str, weights: str, device: str | None = None) -> Detector:
+def build_detector(kind: str, weights: str, device: str | None = None, **kwargs) -> Detector:
     """
     Factory.  Параметр *kind* позволяет в будущем легко подменять backend.
+    **kwargs уходят в конструктор backend'а (для "yolo": YOLO_PREDICT_OPTIONS,
+    для "onnx": imgsz, quantize, intra_op_threads, inter_op_threads, ...).
     """
     kind = kind.lower()
     if kind in {"yolo", "yolov8", "ultralytics"}:
-        return YOLODetector(weights, device)
-    raise ValueError(f"Unknown detector type: {kind!r}")
\ No newline at end of file
+        return YOLODetector(weights, device, **kwargs)
+    if kind in {"onnx", "onnxruntime", "ort"}:
+        from .onnx_backend import ONNXDetector
+        return ONNXDetector(weights, device, **kwargs)
+    raise ValueError(f"Unknown detector type: {kind!r}")
+
+
+def as_detections(res: Any) -> sv.Detections:
+    """Один элемент ответа infer() -> sv.Detections (для любого backend'а)."""
+    return res if isinstance(res, sv.Detections) else sv.Detections.from_ultralytics(res)
+
+
+def as_keypoints(res: Any) -> sv.KeyPoints:
+    """То же для модели точек поля -> sv.KeyPoints."""
+    return res if isinstance(res, sv.KeyPoints) else sv.KeyPoints.from_ultralytics(res)
\ No newline at end of file
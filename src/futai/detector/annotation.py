@@ -2,6 +2,7 @@
 Создание преднастроенных аннотаторов Supervision.
 """
 
+import numpy as np
 import supervision as sv
 from typing import Any, Dict
 
@@ -45,4 +46,23 @@ def build_annotators() -> Dict[str, Any]:
         'ellipse': ellipse,
         'label': label,
         'triangle': triangle
-    }
\ No newline at end of file
+    }
+
+
+def annotate_frame(annotators: Dict[str, Any], frame, ball_det: sv.Detections,
+                   all_det: sv.Detections, out=None):
+    """
+    Кадр с эллипсами и #tracker_id у людей и треугольником над мячом.
+    all_det.class_id — номер команды (цвет палитры).
+    out=None — рисуем в копию, out=frame — прямо в кадр, иначе кадр копируется в out.
+    """
+    if out is None:
+        annotated = frame.copy()
+    else:
+        annotated = out
+        if out is not frame:
+            np.copyto(out, frame)
+    annotated = annotators["ellipse"].annotate(annotated, all_det)
+    labels = [f"#{tid}" for tid in all_det.tracker_id] if len(all_det) else []
+    annotated = annotators["label"].annotate(annotated, all_det, labels)
+    return annotators["triangle"].annotate(annotated, ball_det)
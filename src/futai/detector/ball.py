@@ -0,0 +1,178 @@
+"""
+Мяч отдельной стадией: в кадре трансляции он в несколько пикселей, и после
+ресайза всего кадра до входа детектора его часто не видно.
+
+BallTracker дополняет полнокадровую детекцию:
+  1) мяч нашёлся на полном кадре — берём его (ближайший к предсказанию)
+  2) нет — детектор на маленьком окне вокруг позиции, предсказанной по
+     последним кадрам (постоянная скорость). Окно детектор растягивает до
+     своего входа (letterbox), т.е. мяч смотрится в высоком разрешении
+  3) мяч потерян дольше max_lost кадров — обход кадра плитками в исходном
+     разрешении, по tiles_per_frame плиток за кадр (по кругу), пока не найдём
+
+stats()["cost_vs_full"] — цена стадии (входы детектора сверх полного кадра)
+в долях полного прохода по кадру с тем же увеличением, что даёт окно.
+"""
+from __future__ import annotations
+
+from collections import deque
+from typing import Any
+
+import numpy as np
+import supervision as sv
+
+from src.futai.constants import (
+    BALL_CLASS_ID,
+    DEFAULT_CONFIDENCE_THRESHOLD,
+    ONNX_IMGSZ,
+    BALL_WINDOW_PX,
+    BALL_WINDOW_GROW,
+    BALL_HISTORY,
+    BALL_MAX_LOST,
+    BALL_TILE_PX,
+    BALL_TILE_OVERLAP,
+    BALL_TILES_PER_FRAME
+)
+from . import as_detections
+
+
+def tile_grid(width: int, height: int, tile: int = BALL_TILE_PX,
+              overlap: int = BALL_TILE_OVERLAP) -> list[tuple[int, int, int, int]]:
+    """Плитки (x1, y1, x2, y2) с перекрытием, покрывающие кадр целиком."""
+    def starts(size: int) -> list[int]:
+        if size <= tile:
+            return [0]
+        step = tile - overlap
+        out = list(range(0, size - tile, step))
+        return out + [size - tile]
+    return [(x, y, min(x + tile, width), min(y + tile, height))
+            for y in starts(height) for x in starts(width)]
+
+
+class BallTracker:
+    """update(frame, ball_det, frame_idx) -> sv.Detections мяча (0 или 1 бокс)."""
+
+    def __init__(
+            self,
+            detector,
+            confidence: float = DEFAULT_CONFIDENCE_THRESHOLD,
+            window: int = BALL_WINDOW_PX,
+            history: int = BALL_HISTORY,
+            max_lost: int = BALL_MAX_LOST,
+            tile: int = BALL_TILE_PX,
+            tiles_per_frame: int = BALL_TILES_PER_FRAME,
+            imgsz: int = ONNX_IMGSZ
+    ):
+        # imgsz — сторона входа детектора: нужна только для оценки цены в stats()
+        self.detector = detector
+        self.confidence = confidence
+        self.window = window
+        self.max_lost = max_lost
+        self.tile = tile
+        self.tiles_per_frame = tiles_per_frame
+        self.imgsz = imgsz
+        self._history: deque[tuple[int, np.ndarray]] = deque(maxlen=history)
+        self._tiles: list[tuple[int, int, int, int]] = []
+        self._next_tile = 0
+        self.reset()
+
+    def reset(self) -> None:
+        self._history.clear()
+        self.lost = self.max_lost + 1  # мяча ещё не видели — сразу обход
+        self.found = {"full": 0, "window": 0, "sweep": 0}
+        self.frames = self.missed = self.calls = self.inputs = 0
+        self._full_px = 0.0  # пикселей входа у полного прохода с увеличением окна
+
+    def predict(self, frame_idx: int) -> np.ndarray | None:
+        """
+        Центр мяча на frame_idx по последним позициям (постоянная скорость).
+        Дальше чем на длину истории не экстраполируем — там ошибка скорости
+        уже больше, чем окно, которое растёт вместе с потерей.
+        """
+        if not self._history:
+            return None
+        (f0, p0), (f1, p1) = self._history[0], self._history[-1]
+        v = (p1 - p0) / (f1 - f0) if f1 > f0 else np.zeros(2)
+        return p1 + v * min(frame_idx - f1, self._history.maxlen)
+
+    def update(self, frame: np.ndarray, ball_det: sv.Detections, frame_idx: int) -> sv.Detections:
+        self.frames += 1
+        h, w = frame.shape[:2]
+        side = self.window * (1 + BALL_WINDOW_GROW * min(self.lost, self.max_lost))
+        self._full_px += w * h * (self.imgsz / self.window) ** 2
+        pred = self.predict(frame_idx)
+        tracking = pred is not None and self.lost <= self.max_lost
+        if not tracking:
+            pred = None
+
+        best, source = self._pick(ball_det, pred, side), "full"
+        if best is None and tracking:
+            best, source = self._pick(self._window(frame, pred, side), pred, side), "window"
+        elif best is None:
+            best, source = self._pick(self._sweep(frame), None, side), "sweep"
+
+        if best is None:
+            self.lost += 1
+            self.missed += 1
+            return ball_det[:0]
+        self.found[source] += 1
+        self.lost = 0
+        self._history.append((frame_idx, _center(best.xyxy[0])))
+        return best
+
+    def _pick(self, det: sv.Detections, pred: np.ndarray | None, side: float) -> sv.Detections | None:
+        """Один мяч: ближайший к предсказанию (в пределах окна) или самый уверенный."""
+        if not len(det):
+            return None
+        if pred is None:
+            return det[[int(np.argmax(det.confidence))]]
+        d = np.linalg.norm(_centers(det.xyxy) - pred, axis=1)
+        i = int(np.argmin(d))
+        return det[[i]] if d[i] <= side else None
+
+    def _infer(self, frame: np.ndarray, boxes: list[tuple[int, int, int, int]]) -> sv.Detections:
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes]
+        self.calls += 1
+        self.inputs += len(crops)
+        found = []
+        for (x1, y1, x2, y2), res in zip(boxes, self.detector.infer(crops, confidence=self.confidence)):
+            det = as_detections(res)
+            det = det[det.class_id == BALL_CLASS_ID]
+            det.xyxy = det.xyxy + np.array([x1, y1, x1, y1], dtype=det.xyxy.dtype)
+            found.append(det)
+        return sv.Detections.merge(found)
+
+    def _window(self, frame: np.ndarray, center: np.ndarray, side: float) -> sv.Detections:
+        h, w = frame.shape[:2]
+        s = int(min(side, w, h))
+        x1 = int(np.clip(center[0] - s / 2, 0, w - s))
+        y1 = int(np.clip(center[1] - s / 2, 0, h - s))
+        return self._infer(frame, [(x1, y1, x1 + s, y1 + s)])
+
+    def _sweep(self, frame: np.ndarray) -> sv.Detections:
+        h, w = frame.shape[:2]
+        if not self._tiles or self._tiles[-1][2:] != (w, h):
+            self._tiles = tile_grid(w, h, self.tile)
+            self._next_tile = 0
+        n = min(self.tiles_per_frame, len(self._tiles))
+        boxes = [self._tiles[(self._next_tile + i) % len(self._tiles)] for i in range(n)]
+        self._next_tile = (self._next_tile + n) % len(self._tiles)
+        return self._infer(frame, boxes)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "frames": self.frames,
+            "found": dict(self.found),
+            "missed": self.missed,
+            "found_ratio": 1 - self.missed / self.frames if self.frames else 0.0,
+            "extra_calls": self.calls,
+            "cost_vs_full": self.inputs * self.imgsz ** 2 / self._full_px if self._full_px else 0.0
+        }
+
+
+def _center(xyxy: np.ndarray) -> np.ndarray:
+    return np.array([(xyxy[0] + xyxy[2]) / 2, (xyxy[1] + xyxy[3]) / 2], dtype=float)
+
+
+def _centers(xyxy: np.ndarray) -> np.ndarray:
+    return (xyxy[:, :2] + xyxy[:, 2:]) / 2
@@ -0,0 +1,377 @@
+"""
+Кэш детекций и точек поля на диске, адресуемый отпечатком видео.
+
+Пока крутим классификацию команд, вратарей или отрисовку, боксы и точки поля
+не меняются — незачем снова гонять обе YOLO по всему ролику. CachedDetector
+оборачивает любой детектор: кадры с известным номером (infer_indexed) берутся
+из кэша, модель зовётся только на промахах, тёплый кэш — ни одного вызова.
+
+Ключ пространства — blake2b от отпечатка видео (размер, mtime и блоки из
+начала, середины и конца файла), хэша весов и параметров инференса: другой
+ролик, другие веса или другой confidence — другое пространство, старое не
+мешает. Отпечаток частичный: весь ролик не читается, поэтому перезапись файла
+тем же размером ловит mtime (cp -p / rsync -a его сохраняют — кэш переезжает
+вместе с видео), а не содержимое.
+
+    <root>/<key>/meta.json        — вид (detections / keypoints), параметры, dtype строк
+    <root>/<key>/c_000012.npy     — строки кадров куска 12 (структурный массив,
+                                    по возрастанию frame; class_id == -1 — кадр без объектов)
+
+Кусок — один .npy (атомарная замена через os.replace), читается через
+np.load(mmap_mode="r"). Общий размер root ограничен max_bytes: при записи
+удаляются куски, которых дольше всех не читали (mtime обновляется при чтении).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Iterable
+
+import numpy as np
+import supervision as sv
+
+from src.futai.constants import (
+    DETECTION_CACHE_CHUNK,
+    DETECTION_CACHE_MAX_BYTES,
+    CACHE_HASH_BLOCK
+)
+from . import as_detections, as_keypoints
+
+META_NAME = "meta.json"
+KINDS = ("detections", "keypoints")
+
+DETECTIONS_DTYPE = np.dtype([
+    ("frame", np.int32),
+    ("class_id", np.int32),  # -1 — заглушка: кадр посчитан, объектов нет
+    ("confidence", np.float32),
+    ("xyxy", np.float32, (4,)),
+])
+
+
+def keypoints_dtype(n_points: int) -> np.dtype:
+    return np.dtype([
+        ("frame", np.int32),
+        ("class_id", np.int32),
+        ("xy", np.float32, (n_points, 2)),
+        ("confidence", np.float32, (n_points,)),
+    ])
+
+
+# ключ
+def video_fingerprint(path: str | Path, block: int = CACHE_HASH_BLOCK) -> str:
+    """
+    Частичный отпечаток без чтения всего ролика: размер + mtime + blake2b трёх
+    блоков (начало, середина, конец). Перекодированный или обрезанный файл того же
+    размера отличается где-то между блоками — его отделяет mtime.
+    """
+    path = Path(path)
+    st = path.stat()
+    size = st.st_size
+    h = hashlib.blake2b(f"{size}:{st.st_mtime_ns}".encode(), digest_size=16)
+    with path.open("rb") as f:
+        for pos in sorted({0, max(size // 2 - block // 2, 0), max(size - block, 0)}):
+            f.seek(pos)
+            h.update(f.read(block))
+    return h.hexdigest()
+
+
+@lru_cache(maxsize=32)
+def _file_digest(path: str, size: int, mtime_ns: int) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 22):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def weights_digest(weights: Any) -> str:
+    """blake2b файла весов; не файл (заглушка, имя модели hub) — хэш самой строки."""
+    if weights is not None and Path(str(weights)).is_file():
+        st = Path(str(weights)).stat()
+        return _file_digest(str(Path(str(weights)).resolve()), st.st_size, st.st_mtime_ns)
+    return hashlib.blake2b(str(weights).encode(), digest_size=16).hexdigest()
+
+
+def cache_key(video_path: str | Path, weights: Any, params: dict) -> str:
+    blob = json.dumps({"video": video_fingerprint(video_path), "weights": weights_digest(weights),
+                       "params": params}, sort_keys=True, default=str)
+    return hashlib.blake2b(blob.encode(), digest_size=16).hexdigest()
+
+
+# строки <-> sv.Detections / sv.KeyPoints
+def _empty(frame: int, dtype: np.dtype) -> np.ndarray:
+    rows = np.zeros(1, dtype)
+    rows["frame"], rows["class_id"] = frame, -1
+    return rows
+
+
+def detections_to_rows(frame: int, det: sv.Detections) -> np.ndarray:
+    if not len(det):
+        return _empty(frame, DETECTIONS_DTYPE)
+    rows = np.zeros(len(det), DETECTIONS_DTYPE)
+    rows["frame"] = frame
+    rows["class_id"] = det.class_id
+    rows["confidence"] = det.confidence if det.confidence is not None else 1.0
+    rows["xyxy"] = det.xyxy
+    return rows
+
+
+def rows_to_detections(rows: np.ndarray) -> sv.Detections:
+    rows = rows[rows["class_id"] >= 0]
+    if not len(rows):
+        return sv.Detections.empty()
+    return sv.Detections(xyxy=np.array(rows["xyxy"]), confidence=np.array(rows["confidence"]),
+                         class_id=np.array(rows["class_id"]).astype(int))
+
+
+def keypoints_to_rows(frame: int, kp: sv.KeyPoints, dtype: np.dtype) -> np.ndarray:
+    if not len(kp):
+        return _empty(frame, dtype)
+    rows = np.zeros(len(kp), dtype)
+    rows["frame"] = frame
+    rows["class_id"] = kp.class_id if kp.class_id is not None else 0
+    rows["xy"] = kp.xy
+    rows["confidence"] = kp.confidence if kp.confidence is not None else 1.0
+    return rows
+
+
+def rows_to_keypoints(rows: np.ndarray) -> sv.KeyPoints:
+    rows = rows[rows["class_id"] >= 0]
+    if not len(rows):
+        return sv.KeyPoints.empty()
+    return sv.KeyPoints(xy=np.array(rows["xy"]), confidence=np.array(rows["confidence"]),
+                        class_id=np.array(rows["class_id"]).astype(int))
+
+
+class DetectionCache:
+    """Каталог с пространствами кэша; общий лимит размера и LRU-вытеснение кусков."""
+
+    def __init__(self, root: str | Path, max_bytes: int = DETECTION_CACHE_MAX_BYTES,
+                 chunk_frames: int = DETECTION_CACHE_CHUNK):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.chunk_frames = chunk_frames
+        self.evicted = 0
+
+    def store(self, key: str, kind: str, params: dict | None = None) -> "FrameStore":
+        if kind not in KINDS:
+            raise ValueError(f"Unknown cache kind: {kind!r}")
+        return FrameStore(self, self.root / key, kind, params or {})
+
+    def _chunks(self) -> list[tuple[float, int, Path]]:
+        out = []
+        for path in self.root.glob("*/c_*.npy"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:  # вытеснил соседний процесс
+                continue
+            out.append((st.st_mtime, st.st_size, path))
+        return out
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self._chunks())
+
+    def evict(self, keep: Path | None = None) -> int:
+        """Удалить давно не читанные куски, пока root не влезет в max_bytes."""
+        chunks = sorted(self._chunks())
+        total = sum(size for _, size, _ in chunks)
+        removed = 0
+        for _, size, path in chunks:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        self.evicted += removed
+        return removed
+
+
+class FrameStore:
+    """
+    Строки одного пространства по номерам кадров. get() — view в memmap куска
+    (None — кадра нет), put() копит кусок в памяти; на диск — при переходе
+    к другому куску и в flush().
+    """
+
+    def __init__(self, cache: DetectionCache, path: Path, kind: str, params: dict):
+        self.cache = cache
+        self.path = path
+        self.kind = kind
+        self.params = params
+        self.chunk_frames = cache.chunk_frames
+        self.dtype: np.dtype | None = DETECTIONS_DTYPE if kind == "detections" else None
+        meta = path / META_NAME
+        if meta.exists():
+            descr = json.loads(meta.read_text())["dtype"]
+            self.dtype = np.dtype([tuple(f) if len(f) == 2 else (f[0], f[1], tuple(f[2]))
+                                   for f in descr])
+        self._loaded: tuple[int, np.ndarray | None] | None = None  # (кусок, строки)
+        self._pending_chunk: int | None = None
+        self._pending: dict[int, np.ndarray] = {}
+
+    def _chunk_path(self, chunk: int) -> Path:
+        return self.path / f"c_{chunk:06d}.npy"
+
+    def _load(self, chunk: int) -> np.ndarray | None:
+        if self._loaded is not None and self._loaded[0] == chunk:
+            return self._loaded[1]
+        path = self._chunk_path(chunk)
+        try:
+            rows = np.load(path, mmap_mode="r")
+            os.utime(path)  # LRU: недавно читали
+        except (FileNotFoundError, ValueError):  # нет / вытеснен / недописан чужим процессом
+            rows = None
+        self._loaded = (chunk, rows)
+        return rows
+
+    def get(self, frame: int) -> np.ndarray | None:
+        chunk = frame // self.chunk_frames
+        if chunk == self._pending_chunk and frame in self._pending:
+            return self._pending[frame]
+        rows = self._load(chunk)
+        if rows is None:
+            return None
+        lo, hi = np.searchsorted(rows["frame"], [frame, frame + 1])
+        return rows[lo:hi] if hi > lo else None
+
+    def put(self, frame: int, rows: np.ndarray) -> None:
+        chunk = frame // self.chunk_frames
+        if chunk != self._pending_chunk:
+            self.flush()
+            self._pending_chunk = chunk
+        if self.dtype is None:
+            self.dtype = rows.dtype
+        self._pending[frame] = rows.astype(self.dtype, copy=False)
+
+    def flush(self) -> None:
+        """Слить накопленное с куском на диске (если он есть) и записать атомарно."""
+        if not self._pending:
+            return
+        chunk = self._pending_chunk
+        self.path.mkdir(parents=True, exist_ok=True)
+        meta = self.path / META_NAME
+        if not meta.exists():
+            tmp = meta.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"kind": self.kind, "params": self.params,
+                                       "dtype": self.dtype.descr}, default=str))
+            os.replace(tmp, meta)
+
+        old = self._load(chunk)
+        parts = list(self._pending.values())
+        if old is not None:
+            parts.append(np.array(old[~np.isin(old["frame"], list(self._pending))]))
+        rows = np.concatenate(parts)
+        rows = rows[np.argsort(rows["frame"], kind="stable")]
+        path = self._chunk_path(chunk)
+        tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+        with tmp.open("wb") as f:
+            np.save(f, rows)
+        os.replace(tmp, path)
+        self._loaded = None
+        self._pending = {}
+        self.cache.evict(keep=path)
+
+
+class CachedDetector:
+    """
+    Детектор с кэшем. infer(frames, confidence=..., frame_idx=[...]) — кадры
+    с номерами: попадания из кэша, промахи одним вызовом модели. Без frame_idx,
+    с другим confidence или доп. kwargs — прямо в модель, мимо кэша.
+    Ответы — всегда sv.Detections / sv.KeyPoints (холодный и тёплый прогон одинаковы).
+    """
+
+    def __init__(self, detector, store: FrameStore, confidence: float):
+        self.detector = detector
+        self.store = store
+        self.confidence = confidence
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name: str):
+        # остальное (model, weights, imgsz, ...) — как у обёрнутого детектора
+        return getattr(self.detector, name)
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "evicted_chunks": self.store.cache.evicted}
+
+    def _decode(self, rows: np.ndarray):
+        return rows_to_detections(rows) if self.store.kind == "detections" else rows_to_keypoints(rows)
+
+    def _encode(self, frame: int, res) -> tuple[Any, np.ndarray]:
+        if self.store.kind == "detections":
+            det = as_detections(res)
+            return det, detections_to_rows(frame, det)
+        kp = as_keypoints(res)
+        if self.store.dtype is None and not len(kp):
+            return kp, None  # число точек модели ещё не знаем — этот кадр не кэшируем
+        dtype = self.store.dtype or keypoints_dtype(kp.xy.shape[1])
+        if len(kp) and kp.xy.shape[1] != dtype["xy"].shape[0]:
+            return kp, None  # другая модель с тем же ключом — не кэшируем
+        return kp, keypoints_to_rows(frame, kp, dtype)
+
+    def infer(self, frame, *, confidence: float = None, frame_idx: int | Iterable[int] | None = None,
+              **kwargs) -> list[Any]:
+        confidence = self.confidence if confidence is None else confidence
+        if frame_idx is None or kwargs or confidence != self.confidence:
+            return self.detector.infer(frame, confidence=confidence, **kwargs)
+        frames = frame if isinstance(frame, list) else [frame]
+        idxs = [frame_idx] if isinstance(frame_idx, (int, np.integer)) else list(frame_idx)
+
+        out: list[Any] = []
+        for i in idxs:
+            rows = self.store.get(int(i))
+            out.append(None if rows is None else self._decode(rows))
+        miss = [k for k, res in enumerate(out) if res is None]
+        self.hits += len(out) - len(miss)
+        self.misses += len(miss)
+        if miss:
+            results = self.detector.infer([frames[k] for k in miss], confidence=confidence)
+            for k, res in zip(miss, results):
+                out[k], rows = self._encode(int(idxs[k]), res)
+                if rows is not None:
+                    self.store.put(int(idxs[k]), rows)
+        return out
+
+    def flush(self) -> None:
+        self.store.flush()
+
+
+def cached_detector(detector, cache_dir: str | Path, video_path: str | Path, kind: str,
+                    confidence: float, weights: Any = None, params: dict | None = None,
+                    max_bytes: int = DETECTION_CACHE_MAX_BYTES) -> CachedDetector:
+    """
+    Обернуть detector кэшем в cache_dir. weights — путь к весам (по умолчанию
+    detector.weights или имя класса), params — всё, что меняет ответ модели
+    (backend, imgsz, квантизация, ...), confidence в ключ входит сам.
+    """
+    if weights is None:
+        weights = getattr(detector, "weights", None) or type(detector).__qualname__
+    params = {"kind": kind, "backend": type(detector).__name__,
+              "confidence": confidence, **(params or {})}
+    cache = DetectionCache(cache_dir, max_bytes)
+    store = cache.store(cache_key(video_path, weights, params), kind, params)
+    return CachedDetector(detector, store, confidence)
+
+
+def infer_indexed(detector, frames: list, first: int, confidence: float) -> list[Any]:
+    """Кадры first, first + 1, ...: у CachedDetector — через кэш, у остальных — как обычно."""
+    if isinstance(detector, CachedDetector):
+        return detector.infer(frames, confidence=confidence, frame_idx=range(first, first + len(frames)))
+    return detector.infer(frames, confidence=confidence)
+
+
+def flush_cached(*detectors) -> None:
+    """Дописать незакрытые куски у тех, кто CachedDetector."""
+    for det in detectors:
+        if isinstance(det, CachedDetector):
+            det.flush()
@@ -4,7 +4,6 @@
 
 import numpy as np
 import supervision as sv
-from ultralytics import YOLO
 
 from src.futai.constants import DEFAULT_CONFIDENCE_THRESHOLD
 
@@ -15,6 +14,7 @@ class PlayerDetectionModel:
     """
 
     def __init__(self, weights_path: str, device: str = None):
+        from ultralytics import YOLO  # тяжёлый импорт — только при создании модели
         self.model = YOLO(weights_path)
         if device:
             self.model.to(device)
@@ -0,0 +1,195 @@
+"""
+ONNX Runtime CPU-бэкенд для YOLO-весов (игроки и 32 точки поля).
+
+  - export_onnx   — .pt -> .onnx через Ultralytics (один раз, дальше берём из кэша)
+  - quantize_onnx — динамическая INT8-квантизация весов
+  - ONNXDetector  — тот же infer(frame, confidence=...), что у YOLODetector,
+                    но отдаёт уже готовые sv.Detections / sv.KeyPoints
+                    (см. as_detections / as_keypoints в futai.detector)
+"""
+from __future__ import annotations
+
+import ast
+from pathlib import Path
+from typing import Any
+
+import cv2
+import numpy as np
+import supervision as sv
+
+from src.futai.constants import (
+    DEFAULT_CONFIDENCE_THRESHOLD,
+    ONNX_IMGSZ,
+    ONNX_IOU,
+    ONNX_MAX_DET,
+    LETTERBOX_FILL
+)
+
+
+def export_onnx(weights: str | Path, imgsz: int = ONNX_IMGSZ, dynamic: bool = True) -> Path:
+    """
+    Экспорт .pt -> .onnx рядом с весами. Если .onnx свежее .pt — просто возвращаем путь.
+    dynamic=True — батч переменного размера (нужен для process_batch).
+    """
+    weights = Path(weights)
+    onnx_path = weights.with_suffix(".onnx")
+    if onnx_path.exists() and onnx_path.stat().st_mtime >= weights.stat().st_mtime:
+        return onnx_path
+    from ultralytics import YOLO  # нужен только для экспорта
+    return Path(YOLO(str(weights)).export(format="onnx", imgsz=imgsz,
+                                          dynamic=dynamic, simplify=True))
+
+
+def quantize_onnx(onnx_path: str | Path) -> Path:
+    """Динамическая INT8-квантизация (веса int8, активации квантуются на лету)."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    onnx_path = Path(onnx_path)
+    out = onnx_path.with_name(onnx_path.stem + ".int8.onnx")
+    if not out.exists() or out.stat().st_mtime < onnx_path.stat().st_mtime:
+        quantize_dynamic(str(onnx_path), str(out), weight_type=QuantType.QInt8)
+    return out
+
+
+def letterbox(frame: np.ndarray, size: tuple[int, int]) -> tuple[np.ndarray, float, tuple[float, float]]:
+    """
+    Как LetterBox у Ultralytics: ресайз с сохранением пропорций + серые поля.
+    Возвращает (картинка, масштаб, (pad_x, pad_y)).
+    """
+    h, w = frame.shape[:2]
+    th, tw = size
+    r = min(th / h, tw / w)
+    nw, nh = round(w * r), round(h * r)
+    dw, dh = (tw - nw) / 2, (th - nh) / 2
+    img = cv2.resize(frame, (nw, nh), interpolation=cv2.INTER_LINEAR) if (nw, nh) != (w, h) else frame
+    top, left = round(dh - 0.1), round(dw - 0.1)
+    img = cv2.copyMakeBorder(img, top, th - nh - top, left, tw - nw - left,
+                             cv2.BORDER_CONSTANT, value=(LETTERBOX_FILL,) * 3)
+    return img, r, (left, top)
+
+
+class ONNXDetector:
+    """
+    YOLOv8 (detect / pose) на ONNX Runtime, CPUExecutionProvider.
+    Потоки intra/inter-op настраиваются, quantize=True — INT8-модель.
+    """
+
+    def __init__(
+            self,
+            weights: str | Path,
+            device: str | None = None,  # для совместимости с build_detector: всегда CPU
+            *,
+            imgsz: int = ONNX_IMGSZ,
+            intra_op_threads: int | None = None,
+            inter_op_threads: int | None = None,
+            quantize: bool = False,
+            iou: float = ONNX_IOU,
+            max_det: int = ONNX_MAX_DET
+    ) -> None:
+        import onnxruntime as ort  # тяжёлый импорт — только здесь
+
+        weights = Path(weights)
+        if weights.suffix == ".pt":
+            weights = export_onnx(weights, imgsz=imgsz)
+        if quantize:
+            weights = quantize_onnx(weights)
+        self.weights = weights
+
+        so = ort.SessionOptions()
+        so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            so.intra_op_num_threads = intra_op_threads
+        if inter_op_threads:
+            so.inter_op_num_threads = inter_op_threads
+            if inter_op_threads > 1:
+                so.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        self.session = ort.InferenceSession(str(weights), so,
+                                            providers=["CPUExecutionProvider"])
+
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        # статический батч = 1, если экспортировали без dynamic
+        self.static_batch = inp.shape[0] if isinstance(inp.shape[0], int) else None
+        h, w = inp.shape[2:4]
+        self.imgsz = (h if isinstance(h, int) else imgsz, w if isinstance(w, int) else imgsz)
+
+        # Ultralytics кладёт в метаданные ONNX имена классов, задачу и форму keypoints
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.names: dict[int, str] = ast.literal_eval(meta["names"]) if "names" in meta else {}
+        self.task = meta.get("task", "detect")
+        self.kpt_shape = ast.literal_eval(meta["kpt_shape"]) if "kpt_shape" in meta else None
+        # выход (B, 4 + nc [+ K*3], N): число классов — из names или по ширине выхода
+        kpt_len = int(np.prod(self.kpt_shape)) if self.kpt_shape else 0
+        self.nc = len(self.names) or self.session.get_outputs()[0].shape[1] - 4 - kpt_len
+        self.iou = iou
+        self.max_det = max_det
+
+    def infer(self, frame, *, confidence: float = DEFAULT_CONFIDENCE_THRESHOLD, **kwargs) -> list[Any]:
+        """
+        Кадр или список кадров -> список sv.Detections (detect) / sv.KeyPoints (pose),
+        по одному на кадр — как список Results у Ultralytics.
+        """
+        frames = frame if isinstance(frame, (list, tuple)) else [frame]
+        if not frames:
+            return []
+        boxed = [letterbox(f, self.imgsz) for f in frames]
+
+        # BGR uint8 HWC -> RGB float32 NCHW одной операцией на весь батч
+        batch = np.stack([b[0] for b in boxed])[..., ::-1].transpose(0, 3, 1, 2)
+        batch = np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+
+        step = self.static_batch or len(frames)
+        preds = np.concatenate([
+            self.session.run(None, {self.input_name: batch[i: i + step]})[0]
+            for i in range(0, len(frames), step)
+        ])
+        return [
+            self._decode(pred, r, pad, f.shape[:2], confidence)
+            for pred, (_, r, pad), f in zip(preds, boxed, frames)
+        ]
+
+    def _decode(self, pred: np.ndarray, r: float, pad: tuple[float, float],
+                shape: tuple[int, int], confidence: float):
+        # pred: (4 + nc [+ K*3], N) -> (N, ...)
+        pred = pred.T
+        nc = self.nc
+        scores = pred[:, 4:4 + nc]
+        class_id = scores.argmax(axis=1)
+        conf = scores[np.arange(len(pred)), class_id]
+        keep = conf >= confidence
+        pred, class_id, conf = pred[keep], class_id[keep], conf[keep]
+
+        # cx, cy, w, h в координатах letterbox -> xyxy исходного кадра
+        xyxy = np.empty((len(pred), 4), dtype=np.float32)
+        xyxy[:, :2] = pred[:, :2] - pred[:, 2:4] / 2
+        xyxy[:, 2:] = pred[:, :2] + pred[:, 2:4] / 2
+        xyxy -= np.array([pad[0], pad[1], pad[0], pad[1]], dtype=np.float32)
+        xyxy /= r
+        h, w = shape
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, w)
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, h)
+
+        # NMS по классам, как у Ultralytics (agnostic=False), затем top max_det
+        if len(xyxy):
+            nms = sv.box_non_max_suppression(
+                np.hstack([xyxy, conf[:, None], class_id[:, None]]), iou_threshold=self.iou)
+            idx = np.flatnonzero(nms)
+            idx = idx[np.argsort(-conf[idx])][: self.max_det]
+        else:
+            idx = np.empty(0, dtype=int)
+        xyxy, conf, class_id = xyxy[idx], conf[idx].astype(np.float32), class_id[idx].astype(int)
+
+        if self.task == "pose":
+            k, dims = self.kpt_shape
+            kpts = pred[idx, 4 + nc:].reshape(-1, k, dims)
+            xy = (kpts[..., :2] - np.asarray(pad, dtype=np.float32)) / r
+            kconf = kpts[..., 2] if dims == 3 else np.ones(xy.shape[:2], np.float32)
+            return sv.KeyPoints(xy=xy.astype(np.float32), confidence=kconf.astype(np.float32),
+                                class_id=class_id)
+
+        return sv.Detections(
+            xyxy=xyxy,
+            confidence=conf,
+            class_id=class_id,
+            data={"class_name": np.array([self.names.get(c, str(c)) for c in class_id])}
+        )
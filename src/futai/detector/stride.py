@@ -0,0 +1,152 @@
+"""
+Адаптивный шаг детекции: детектор только на опорных кадрах, между ними
+боксы двигает оптический поток (пирамидальный Лукас-Канаде по сетке точек бокса).
+
+  - flow_boxes     — сдвинуть боксы с кадра prev на кадр cur
+  - AdaptiveStride — решает, какой кадр опорный; K растёт на спокойных участках
+                     и падает вдвое при быстром движении или потере треков,
+                     на 1 — при большой ошибке предсказания.
+                     На опорном кадре сравнивает предсказание потока со свежей
+                     детекцией — это и есть ошибка режима относительно
+                     детекции на каждом кадре (stats()["keyframe_err_px"])
+"""
+from __future__ import annotations
+
+from typing import Any
+
+import cv2
+import numpy as np
+
+from src.futai.constants import (
+    STRIDE_MAX,
+    STRIDE_MOTION_HIGH,
+    STRIDE_LOST_HIGH,
+    STRIDE_ERR_HIGH,
+    STRIDE_ERR_LOW,
+    STRIDE_FLOW_GRID,
+    STRIDE_FLOW_WIN
+)
+
+_LK = dict(winSize=(STRIDE_FLOW_WIN, STRIDE_FLOW_WIN), maxLevel=3,
+           criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+
+
+def flow_boxes(prev_gray: np.ndarray, gray: np.ndarray, xyxy: np.ndarray,
+               grid: int = STRIDE_FLOW_GRID) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Сдвиг боксов (N, 4) с prev_gray на gray: медиана потока по grid × grid
+    точкам внутри бокса. Возвращает (новые xyxy, ok, сдвиг px (N, 2)).
+    ok=False — у бокса мало надёжных точек (однотонная форма, размытие):
+    он едет вместе с медианой остальных, т.е. в основном с камерой.
+    """
+    n = len(xyxy)
+    if n == 0:
+        return xyxy.copy(), np.zeros(0, dtype=bool), np.zeros((0, 2), dtype=np.float32)
+    g = (0.1 + 0.8 * (np.arange(grid) + 0.5) / grid).astype(np.float32)
+    u, v = (a.ravel() for a in np.meshgrid(g, g))
+    x1, y1, x2, y2 = (xyxy[:, [k]].astype(np.float32) for k in range(4))
+    pts = np.stack([x1 + u * (x2 - x1), y1 + v * (y2 - y1)], axis=-1)  # (N, grid², 2)
+
+    nxt, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, pts.reshape(-1, 1, 2), None, **_LK)
+    d = (nxt.reshape(n, -1, 2) - pts)
+    good = status.reshape(n, -1).astype(bool)
+    ok = good.sum(axis=1) >= max(grid * grid // 3, 2)
+
+    shift = np.zeros((n, 2), dtype=np.float32)
+    for i in np.flatnonzero(ok):
+        shift[i] = np.median(d[i][good[i]], axis=0)
+    if ok.any():
+        shift[~ok] = np.median(shift[ok], axis=0)
+    return xyxy + np.tile(shift, 2), ok, shift
+
+
+class AdaptiveStride:
+    """
+    Раз на кадр: keyframe() -> детектить ли его. Потом отчитаться:
+      - observe_flow(...)     — после промежуточного кадра
+      - observe_keyframe(...) — после опорного
+    """
+
+    def __init__(self, max_stride: int = STRIDE_MAX, motion_high: float = STRIDE_MOTION_HIGH,
+                 lost_high: float = STRIDE_LOST_HIGH, err_high: float = STRIDE_ERR_HIGH,
+                 err_low: float = STRIDE_ERR_LOW):
+        self.max_stride = max_stride
+        self.motion_high = motion_high
+        self.lost_high = lost_high
+        self.err_high = err_high
+        self.err_low = err_low
+        self.reset()
+
+    def reset(self) -> None:
+        self.k = 1  # начинаем с детекции на каждом кадре, K набираем по ходу
+        self._gap = 0  # кадров после последнего опорного
+        self._force = True
+        self.frames = self.keyframes = self.shrinks = 0
+        self._k_sum = 0
+        self._err: list[np.ndarray] = []
+
+    def keyframe(self) -> bool:
+        self.frames += 1
+        self._k_sum += self.k
+        if self._force or self._gap + 1 >= self.k:
+            self._force = False
+            self._gap = 0
+            self.keyframes += 1
+            return True
+        self._gap += 1
+        return False
+
+    def _shrink(self, halve: bool = True) -> None:
+        self.k = max(self.k // 2 if halve else self.k - 1, 1)
+        self.shrinks += 1
+
+    @staticmethod
+    def _motion(shift: np.ndarray, xyxy: np.ndarray) -> float:
+        """Медианный сдвиг за кадр в долях высоты бокса."""
+        if not len(shift):
+            return 0.0
+        h = np.maximum(xyxy[:, 3] - xyxy[:, 1], 1.0)
+        return float(np.median(np.linalg.norm(shift, axis=1) / h))
+
+    def observe_flow(self, shift: np.ndarray, xyxy: np.ndarray) -> None:
+        """Промежуточный кадр: резкое движение — K вдвое, следующий кадр опорный."""
+        if self._motion(shift, xyxy) > self.motion_high:
+            self._shrink()
+            self._force = True
+
+    def observe_keyframe(self, err_px: np.ndarray, height: np.ndarray, lost: float,
+                         shift: np.ndarray, xyxy: np.ndarray) -> None:
+        """
+        Опорный кадр. err_px / height — расстояние (px) от предсказания потока
+        до детекции и высота бокса для треков, видимых в обоих кадрах;
+        lost — доля треков прошлого кадра, пропавших в этом;
+        shift / xyxy — поток прошлых боксов на этот кадр.
+        Потеря треков и резкое движение — K вдвое; ошибка выше err_high — K на 1
+        меньше, ниже err_low — на 1 больше, между ними K держим.
+        """
+        err_px = np.asarray(err_px, dtype=float)
+        self._err.append(err_px)
+        err = float(np.percentile(err_px / np.maximum(height, 1.0), 90)) if err_px.size else 0.0
+        if lost > self.lost_high or self._motion(shift, xyxy) > self.motion_high:
+            self._shrink()
+        elif err > self.err_high:
+            self._shrink(halve=False)
+        elif err < self.err_low:
+            self.k = min(self.k + 1, self.max_stride)
+
+    def stats(self) -> dict[str, Any]:
+        err = np.concatenate(self._err) if self._err else np.zeros(0)
+        return {
+            "frames": self.frames,
+            "keyframes": self.keyframes,
+            "detector_ratio": self.keyframes / self.frames if self.frames else 1.0,
+            "mean_k": self._k_sum / self.frames if self.frames else 1.0,
+            "k": self.k,
+            "shrinks": self.shrinks,
+            "keyframe_err_px": {
+                "n": int(err.size),
+                "mean": float(err.mean()) if err.size else 0.0,
+                "p95": float(np.percentile(err, 95)) if err.size else 0.0,
+                "max": float(err.max()) if err.size else 0.0
+            }
+        }
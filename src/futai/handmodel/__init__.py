@@ -0,0 +1,80 @@
+"""
+futai.handmodel
+===============
+
+Классификаторы команд. Бэкенды с одним контрактом fit(crops) / predict(crops):
+  - "siglip" — SigLIP -> UMAP -> KMeans (точный, тяжёлый)
+  - "hist"   — гистограммы цвета торса -> KMeans (быстрый, CPU-friendly)
+"""
+from __future__ import annotations
+
+import time
+from itertools import permutations
+from typing import Any
+
+import numpy as np
+
+
+def kmeans_confidence(dist: np.ndarray) -> np.ndarray:
+    """
+    Уверенность по расстояниям до центров KMeans (N, k):
+    1 - d_ближ / d_второй. 0 — ровно посередине, 1 — в самом центре кластера.
+    """
+    dist = np.sort(dist, axis=1)
+    return 1.0 - dist[:, 0] / np.maximum(dist[:, 1], 1e-12)
+
+
+def label_agreement(a: np.ndarray, b: np.ndarray) -> tuple[float, tuple[int, ...]]:
+    """
+    Согласие двух разметок KMeans по лучшей перестановке номеров кластеров:
+    (доля совпавших, перестановка метка b -> метка a).
+    """
+    k = int(max(a.max(initial=0), b.max(initial=0))) + 1
+    best, best_perm = -1.0, tuple(range(k))
+    for perm in permutations(range(k)):
+        agree = float(np.mean(np.asarray(perm)[b] == a)) if len(a) else 1.0
+        if agree > best:
+            best, best_perm = agree, perm
+    return best, best_perm
+
+
+def build_team_classifier(kind: str = "siglip", device: str | None = None, **kwargs) -> Any:
+    """
+    Factory по аналогии с build_detector. Импорт бэкенда — только выбранного,
+    чтобы "hist" не тянул за собой torch/transformers.
+    """
+    kind = kind.lower()
+    if kind in {"siglip", "umap"}:
+        import torch
+
+        from .classification import TeamClassifier
+        # None — сам выбираем: на CPU-ноде DEFAULT_DEVICE='cuda' упал бы
+        kwargs["device"] = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        return TeamClassifier(**kwargs)
+    if kind in {"hist", "color", "colour"}:
+        from .color_hist import ColorHistTeamClassifier
+        return ColorHistTeamClassifier(**kwargs)
+    raise ValueError(f"Unknown team classifier type: {kind!r}")
+
+
+def compare_team_classifiers(a, b, crops: list[np.ndarray]) -> dict[str, Any]:
+    """
+    Режим сравнения двух бэкендов на одних и тех же кропах.
+    Номера кластеров у KMeans произвольные, поэтому согласие считаем
+    по лучшей перестановке меток. Плюс время на кроп у каждого.
+    """
+    t0 = time.perf_counter()
+    pa = a.predict(crops)
+    t1 = time.perf_counter()
+    pb = b.predict(crops)
+    t2 = time.perf_counter()
+
+    n = len(crops)
+    best, best_perm = label_agreement(pa, pb)
+    return {
+        "n": n,
+        "agreement": best,
+        "label_map": list(best_perm),  # метка b -> метка a
+        "ms_per_crop_a": 1e3 * (t1 - t0) / max(n, 1),
+        "ms_per_crop_b": 1e3 * (t2 - t1) / max(n, 1)
+    }
@@ -1,24 +1,79 @@
 """
 Извлечение эмбеддингов SigLIP + UMAP + KMeans для деления игроков на команды.
+
+Проекция эмбеддингов перед KMeans — projection=... в конструкторе или в fit():
+  - "umap"       — UMAP.transform на каждом батче: поиск соседей по обучающей
+                   выборке + оптимизация, дороже самого KMeans в разы
+  - "pca"        — PCA до тех же UMAP_N_COMPONENTS: одно умножение на матрицу
+  - "parametric" — UMAP только на fit, а на инференсе — линейная карта
+                   (ridge), обученная повторять его координаты; KMeans —
+                   в пространстве UMAP, как у "umap"
+У дешёвых режимов fit_report — согласие меток с путём через UMAP на обучающей
+выборке. Чтобы эти цифры воспроизводились, нужен seed (random_state UMAP /
+PCA / KMeans); по умолчанию его нет — с random_state UMAP считает в один поток.
+
+CPU-режим самой SigLIP (quantize / compile_mode / intra_op_threads / image_size)
+— см. handmodel.siglip_cpu; задержка и дрейф против fp32 — embedding_report().
 """
 
+import time
+
 import numpy as np
 import torch
 import umap
 from sklearn.cluster import KMeans
+from sklearn.decomposition import PCA
 from tqdm import tqdm
 from transformers import AutoProcessor, SiglipVisionModel
 import supervision as sv
 
+from src.futai.handmodel import kmeans_confidence, label_agreement
+from src.futai.handmodel.persist import save_team_model, load_team_model
+from src.futai.handmodel.preprocess import CropPreprocessor
+from src.futai.handmodel.siglip_cpu import SiglipEmbedder, build_embedder, embedding_drift, set_threads
+from src.futai.handmodel.streaming import StreamingFit, fit_from_video
 from src.futai.constants import (
     SIGLIP_MODEL_NAME,
+    SIGLIP_POOLING,
     UMAP_N_COMPONENTS,
+    PROJECTION_RIDGE_ALPHA,
     KMEANS_N_CLUSTERS,
     DEFAULT_DEVICE,
     DEFAULT_BATCH_SIZE
 )
 
 
+PROJECTIONS = ("umap", "pca", "parametric")
+
+
+class LinearProjection:
+    """
+    Линейная карта эмбеддинги -> координаты UMAP: ridge в замкнутой форме.
+    alpha — в долях среднего собственного значения X^T X (не зависит от масштаба признаков).
+    """
+
+    def __init__(self, alpha: float = PROJECTION_RIDGE_ALPHA):
+        self.alpha = alpha
+        self.n_components = 0
+        self.mean_ = self.coef_ = self.intercept_ = None
+
+    def fit(self, x: np.ndarray, y: np.ndarray) -> "LinearProjection":
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        self.mean_ = x.mean(axis=0)
+        xc = x - self.mean_
+        gram = xc.T @ xc
+        gram[np.diag_indices_from(gram)] += self.alpha * max(np.trace(gram) / len(gram), 1e-12)
+        self.coef_ = np.linalg.solve(gram, xc.T @ (y - y.mean(axis=0))).astype(np.float32)
+        self.intercept_ = y.mean(axis=0).astype(np.float32)
+        self.mean_ = self.mean_.astype(np.float32)
+        self.n_components = y.shape[1]
+        return self
+
+    def transform(self, x: np.ndarray) -> np.ndarray:
+        return (np.asarray(x, dtype=np.float32) - self.mean_) @ self.coef_ + self.intercept_
+
+
 class TeamClassifier:
     """
     Unsupervised team classifier.
@@ -28,27 +83,68 @@ class TeamClassifier:
     def __init__(
             self,
             device: str = DEFAULT_DEVICE,
-            batch_size: int = DEFAULT_BATCH_SIZE
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            features_model=None,
+            processor=None,
+            progress: bool = False,
+            fast_preprocess: bool = True,
+            projection: str = "umap",
+            quantize: bool = False,
+            compile_mode: str | None = None,
+            intra_op_threads: int | None = None,
+            image_size: int | None = None,
+            seed: int | None = None
     ):
         self.device = device
         self.batch_size = batch_size
+        self.model_name = SIGLIP_MODEL_NAME
+        self.progress = progress  # tqdm по батчам — только по запросу (fit на больших выборках)
+
+        # SigLIP from HuggingFace (или готовые модель/процессор — напр. без весов в бенчмарке)
+        self.features_model = (features_model or SiglipVisionModel.from_pretrained(
+            self.model_name
+        )).to(self.device)
+        self.processor = processor or AutoProcessor.from_pretrained(self.model_name)
+        # Кропы -> pixel_values без PIL (см. handmodel.preprocess); побитно как PIL-процессор HF.
+        # None — процессор с настройками, которые этот путь не повторяет
+        # image_size — уменьшенный квадратный вход (см. handmodel.siglip_cpu)
+        self.image_size = image_size
+        size = (image_size, image_size) if image_size else None
+        self.preprocess = CropPreprocessor.from_processor(self.processor, size) if fast_preprocess else None
 
-        # SigLIP from HuggingFace
-        self.features_model = SiglipVisionModel.from_pretrained(
-            SIGLIP_MODEL_NAME
-        ).to(self.device)
-        self.processor = AutoProcessor.from_pretrained(SIGLIP_MODEL_NAME)
+        # Чем считаем эмбеддинги: INT8 / trace / torch.compile поверх features_model.
+        # Сама features_model остаётся fp32 — эталон для embedding_report
+        set_threads(intra_op_threads)
+        self.embedder = build_embedder(self.features_model, self.device, quantize, compile_mode, image_size)
 
-        # UMAP reducer
-        self.reducer = umap.UMAP(n_components=UMAP_N_COMPONENTS)
+        # Проекция перед KMeans: "umap" | "pca" | "parametric" (см. докстринг модуля).
+        # Живёт в self.reducer — у всех трёх есть transform()
+        if projection not in PROJECTIONS:
+            raise ValueError(f"Unknown projection: {projection!r} (expected one of {PROJECTIONS})")
+        self.projection = projection
+        # random_state UMAP / PCA / KMeans; None — без него (UMAP тогда многопоточный)
+        self.seed = seed
+        self.reducer = umap.UMAP(n_components=UMAP_N_COMPONENTS, random_state=seed)
+        # для "pca" / "parametric": согласие меток с UMAP (+ R^2 карты) на обучающей выборке
+        self.fit_report: dict = {}
 
         # KMeans clustering
-        self.cluster_model = KMeans(n_clusters=KMEANS_N_CLUSTERS)
+        self.cluster_model = KMeans(n_clusters=KMEANS_N_CLUSTERS, random_state=seed)
+        # состояние потокового fit (partial_fit -> finalize), см. handmodel.streaming
+        self.stream: StreamingFit | None = None
 
     def extract_features(self, crops: list[np.ndarray]) -> np.ndarray:
         """
-        Конвертация списка кропов (OpenCV -> PIL) -> эмбеддинги
+        Конвертация списка кропов (OpenCV -> PIL) -> эмбеддинги.
+        С preprocess — без PIL: кропы сразу в pixel_values (те же значения).
         """
+        return self._extract(crops, self.embedder, self.preprocess, self.image_size)
+
+    def _extract(self, crops: list[np.ndarray], embedder, preprocess, image_size) -> np.ndarray:
+        if preprocess is not None:
+            return self._extract_fast(crops, embedder, preprocess)
+        # HF-процессор ресайзит сразу в уменьшенный размер, если он задан
+        size = {"size": {"height": image_size, "width": image_size}} if image_size else {}
         pil_imgs = [sv.cv2_to_pillow(c) for c in crops]
         batches = [
             pil_imgs[i: i + self.batch_size]
@@ -57,25 +153,156 @@ class TeamClassifier:
         feats = []
 
         with torch.no_grad():
-            for batch in tqdm(batches, desc='Embedding extraction'):
-                inputs = self.processor(images=batch, return_tensors='pt')
-                inputs = {k: v.to(self.device) for k, v in inputs.items()}
-                out = self.features_model(**inputs)
-                emb = out.last_hidden_state.mean(dim=1).cpu().numpy()
+            for batch in tqdm(batches, desc='Embedding extraction', disable=not self.progress):
+                inputs = self.processor(images=batch, return_tensors='pt', **size)
+                emb = embedder(inputs['pixel_values'].to(self.device)).cpu().numpy()
                 feats.append(emb)
 
         return np.vstack(feats) if feats else np.empty((0,))
 
-    def fit(self, crops: list[np.ndarray]) -> None:
+    def _extract_fast(self, crops: list[np.ndarray], embedder, preprocess) -> np.ndarray:
+        # буфер препроцессора переиспользуется: батч целиком уходит в модель до следующего
+        feats = []
+        with torch.no_grad():
+            for i in tqdm(range(0, len(crops), self.batch_size), desc='Embedding extraction',
+                          disable=not self.progress):
+                pixel_values = torch.from_numpy(preprocess(crops[i: i + self.batch_size]))
+                feats.append(embedder(pixel_values.to(self.device)).cpu().numpy())
+        return np.vstack(feats) if feats else np.empty((0,))
+
+    def embedding_report(self, crops: list[np.ndarray]) -> dict:
+        """
+        Текущий режим эмбеддингов против fp32 features_model на родном разрешении
+        на тех же кропах: мс на кроп у обоих, косинус/L2 дрейфа и, если модель
+        уже обучена, доля кропов с той же командой.
+        """
+        ref_pre = CropPreprocessor.from_processor(self.processor) if self.preprocess is not None else None
+        reference = SiglipEmbedder(self.features_model).eval()
+        self.extract_features(crops[:self.batch_size])  # прогрев: torch.compile собирается на первом батче
+        t0 = time.perf_counter()
+        feats = self.extract_features(crops)
+        t1 = time.perf_counter()
+        ref = self._extract(crops, reference, ref_pre, None)
+        t2 = time.perf_counter()
+
+        n = max(len(crops), 1)
+        report = {
+            "n": len(crops),
+            "ms_per_crop": 1e3 * (t1 - t0) / n,
+            "ms_per_crop_fp32": 1e3 * (t2 - t1) / n,
+            "speedup": (t2 - t1) / max(t1 - t0, 1e-12),
+            **embedding_drift(ref, feats)
+        }
+        if len(crops) and hasattr(self.cluster_model, "cluster_centers_"):
+            def labels(x):
+                return self.cluster_model.predict(self.reducer.transform(x))
+            report["team_agreement"] = float(np.mean(labels(ref) == labels(feats)))
+        return report
+
+    def fit(self, crops: list[np.ndarray], projection: str | None = None) -> None:
         """
         Fit UMAP + KMeans по списку кропов.
         Сохраняет raw_data, чтобы transform работал без ошибо
+        projection — сменить режим проекции (см. докстринг модуля) на этом fit.
         """
-        data = self.extract_features(crops)
+        self._set_projection(projection)
+        self._fit_features(self.extract_features(crops))
+
+    def _set_projection(self, projection: str | None) -> None:
+        if projection is None:
+            return
+        if projection not in PROJECTIONS:
+            raise ValueError(f"Unknown projection: {projection!r} (expected one of {PROJECTIONS})")
+        self.projection = projection
+
+    def _fit_features(self, data: np.ndarray) -> None:
+        self.fit_report = {}
+        self.reducer = umap.UMAP(n_components=UMAP_N_COMPONENTS, random_state=self.seed)
         projections = self.reducer.fit_transform(data)
         # сохраняем, иначе transform упадет, ежели fit был на единственном sample
         self.reducer._raw_data = data
         self.cluster_model.fit(projections)
+        if self.projection == "pca":
+            # UMAP выше — только эталон меток; модель — PCA + свой KMeans
+            umap_labels = self.cluster_model.labels_
+            self.reducer = PCA(n_components=UMAP_N_COMPONENTS, random_state=self.seed)
+            self.cluster_model = KMeans(n_clusters=KMEANS_N_CLUSTERS, random_state=self.seed)
+            self.cluster_model.fit(self.reducer.fit_transform(data))
+            self.fit_report = {"agreement": label_agreement(umap_labels, self.cluster_model.labels_)[0]}
+        elif self.projection == "parametric":
+            # сам UMAP дальше не нужен (и не сохраняется) — только карта в его координаты
+            self.reducer = LinearProjection().fit(data, projections)
+            approx = self.reducer.transform(data)
+            resid = ((approx - projections) ** 2).sum()
+            total = ((projections - projections.mean(axis=0)) ** 2).sum()
+            self.fit_report = {
+                "agreement": float(np.mean(self.cluster_model.predict(approx)
+                                           == self.cluster_model.labels_)),
+                "r2": float(1 - resid / max(total, 1e-12))
+            }
+
+    def partial_fit(self, crops: list[np.ndarray]) -> dict:
+        """
+        Порция кропов для потокового fit: эмбеддинги -> резервуар + MiniBatchKMeans.
+        Сами кропы не храним. Возвращает StreamingFit.stats() (в т.ч. converged).
+        """
+        if self.stream is None:
+            self.stream = StreamingFit(self.cluster_model.n_clusters)
+        return self.stream.update(self.extract_features(crops))
+
+    def finalize(self, projection: str | None = None) -> dict:
+        """UMAP + KMeans по резервуару эмбеддингов после partial_fit — как fit()."""
+        if self.stream is None or not len(self.stream.reservoir):
+            raise ValueError("finalize() called before partial_fit()")
+        self._set_projection(projection)
+        stats = self.stream.stats()
+        self._fit_features(self.stream.reservoir.sample())
+        self.stream = None
+        return stats
+
+    def fit_from_video(self, video_path: str, detector, **kwargs) -> dict:
+        """Fit по кадрам ролика с шагом, с остановкой по сходимости (см. streaming.fit_from_video)."""
+        return fit_from_video(self, video_path, detector, **kwargs)
+
+    def embedding_meta(self) -> dict:
+        """От чего зависят эмбеддинги: чужая модель/пулинг/препроцессинг -> другие признаки."""
+        ip = getattr(self.processor, "image_processor", self.processor)
+        return {
+            "model_name": self.model_name,
+            "pooling": SIGLIP_POOLING,
+            "preprocessing": {
+                # уменьшенный вход — другие эмбеддинги: модель под 224 с ним не загрузится
+                "size": ({"height": self.image_size, "width": self.image_size}
+                         if self.image_size else dict(ip.size)),
+                "resample": int(ip.resample),
+                "rescale_factor": float(ip.rescale_factor),
+                "image_mean": [float(v) for v in ip.image_mean],
+                "image_std": [float(v) for v in ip.image_std]
+            },
+            "umap_n_components": self.reducer.n_components
+        }
+
+    def save(self, path) -> None:
+        """
+        Сохранить обученные UMAP + KMeans вместе с meta эмбеддингов.
+        Веса SigLIP не пишем — они и так лежат в кэше HF.
+        """
+        save_team_model(path, "siglip", self.embedding_meta(), {
+            "projection": self.projection,
+            "reducer": self.reducer,  # UMAP — вместе с _raw_data, transform заработает сразу
+            "cluster_model": self.cluster_model
+        })
+
+    def load(self, path) -> "TeamClassifier":
+        """
+        Загрузить модель из save(). Падает с ValueError, если она обучена
+        на другом SIGLIP_MODEL_NAME / пулинге / препроцессинге.
+        """
+        state = load_team_model(path, "siglip", self.embedding_meta())
+        self.projection = state.get("projection", "umap")  # файлы до projection — всегда UMAP
+        self.reducer = state["reducer"]
+        self.cluster_model = state["cluster_model"]
+        return self
 
     def predict(self, crops: list[np.ndarray]) -> np.ndarray:
         """
@@ -87,3 +314,16 @@ class TeamClassifier:
         data = self.extract_features(crops)
         proj = self.reducer.transform(data)
         return self.cluster_model.predict(proj).astype(int)
+
+    def predict_with_confidence(self, crops: list[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        team_id + уверенность в [0, 1] для каждого кропа
+        (см. kmeans_confidence: 0 — посередине между командами).
+        """
+        if not crops:
+            return np.array([], dtype=int), np.array([], dtype=float)
+
+        data = self.extract_features(crops)
+        dist = self.cluster_model.transform(self.reducer.transform(data))
+        # argmin — ровно то, что делает KMeans.predict
+        return dist.argmin(axis=1).astype(int), kmeans_confidence(dist)
@@ -0,0 +1,143 @@
+"""
+Быстрый классификатор команд по цвету формы: HSV + Lab гистограммы торса -> KMeans.
+Тот же контракт fit(crops) / predict(crops), что и у TeamClassifier, но без
+SigLIP/UMAP — на CPU в сотни раз дешевле.
+"""
+from __future__ import annotations
+
+import cv2
+import numpy as np
+from sklearn.cluster import KMeans
+
+from src.futai.constants import (
+    KMEANS_N_CLUSTERS,
+    HIST_TORSO_BOX,
+    HIST_PATCH_SIZE,
+    HIST_HUE_BINS,
+    HIST_SAT_BINS,
+    HIST_AB_BINS,
+    HIST_GRASS_HUE
+)
+from src.futai.handmodel import kmeans_confidence
+from src.futai.handmodel.persist import save_team_model, load_team_model
+from src.futai.handmodel.streaming import StreamingFit, fit_from_video
+
+
+def torso_patches(crops: list[np.ndarray]) -> np.ndarray:
+    """
+    Вырезаем торс (HIST_TORSO_BOX — доли кропа) и приводим к одному размеру,
+    чтобы дальше всё считалось одним массивом (N, h, w, 3).
+    """
+    pw, ph = HIST_PATCH_SIZE
+    x0, y0, x1, y1 = HIST_TORSO_BOX
+    out = np.zeros((len(crops), ph, pw, 3), dtype=np.uint8)
+    for i, crop in enumerate(crops):
+        h, w = crop.shape[:2]
+        torso = crop[int(h * y0): max(int(h * y1), int(h * y0) + 1),
+                     int(w * x0): max(int(w * x1), int(w * x0) + 1)]
+        if torso.size:  # пустой бокс у края кадра — оставляем нули
+            cv2.resize(torso, (pw, ph), dst=out[i], interpolation=cv2.INTER_AREA)
+    return out
+
+
+def _batched_hist(a: np.ndarray, b: np.ndarray, a_bins: int, b_bins: int,
+                  mask: np.ndarray) -> np.ndarray:
+    # 2D гистограмма для каждой картинки одним bincount: индекс = картинка * bins + бин
+    n = a.shape[0]
+    bins = a_bins * b_bins
+    idx = a * b_bins + b + (np.arange(n) * bins)[:, None, None]
+    hist = np.bincount(idx[mask], minlength=n * bins).reshape(n, bins).astype(np.float32)
+    hist /= np.maximum(hist.sum(axis=1, keepdims=True), 1.0)
+    return np.sqrt(hist)  # Hellinger: евклид по корням ~ близость распределений
+
+
+def color_features(crops: list[np.ndarray]) -> np.ndarray:
+    """Признаки кропов: H×S гистограмма (HSV) + a×b гистограмма (Lab), газон отброшен."""
+    patches = torso_patches(crops)
+    n, ph, pw, _ = patches.shape
+    if n == 0:
+        return np.empty((0, HIST_HUE_BINS * HIST_SAT_BINS + HIST_AB_BINS ** 2), np.float32)
+
+    # один вызов cvtColor на всю пачку: кропы лежат друг под другом
+    flat = patches.reshape(n * ph, pw, 3)
+    hsv = cv2.cvtColor(flat, cv2.COLOR_BGR2HSV).reshape(n, ph, pw, 3).astype(np.int64)
+    lab = cv2.cvtColor(flat, cv2.COLOR_BGR2LAB).reshape(n, ph, pw, 3).astype(np.int64)
+
+    hue, sat = hsv[..., 0], hsv[..., 1]
+    lo, hi = HIST_GRASS_HUE
+    keep = ~((hue >= lo) & (hue <= hi) & (sat > 40))  # зелёный газон между ног
+
+    hs = _batched_hist(hue * HIST_HUE_BINS // 180, sat * HIST_SAT_BINS // 256,
+                       HIST_HUE_BINS, HIST_SAT_BINS, keep)
+    ab = _batched_hist(lab[..., 1] * HIST_AB_BINS // 256, lab[..., 2] * HIST_AB_BINS // 256,
+                       HIST_AB_BINS, HIST_AB_BINS, keep)
+    return np.hstack([hs, ab])
+
+
+class ColorHistTeamClassifier:
+    """
+    Unsupervised team classifier без нейросетей.
+    Гистограммы цвета торса -> KMeans (n_clusters=2)
+    """
+
+    def __init__(self, n_clusters: int = KMEANS_N_CLUSTERS):
+        self.cluster_model = KMeans(n_clusters=n_clusters)
+        self.stream: StreamingFit | None = None  # partial_fit -> finalize
+
+    def extract_features(self, crops: list[np.ndarray]) -> np.ndarray:
+        return color_features(crops)
+
+    def fit(self, crops: list[np.ndarray]) -> None:
+        """Fit KMeans по гистограммам кропов."""
+        self.cluster_model.fit(self.extract_features(crops))
+
+    def partial_fit(self, crops: list[np.ndarray]) -> dict:
+        """Потоковый fit, как у TeamClassifier.partial_fit."""
+        if self.stream is None:
+            self.stream = StreamingFit(self.cluster_model.n_clusters)
+        return self.stream.update(self.extract_features(crops))
+
+    def finalize(self) -> dict:
+        """KMeans по резервуару гистограмм после partial_fit."""
+        if self.stream is None or not len(self.stream.reservoir):
+            raise ValueError("finalize() called before partial_fit()")
+        stats = self.stream.stats()
+        self.cluster_model.fit(self.stream.reservoir.sample())
+        self.stream = None
+        return stats
+
+    def fit_from_video(self, video_path: str, detector, **kwargs) -> dict:
+        return fit_from_video(self, video_path, detector, **kwargs)
+
+    def predict(self, crops: list[np.ndarray]) -> np.ndarray:
+        """
+        Предсказание team_id для новых кропов
+        """
+        if not crops:
+            return np.array([], dtype=int)
+        return self.cluster_model.predict(self.extract_features(crops)).astype(int)
+
+    def predict_with_confidence(self, crops: list[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+        """team_id + уверенность, как у TeamClassifier.predict_with_confidence."""
+        if not crops:
+            return np.array([], dtype=int), np.array([], dtype=float)
+        dist = self.cluster_model.transform(self.extract_features(crops))
+        return dist.argmin(axis=1).astype(int), kmeans_confidence(dist)
+
+    def feature_meta(self) -> dict:
+        """Параметры признаков — модель с другими бинами/торсом несовместима."""
+        return {
+            "torso_box": list(HIST_TORSO_BOX),
+            "patch_size": list(HIST_PATCH_SIZE),
+            "bins": [HIST_HUE_BINS, HIST_SAT_BINS, HIST_AB_BINS],
+            "grass_hue": list(HIST_GRASS_HUE)
+        }
+
+    def save(self, path) -> None:
+        save_team_model(path, "hist", self.feature_meta(),
+                        {"cluster_model": self.cluster_model})
+
+    def load(self, path) -> "ColorHistTeamClassifier":
+        state = load_team_model(path, "hist", self.feature_meta())
+        self.cluster_model = state["cluster_model"]
+        return self
@@ -1,9 +1,9 @@
 from __future__ import annotations
-from ultralytics import YOLO
 
 
 class LocalYOLOWrapper:
     def __init__(self, weights_path: str, device: str = "cuda") -> None:
+        from ultralytics import YOLO
         self.model = YOLO(weights_path)
         self.device = device
 
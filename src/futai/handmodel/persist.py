@@ -0,0 +1,54 @@
+"""
+Сохранение / загрузка обученной модели команд (UMAP, KMeans и т.п.),
+чтобы не переобучать её и не гонять SigLIP по сэмплам при каждом старте.
+"""
+from __future__ import annotations
+
+import os
+import pickle
+from pathlib import Path
+from typing import Any
+
+from src.futai.constants import TEAM_MODEL_FORMAT_VERSION
+
+
+def save_team_model(path: str | Path, kind: str, meta: dict[str, Any],
+                    state: dict[str, Any]) -> None:
+    """
+    Пишем {version, kind, meta, state} в pickle.
+    meta — всё, от чего зависят признаки (модель, пулинг, препроцессинг):
+    при загрузке оно обязано совпасть с текущим классификатором.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        "version": TEAM_MODEL_FORMAT_VERSION,
+        "kind": kind,
+        "meta": meta,
+        "state": state
+    }
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)  # атомарно: недописанный файл не подхватится воркером
+
+
+def load_team_model(path: str | Path, kind: str, meta: dict[str, Any]) -> dict[str, Any]:
+    """Читаем файл и проверяем версию формата, тип бэкенда и meta. Возвращаем state."""
+    with open(path, "rb") as f:
+        payload = pickle.load(f)
+
+    version = payload.get("version")
+    if version != TEAM_MODEL_FORMAT_VERSION:
+        raise ValueError(
+            f"Team model format v{version} is not supported "
+            f"(expected v{TEAM_MODEL_FORMAT_VERSION}): {path}")
+    if payload.get("kind") != kind:
+        raise ValueError(f"Team model {path} was fitted by {payload.get('kind')!r}, not {kind!r}")
+
+    saved = payload.get("meta", {})
+    mismatch = {k: (saved.get(k), v) for k, v in meta.items() if saved.get(k) != v}
+    if mismatch:
+        details = ", ".join(f"{k}: {old!r} != {new!r}" for k, (old, new) in mismatch.items())
+        raise ValueError(f"Team model {path} does not match this classifier ({details})")
+    return payload["state"]
@@ -0,0 +1,212 @@
+"""
+Препроцессинг кропов для SigLIP без PIL: BGR-кропы (или кадр + xyxy) ->
+готовый батч pixel_values (N, 3, H, W) float32 в переиспользуемом буфере.
+
+HF image processor делает: cv2 -> PIL, PIL.resize (bicubic), float64 * rescale,
+float32 (x - mean) / std. Здесь то же самое, но
+  - ресайз — та же свёртка, что в PIL (Resample.c): те же веса фильтра в
+    fixed-point (22 бита), два прохода (горизонталь, затем вертикаль) с
+    округлением до uint8 между ними — результат совпадает с PIL побитно
+  - rescale + normalize — таблица на 256 значений на канал, посчитанная
+    ровно в тех же dtype, что у HF; BGR -> RGB — просто порядок каналов
+Бэкенд HF на torchvision (процессоры …Fast в transformers 5) ресайзит иначе
+(свой bicubic с антиалиасингом): совпадение — с PIL-процессором, с Fast —
+лишь близко. Поэтому from_processor включает быстрый путь только для
+PIL-процессора, а torchvision-процессор (AutoProcessor по умолчанию, если
+torchvision стоит) остаётся как есть. compare_with_processor() показывает
+расхождение на своих кропах.
+Оба прохода — умножение на матрицу весов (BLAS) сразу в раскладке (H, C, W),
+без PIL-объектов и лишних копий; матрицы кэшируются по размеру кропа.
+Умножение — во float64: суммы fixed-point весов доходят до ~2^30, во float32
+(мантисса 24 бита) округление до uint8 местами сдвинулось бы на 1. Время на
+кроп против процессора HF — в compare_with_processor (benchmarks/siglip_cpu.py).
+"""
+from __future__ import annotations
+
+import time
+from functools import lru_cache
+from typing import Any
+
+import numpy as np
+
+_PRECISION_BITS = 32 - 8 - 2  # как в PIL Resample.c
+# PIL.Image.Resampling: BILINEAR=2, BICUBIC=3
+_BILINEAR, _BICUBIC = 2, 3
+
+
+def _bilinear(x: np.ndarray) -> np.ndarray:
+    x = np.abs(x)
+    return np.where(x < 1.0, 1.0 - x, 0.0)
+
+
+def _bicubic(x: np.ndarray) -> np.ndarray:
+    a = -0.5
+    x = np.abs(x)
+    return np.where(x < 1.0, ((a + 2.0) * x - (a + 3.0)) * x * x + 1,
+                    np.where(x < 2.0, (((x - 5) * x + 8) * x - 4) * a, 0.0))
+
+
+_FILTERS = {_BILINEAR: (_bilinear, 1.0), _BICUBIC: (_bicubic, 2.0)}
+
+
+def _is_pil_backend(ip) -> bool:
+    """Процессор HF ресайзит через PIL (а не torchvision)."""
+    names = {c.__name__ for c in type(ip).__mro__}
+    if "PilBackend" in names:  # transformers 5
+        return True
+    if names & {"TorchvisionBackend", "BaseImageProcessorFast"}:
+        return False
+    return not type(ip).__name__.endswith("Fast")  # transformers 4: медленный = PIL
+
+
+@lru_cache(maxsize=1024)
+def resample_matrix(in_size: int, out_size: int, resample: int = _BICUBIC) -> np.ndarray:
+    """
+    Один проход ресайза матрицей (out_size, in_size): веса как precompute_coeffs +
+    normalize_coeffs_8bpc в PIL — целые fixed-point, хранятся во float64
+    (суммы целых < 2^31 во float64 точны, а умножение идёт через BLAS).
+    """
+    filt, support = _FILTERS[resample]
+    scale = in_size / out_size
+    filterscale = max(scale, 1.0)
+    support *= filterscale
+    ksize = int(np.ceil(support)) * 2 + 1
+
+    center = (np.arange(out_size) + 0.5) * scale
+    # (int) в C — отсечение к нулю, как и astype(int)
+    xmin = np.maximum((center - support + 0.5).astype(np.int64), 0)
+    xmax = np.minimum((center + support + 0.5).astype(np.int64), in_size)
+    idx = xmin[:, None] + np.arange(ksize)
+    valid = idx < xmax[:, None]
+    w = np.where(valid, filt((idx - center[:, None] + 0.5) / filterscale), 0.0)
+    ww = w.sum(axis=1, keepdims=True)
+    w = np.divide(w, ww, out=w, where=ww != 0)
+
+    kk = w * (1 << _PRECISION_BITS)
+    kk = np.trunc(np.where(kk < 0, kk - 0.5, kk + 0.5))
+    mat = np.zeros((out_size, in_size))
+    rows = np.broadcast_to(np.arange(out_size)[:, None], idx.shape)
+    mat[rows[valid], idx[valid]] = kk[valid]
+    return mat
+
+
+def _round8(x: np.ndarray) -> np.ndarray:
+    # clip8() из PIL: (ss + 2^21) >> 22 и в 0..255
+    x += 1 << (_PRECISION_BITS - 1)
+    x *= 1.0 / (1 << _PRECISION_BITS)  # степень двойки — деление точное
+    np.floor(x, out=x)
+    return np.clip(x, 0, 255, out=x)
+
+
+def _resize_chw(img: np.ndarray, size: tuple[int, int], resample: int) -> np.ndarray:
+    """uint8 (h, w, c) -> (H, c, W) float64 с целыми 0..255: горизонталь, потом вертикаль, как в PIL."""
+    h, w, c = img.shape
+    out_h, out_w = size
+    x = img.transpose(0, 2, 1).astype(np.float64)  # (h, c, w)
+    if out_w != w:
+        x = _round8(x @ resample_matrix(w, out_w, resample).T)
+    if out_h != h:
+        x = _round8((resample_matrix(h, out_h, resample) @ x.reshape(h, -1)).reshape(out_h, c, out_w))
+    return x
+
+
+def pil_resize(img: np.ndarray, size: tuple[int, int], resample: int = _BICUBIC) -> np.ndarray:
+    """uint8 (h, w, c) -> (H, W, c) — то же, что PIL Image.resize((W, H), resample)."""
+    return _resize_chw(img, size, resample).transpose(0, 2, 1).astype(np.uint8)
+
+
+class CropPreprocessor:
+    """
+    pixel_values для SigLIP из BGR-кропов: __call__(crops) -> (N, 3, H, W) float32.
+    Возвращается срез внутреннего буфера — он перезаписывается следующим вызовом.
+    """
+
+    def __init__(self, size: tuple[int, int], resample: int = _BICUBIC, rescale_factor: float = 1 / 255,
+                 image_mean: tuple[float, ...] = (0.5, 0.5, 0.5), image_std: tuple[float, ...] = (0.5, 0.5, 0.5)):
+        if resample not in _FILTERS:
+            raise ValueError(f"Unsupported resample: {resample!r}")
+        self.size = size  # (H, W)
+        self.resample = resample
+        # rescale + normalize по шагам HF: float64 * factor -> float32, затем (x - mean) / std
+        v = (np.arange(256, dtype=np.float64) * rescale_factor).astype(np.float32)
+        mean = np.asarray(image_mean, dtype=np.float32)[:, None]
+        std = np.asarray(image_std, dtype=np.float32)[:, None]
+        self.lut = (v[None] - mean) / std  # (3, 256), каналы RGB
+        self._buf = np.empty((0, 3, *size), dtype=np.float32)
+
+    @classmethod
+    def from_processor(cls, processor, size: tuple[int, int] | None = None,
+                       pil_only: bool = True) -> "CropPreprocessor | None":
+        """
+        Параметры из HF AutoProcessor / image processor. None — если там то,
+        что этот путь не повторяет (другой фильтр, без ресайза, размер по
+        короткой стороне, бэкенд torchvision и т.п.); тогда остаётся обычный
+        путь через сам процессор.
+        size — (H, W) вместо размера процессора (уменьшенный вход SigLIP).
+        pil_only=False — и для torchvision-процессора (значения лишь близкие).
+        """
+        ip = getattr(processor, "image_processor", processor)
+        if pil_only and not _is_pil_backend(ip):
+            return None
+        ip_size = getattr(ip, "size", None) or {}
+        try:
+            resample = int(getattr(ip, "resample", -1))
+        except (TypeError, ValueError):  # InterpolationMode torchvision и т.п.
+            return None
+        if not (getattr(ip, "do_resize", False) and getattr(ip, "do_rescale", False)
+                and getattr(ip, "do_normalize", False) and ip_size.get("height") and ip_size.get("width")
+                and resample in _FILTERS):
+            return None
+        return cls(size or (int(ip_size["height"]), int(ip_size["width"])), resample,
+                   float(ip.rescale_factor), tuple(ip.image_mean), tuple(ip.image_std))
+
+    def __call__(self, crops: list[np.ndarray]) -> np.ndarray:
+        n = len(crops)
+        if len(self._buf) < n:
+            self._buf = np.empty((n, 3, *self.size), dtype=np.float32)
+        out = self._buf[:n]
+        for i, crop in enumerate(crops):
+            if not crop.size:  # пустой бокс у края кадра — чёрная картинка
+                out[i] = self.lut[:, :1, None]
+                continue
+            img = _resize_chw(crop, self.size, self.resample).astype(np.uint8)  # (H, 3, W)
+            for c in range(3):  # BGR -> RGB: канал c берём из 2 - c
+                np.take(self.lut[c], img[:, 2 - c], out=out[i, c])
+        return out
+
+    def boxes(self, frame: np.ndarray, xyxy: np.ndarray) -> np.ndarray:
+        """То же по кадру и боксам (N, 4) — кропы как у sv.crop_image, без копий."""
+        h, w = frame.shape[:2]
+        xyxy = np.round(np.asarray(xyxy, dtype=float).reshape(-1, 4)).astype(int)
+        xyxy[:, [0, 2]] = np.clip(xyxy[:, [0, 2]], 0, w)
+        xyxy[:, [1, 3]] = np.clip(xyxy[:, [1, 3]], 0, h)
+        return self([frame[y1:y2, x1:x2] for x1, y1, x2, y2 in xyxy])
+
+
+def compare_with_processor(processor, crops: list[np.ndarray], repeat: int = 3) -> dict[str, Any]:
+    """
+    Быстрый путь против самого HF-процессора на тех же BGR-кропах:
+    максимум |разницы| pixel_values и доля несовпавших значений (0 и 0 — побитно),
+    плюс мс на кроп у обоих (лучший из repeat прогонов; у HF — с cv2 -> PIL).
+    """
+    import supervision as sv
+
+    fast = CropPreprocessor.from_processor(processor, pil_only=False)
+    if fast is None:
+        raise ValueError("Processor settings are not supported by CropPreprocessor")
+    crops = [c for c in crops if c.size]  # пустые кропы HF-путь не принимает вовсе
+    fast_s = ref_s = float("inf")
+    for _ in range(max(repeat, 1)):
+        t0 = time.perf_counter()
+        ref = processor(images=[sv.cv2_to_pillow(c) for c in crops], return_tensors="np")["pixel_values"]
+        t1 = time.perf_counter()
+        out = fast(crops)
+        t2 = time.perf_counter()
+        ref_s, fast_s = min(ref_s, t1 - t0), min(fast_s, t2 - t1)
+    d = np.abs(out.astype(np.float64) - np.asarray(ref, dtype=np.float64))
+    n = max(len(crops), 1)
+    return {"max_abs": float(d.max()) if d.size else 0.0,
+            "mismatch_ratio": float((d > 0).mean()) if d.size else 0.0,
+            "processor": type(getattr(processor, "image_processor", processor)).__name__,
+            "ms_per_crop": 1e3 * fast_s / n, "processor_ms_per_crop": 1e3 * ref_s / n,
+            "speedup": ref_s / max(fast_s, 1e-12)}
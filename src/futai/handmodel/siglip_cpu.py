@@ -0,0 +1,91 @@
+"""
+CPU-режим эмбеддингов SigLIP для TeamClassifier: сама модель та же, меняется
+только то, как её зовут.
+
+  - quantize=True      — динамическая INT8-квантизация всех nn.Linear
+                         (quantize_dynamic): веса int8, активации квантуются
+                         на лету; на ViT-B/16 это почти весь счёт
+  - compile_mode       — "script": torch.jit.trace + freeze (граф без Python,
+                         фиксированный размер входа); "torch": torch.compile
+                         (нужен C++-компилятор, первый батч — десятки секунд)
+  - intra_op_threads   — torch.set_num_threads, глобально на процесс
+  - image_size         — квадратный вход меньше родного (160 -> 100 токенов
+                         вместо 196): позиционные эмбеддинги интерполируются
+
+Вместо выкидывания токенов внутри трансформера — меньшее разрешение на входе:
+тот же выигрыш в числе токенов, но без правки слоёв модели HF.
+Дрейф против fp32 на родном разрешении — TeamClassifier.embedding_report.
+"""
+from __future__ import annotations
+
+import warnings
+
+import numpy as np
+import torch
+
+COMPILE_MODES = (None, "script", "torch")
+
+
+class SiglipEmbedder(torch.nn.Module):
+    """pixel_values (N, 3, H, W) -> эмбеддинги (N, D): mean по токенам last_hidden_state."""
+
+    def __init__(self, model, interpolate: bool = False):
+        super().__init__()
+        self.model = model
+        self.interpolate = interpolate  # вход не того размера, что в config.image_size
+
+    def forward(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        kwargs = {"interpolate_pos_encoding": True} if self.interpolate else {}
+        out = self.model(pixel_values=pixel_values, **kwargs)
+        return out.last_hidden_state.mean(dim=1)
+
+
+def native_size(model) -> int:
+    """Родной размер входа модели (224 у siglip-base-patch16-224)."""
+    return int(getattr(getattr(model, "config", None), "image_size", 224))
+
+
+def build_embedder(model, device: str = "cpu", quantize: bool = False,
+                   compile_mode: str | None = None, image_size: int | None = None) -> torch.nn.Module:
+    """
+    SiglipEmbedder поверх model с нужными оптимизациями. Исходная model не
+    меняется: квантизация работает на копии, fp32 остаётся эталоном.
+    """
+    if compile_mode not in COMPILE_MODES:
+        raise ValueError(f"Unknown compile_mode: {compile_mode!r} (expected one of {COMPILE_MODES})")
+    if quantize and torch.device(device).type != "cpu":
+        raise ValueError(f"quantize=True is CPU-only, got device={device!r}")
+    size = image_size or native_size(model)
+    embedder = SiglipEmbedder(model, interpolate=size != native_size(model)).eval()
+    if quantize:
+        embedder = torch.ao.quantization.quantize_dynamic(embedder, {torch.nn.Linear}, dtype=torch.qint8)
+    if compile_mode == "script":
+        example = torch.zeros(1, 3, size, size, device=device)
+        # is_causal в sdpa без маски и так константа — TracerWarning о нём не по делу
+        with torch.no_grad(), warnings.catch_warnings():
+            warnings.simplefilter("ignore", torch.jit.TracerWarning)
+            embedder = torch.jit.freeze(torch.jit.trace(embedder, example, check_trace=False).eval())
+    elif compile_mode == "torch":
+        embedder = torch.compile(embedder, dynamic=True)
+    return embedder
+
+
+def set_threads(intra_op_threads: int | None) -> None:
+    """Потоки внутри операций torch (на весь процесс); None — не трогать."""
+    if intra_op_threads:
+        torch.set_num_threads(int(intra_op_threads))
+
+
+def embedding_drift(ref: np.ndarray, feats: np.ndarray) -> dict:
+    """Насколько feats ушли от эталонных ref (N, D): косинус по кропам и относительная L2."""
+    ref = np.asarray(ref, dtype=np.float64)
+    feats = np.asarray(feats, dtype=np.float64)
+    if not len(ref):
+        return {"cos_mean": 1.0, "cos_min": 1.0, "rel_l2": 0.0}
+    rn = np.linalg.norm(ref, axis=1)
+    cos = (ref * feats).sum(axis=1) / np.maximum(rn * np.linalg.norm(feats, axis=1), 1e-12)
+    return {
+        "cos_mean": float(cos.mean()),
+        "cos_min": float(cos.min()),
+        "rel_l2": float(np.mean(np.linalg.norm(feats - ref, axis=1) / np.maximum(rn, 1e-12)))
+    }
@@ -0,0 +1,199 @@
+"""
+Потоковый fit модели команд: кропы приходят порциями (partial_fit), в памяти —
+только резервуар признаков ограниченного размера, а не все кропы ролика.
+
+  - EmbeddingReservoir — равномерная выборка из потока признаков (Algorithm R):
+                         после N признаков каждый лежит в резервуаре с
+                         вероятностью capacity / N
+  - StreamingFit       — резервуар + MiniBatchKMeans.partial_fit на каждой
+                         порции; сходимость — центры команд перестали
+                         двигаться (сдвиг за порцию в долях расстояния между
+                         центрами < tol patience порций подряд)
+  - fit_from_frames / fit_from_video — кадры с шагом -> детектор -> кропы
+                         полевых игроков -> clf.partial_fit, пока не сошлось;
+                         затем clf.finalize() — обычная модель по резервуару
+
+Итоговая модель (UMAP + KMeans у SigLIP, KMeans у "hist") та же, что у fit(),
+и сохраняется тем же save(): MiniBatchKMeans нужен только чтобы понять, когда
+хватит кадров.
+"""
+from __future__ import annotations
+
+from itertools import islice
+from typing import Any, Iterable
+
+import numpy as np
+import supervision as sv
+from sklearn.cluster import MiniBatchKMeans
+
+from src.futai.constants import (
+    PLAYER_CLASS_ID,
+    DEFAULT_CONFIDENCE_THRESHOLD,
+    DEFAULT_INFER_BATCH,
+    KMEANS_N_CLUSTERS,
+    TEAM_FIT_STRIDE,
+    TEAM_FIT_RESERVOIR,
+    TEAM_FIT_MIN_SAMPLES,
+    TEAM_FIT_TOL,
+    TEAM_FIT_PATIENCE
+)
+from src.futai.utils.video import VideoSource
+
+
+class EmbeddingReservoir:
+    """Не больше capacity признаков (float32) — равномерная выборка из всего потока."""
+
+    def __init__(self, capacity: int = TEAM_FIT_RESERVOIR, seed: int = 0):
+        self.capacity = capacity
+        self.seen = 0
+        self._data: np.ndarray | None = None
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self) -> int:
+        return min(self.seen, self.capacity)
+
+    def add(self, feats: np.ndarray) -> None:
+        feats = np.asarray(feats, dtype=np.float32)
+        if not len(feats):
+            return
+        if self._data is None:
+            self._data = np.empty((self.capacity, feats.shape[1]), dtype=np.float32)
+        free = max(self.capacity - self.seen, 0)
+        head = feats[:free]
+        self._data[self.seen: self.seen + len(head)] = head
+        # остальные: i-й по счёту признак заменяет случайный слот с вероятностью capacity / (i + 1)
+        rest = feats[len(head):]
+        if len(rest):
+            t = self.seen + len(head) + np.arange(len(rest))
+            slot = self._rng.integers(0, t + 1)
+            for j in np.flatnonzero(slot < self.capacity):  # по порядку — как в последовательном R
+                self._data[slot[j]] = rest[j]
+        self.seen += len(feats)
+
+    def sample(self) -> np.ndarray:
+        if self._data is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._data[:len(self)]
+
+
+class StreamingFit:
+    """
+    update(feats) на каждой порции признаков -> stats(). converged — центры
+    MiniBatchKMeans сдвигаются меньше tol (в долях расстояния между ними)
+    patience порций подряд, и признаков видели не меньше min_samples.
+    """
+
+    def __init__(
+            self,
+            n_clusters: int = KMEANS_N_CLUSTERS,
+            capacity: int = TEAM_FIT_RESERVOIR,
+            min_samples: int = TEAM_FIT_MIN_SAMPLES,
+            tol: float = TEAM_FIT_TOL,
+            patience: int = TEAM_FIT_PATIENCE,
+            seed: int = 0
+    ):
+        self.n_clusters = n_clusters
+        self.min_samples = min_samples
+        self.tol = tol
+        self.patience = patience
+        self.reservoir = EmbeddingReservoir(capacity, seed)
+        self.kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=seed, n_init=3)
+        self._pending: list[np.ndarray] = []  # первая порция меньше n_clusters — копим
+        self._centers: np.ndarray | None = None
+        self.updates = 0
+        self.stable = 0
+        self.shifts: list[float] = []
+
+    @property
+    def converged(self) -> bool:
+        return self.stable >= self.patience and self.reservoir.seen >= self.min_samples
+
+    def update(self, feats: np.ndarray) -> dict[str, Any]:
+        feats = np.asarray(feats, dtype=np.float32)
+        self.reservoir.add(feats)
+        if self._centers is None:
+            self._pending.append(feats)
+            if sum(map(len, self._pending)) < self.n_clusters:
+                return self.stats()
+            feats = np.vstack(self._pending)
+            self._pending = []
+        if not len(feats):
+            return self.stats()
+
+        self.kmeans.partial_fit(feats)
+        centers = self.kmeans.cluster_centers_.copy()
+        if self._centers is not None:
+            # номера центров у partial_fit не меняются — сравниваем поштучно
+            shift = np.linalg.norm(centers - self._centers, axis=1).max()
+            sep = np.linalg.norm(centers[:, None] - centers[None], axis=2)
+            sep = sep[~np.eye(len(centers), dtype=bool)].min()
+            rel = float(shift / max(sep, 1e-12))
+            self.shifts.append(rel)
+            self.stable = self.stable + 1 if rel < self.tol else 0
+        self._centers = centers
+        self.updates += 1
+        return self.stats()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "seen": self.reservoir.seen,
+            "reservoir": len(self.reservoir),
+            "updates": self.updates,
+            "center_shift": self.shifts[-1] if self.shifts else None,
+            "converged": self.converged
+        }
+
+
+def player_crops(frame: np.ndarray, res) -> list[np.ndarray]:
+    """Кропы полевых игроков по одному ответу детектора."""
+    from src.futai.detector import as_detections
+
+    det = as_detections(res)
+    return [sv.crop_image(frame, xy) for xy in det.xyxy[det.class_id == PLAYER_CLASS_ID]]
+
+
+def fit_from_frames(
+        clf,
+        frames: Iterable[np.ndarray],
+        detector,
+        confidence: float = DEFAULT_CONFIDENCE_THRESHOLD,
+        batch_size: int = DEFAULT_INFER_BATCH,
+        early_stop: bool = True
+) -> dict[str, Any]:
+    """
+    Кадры -> детектор батчами -> clf.partial_fit по кропам каждого батча.
+    early_stop — бросаем чтение кадров, как только центры команд устоялись.
+    В конце clf.finalize(); возвращает его stats() + число кадров.
+    """
+    frames = iter(frames)
+    n_frames = 0
+    stats: dict[str, Any] = {}
+    while batch := list(islice(frames, batch_size)):
+        n_frames += len(batch)
+        crops = [c for frame, res in zip(batch, detector.infer(batch, confidence=confidence))
+                 for c in player_crops(frame, res)]
+        if crops:
+            stats = clf.partial_fit(crops)
+        if early_stop and stats.get("converged"):
+            break
+    return {**clf.finalize(), "frames": n_frames}
+
+
+def fit_from_video(
+        clf,
+        video_path: str,
+        detector,
+        stride: int = TEAM_FIT_STRIDE,
+        start: int = 0,
+        end: int | None = None,
+        max_frames: int | None = None,
+        **kwargs
+) -> dict[str, Any]:
+    """
+    fit_from_frames по кадрам ролика с шагом stride (не больше max_frames кадров).
+    Соседние кадры почти одинаковые — шаг даёт больше разных игроков на кроп.
+    Кадры между сэмплами VideoSource не декодирует, если может перепрыгнуть по ключевым.
+    """
+    with VideoSource(video_path) as video:
+        frames = video.frames(start, end, stride)
+        return fit_from_frames(clf, islice(frames, max_frames), detector, **kwargs)
@@ -0,0 +1,130 @@
+"""
+Кэш команды по tracker_id: команда игрока за трек не меняется,
+поэтому SigLIP гоняем только для новых / сомнительных треков.
+"""
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from src.futai.constants import (
+    KMEANS_N_CLUSTERS,
+    TEAM_CACHE_MIN_VOTES,
+    TEAM_CACHE_WINDOW,
+    TEAM_CACHE_RECHECK_EVERY,
+    TEAM_CACHE_LOW_CONFIDENCE,
+    TRACK_MAX_AGE
+)
+
+
+@dataclass(slots=True)
+class _TrackState:
+    # последние голоса (команда, уверенность) — окно ограничено
+    votes: deque = field(default_factory=lambda: deque(maxlen=TEAM_CACHE_WINDOW))
+    team: int = -1  # -1 пока голосов меньше min_votes
+    confidence: float = 0.0  # средняя уверенность голосов в окне
+    last_checked: int = -1  # кадр последней классификации
+    last_seen: int = -1  # кадр, где трек был в последний раз
+
+
+def _majority(votes: deque) -> int:
+    # взвешенное уверенностью большинство по окну голосов
+    weight = np.zeros(KMEANS_N_CLUSTERS)
+    for team, conf in votes:
+        weight[team] += conf
+    return int(weight.argmax())
+
+
+class TrackTeamCache:
+    """
+    tracker_id -> команда (0/1) с голосованием.
+      - новый трек классифицируем каждый кадр, пока не наберется min_votes
+      - потом — раз в recheck_every кадров или пока уверенность < low_confidence
+      - треки, которых ByteTrack не видел дольше max_age кадров, выкидываем
+    """
+
+    def __init__(
+            self,
+            min_votes: int = TEAM_CACHE_MIN_VOTES,
+            recheck_every: int = TEAM_CACHE_RECHECK_EVERY,
+            low_confidence: float = TEAM_CACHE_LOW_CONFIDENCE,
+            max_age: int = TRACK_MAX_AGE,
+            window: int = TEAM_CACHE_WINDOW
+    ):
+        self.min_votes = min_votes
+        self.recheck_every = recheck_every
+        self.low_confidence = low_confidence
+        self.max_age = max_age
+        self.window = window
+        self._tracks: dict[int, _TrackState] = {}
+        # счётчики: сколько раз спросили классификатор / сколько отдали из кэша
+        self.classified = 0
+        self.served = 0
+
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+    def __contains__(self, tracker_id: int) -> bool:
+        return int(tracker_id) in self._tracks
+
+    def pending(self, tracker_ids: np.ndarray, frame_idx: int) -> np.ndarray:
+        """
+        Маска треков, которым на этом кадре нужен классификатор.
+        Заодно отмечает, что треки живы на frame_idx.
+        """
+        need = np.zeros(len(tracker_ids), dtype=bool)
+        for i, tid in enumerate(tracker_ids):
+            st = self._tracks.get(int(tid))
+            if st is None:
+                st = self._tracks[int(tid)] = _TrackState(votes=deque(maxlen=self.window))
+            st.last_seen = frame_idx
+            need[i] = (
+                st.team < 0
+                or st.confidence < self.low_confidence
+                or frame_idx - st.last_checked >= self.recheck_every
+            )
+        self.classified += int(need.sum())
+        self.served += int((~need).sum())
+        return need
+
+    def vote(self, tracker_ids: np.ndarray, teams: np.ndarray,
+             confidences: np.ndarray, frame_idx: int) -> None:
+        """Добавить голоса и, если набралось достаточно, закрепить команду."""
+        for tid, team, conf in zip(tracker_ids, teams, confidences):
+            st = self._tracks[int(tid)]
+            st.votes.append((int(team), float(conf)))
+            st.last_checked = frame_idx
+            st.confidence = float(np.mean([c for _, c in st.votes]))
+            if len(st.votes) >= self.min_votes:
+                st.team = _majority(st.votes)
+
+    def teams(self, tracker_ids: np.ndarray) -> np.ndarray:
+        """
+        Команда каждого трека: закрепленная, а до min_votes — текущее большинство.
+        -1 только для треков вообще без голосов.
+        """
+        out = np.full(len(tracker_ids), -1, dtype=int)
+        for i, tid in enumerate(tracker_ids):
+            st = self._tracks.get(int(tid))
+            if st is None or not st.votes:
+                continue
+            out[i] = st.team if st.team >= 0 else _majority(st.votes)
+        return out
+
+    def evict(self, frame_idx: int) -> int:
+        """Забыть треки, потерянные ByteTrack'ом. Возвращает, сколько удалили."""
+        stale = [tid for tid, st in self._tracks.items()
+                 if frame_idx - st.last_seen > self.max_age]
+        for tid in stale:
+            del self._tracks[tid]
+        return len(stale)
+
+    def committed(self) -> dict[int, int]:
+        """Только закрепленные tracker_id -> команда."""
+        return {tid: st.team for tid, st in self._tracks.items() if st.team >= 0}
+
+    def reset(self) -> None:
+        self._tracks.clear()
+        self.classified = self.served = 0
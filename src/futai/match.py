@@ -0,0 +1,405 @@
+"""
+Матч целиком на многоядерной машине: видео режется на шарды по времени,
+каждый шард — отдельный процесс со своими моделями и своим ByteTrack.
+
+Шард k начинает на overlap кадров раньше своей границы (разгон трекера).
+На этих общих кадрах треки соседних шардов сшиваются по близости на поле,
+а метки команд приводятся к шарду k-1 (номера кластеров KMeans у каждого
+fit свои). Итог — одно хранилище траекторий (utils.trajectory) с глобальными
+tracker_id и видео detect_out.mp4 / radars_out.mp4, отрисованные по нему.
+
+    python -m src.futai.match match.mp4 weights/players.pt weights/field.pt --workers 8
+"""
+from __future__ import annotations
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from itertools import islice
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+import numpy as np
+import supervision as sv
+
+from .constants import (
+    PLAYER_CLASS_ID,
+    DEFAULT_INFER_BATCH,
+    DETECT_OUT_NAME,
+    RADARS_OUT_NAME,
+    MATCH_SHARD_OVERLAP,
+    MATCH_FIT_FRAMES,
+    STITCH_MAX_DIST_CM,
+    STITCH_MIN_FRAMES
+)
+from .detector.annotation import build_annotators, annotate_frame
+from .detector.cache import flush_cached, infer_indexed
+from .pipeline import render_radar
+from .pitch.config import SoccerPitchConfiguration as CFG
+from .utils.video import VideoSource, VideoWriter
+from .utils.trajectory import (
+    TRAJECTORY_DTYPE,
+    TrajectoryReader,
+    TrajectoryWriter,
+    rows_to_detections
+)
+
+
+@dataclass(slots=True)
+class ShardSpec:
+    """Всё, что нужно процессу-воркеру (должно пиклиться)."""
+    index: int
+    start: int  # первый обрабатываемый кадр (вместе с разгоном)
+    keep_from: int  # с этого кадра строки шарда идут в итог
+    end: int  # не включая
+    video_path: str
+    out_dir: str  # траектории шарда (локальные tracker_id)
+    player_weights: str
+    field_weights: str
+    detector_type: str = "yolo"
+    device: str | None = None
+    detector_options: dict = field(default_factory=dict)
+    team_backend: str = "siglip"
+    team_model: str | None = None  # None — fit на кадрах своего шарда
+    batch_size: int = DEFAULT_INFER_BATCH
+    fit_frames: int = MATCH_FIT_FRAMES
+    cache_dir: str | None = None  # общий кэш детекций (detector.cache)
+
+
+def plan_shards(total_frames: int, n_shards: int,
+                overlap: int = MATCH_SHARD_OVERLAP) -> list[tuple[int, int, int]]:
+    """Поровну по времени: [(start, keep_from, end), ...], start = keep_from - overlap."""
+    bounds = np.linspace(0, total_frames, n_shards + 1).round().astype(int)
+    return [(max(int(a) - overlap, 0), int(a), int(b))
+            for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def build_shard_models(spec: ShardSpec):
+    """(processor, projector) воркера — как в run_pipeline."""
+    from .detector import build_detector
+    from .pitch.pitch_projector import PitchProjector
+    from .processor import TeamVideoProcessor
+
+    processor = TeamVideoProcessor(spec.player_weights, spec.video_path,
+                                   detector_type=spec.detector_type, device=spec.device,
+                                   team_backend=spec.team_backend, team_model=spec.team_model,
+                                   detector_options=spec.detector_options, cache_dir=spec.cache_dir)
+    projector = PitchProjector(build_detector(spec.detector_type, spec.field_weights, spec.device,
+                                              **spec.detector_options), temporal=True,
+                               cache_dir=spec.cache_dir, video_path=spec.video_path)
+    return processor, projector
+
+
+def _fit_team_classifier(processor, spec: ShardSpec) -> dict[str, Any]:
+    # до fit_frames кадров равномерно по шарду, потоково: стоп, как только центры команд устоялись
+    from .handmodel.streaming import fit_from_video  # sklearn — только в воркере
+
+    stride = max((spec.end - spec.start) // max(spec.fit_frames, 1), 1)
+    return fit_from_video(processor.team_clf, spec.video_path, processor.detector, stride=stride,
+                          start=spec.start, end=spec.end, max_frames=spec.fit_frames,
+                          confidence=processor.confidence, batch_size=spec.batch_size)
+
+
+def process_shard(spec: ShardSpec,
+                  build: Callable[[ShardSpec], tuple[Any, Any]] = build_shard_models) -> dict[str, Any]:
+    """Воркер: кадры [start, end) -> траектории в spec.out_dir. Номера кадров глобальные."""
+    t0 = time.perf_counter()
+    processor, projector = build(spec)
+    team_fit = _fit_team_classifier(processor, spec) if spec.team_model is None else None
+    processor.frame_gen = VideoSource(spec.video_path).frames(spec.start, spec.end)
+    processor.frame_idx = spec.start - 1
+
+    pos = sv.Position.BOTTOM_CENTER
+    with TrajectoryWriter(spec.out_dir) as writer:
+        while frames := list(islice(processor.frame_gen, spec.batch_size)):
+            results = infer_indexed(processor.detector, frames, processor.frame_idx + 1,
+                                    processor.confidence)
+            for frame, res in zip(frames, results):
+                ball_det, all_det = processor._track(frame, res)
+                proj = projector.project(frame, {
+                    "ball": ball_det.get_anchors_coordinates(pos),
+                    "player": all_det.get_anchors_coordinates(pos)
+                }, frame_idx=processor.frame_idx)
+                writer.append(processor.frame_idx, ball_det, all_det, proj)
+    flush_cached(processor.detector, getattr(projector, "field_model", None))
+    return {
+        "index": spec.index,
+        "frames": processor.frame_idx - spec.start + 1,
+        "seconds": time.perf_counter() - t0,
+        "projector": getattr(projector, "stats", {}),
+        "team_fit": team_fit
+    }
+
+
+_THREAD_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+@contextmanager
+def _worker_threads_env(threads: int | None) -> Iterator[None]:
+    """
+    Лимит потоков BLAS / OpenMP для воркеров — в окружении родителя, пока жив пул.
+    Из initializer поздно: spawn-воркер сначала импортирует этот модуль (numpy,
+    supervision, torch), и пулы потоков уже рассчитаны на все ядра.
+    """
+    if not threads:
+        yield
+        return
+    saved = {var: os.environ.get(var) for var in _THREAD_VARS}
+    os.environ.update({var: str(threads) for var in _THREAD_VARS})
+    try:
+        yield
+    finally:
+        for var, value in saved.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+
+def _init_worker(threads: int | None) -> None:
+    # иначе N процессов × (все ядра) потоков cv2 душат друг друга; BLAS / OpenMP —
+    # через окружение, см. _worker_threads_env
+    if threads:
+        import cv2
+        cv2.setNumThreads(threads)
+
+
+# сшивка
+def match_tracks(a: np.ndarray, b: np.ndarray, max_dist: float = STITCH_MAX_DIST_CM,
+                 min_frames: int = STITCH_MIN_FRAMES) -> list[tuple[int, int, float]]:
+    """
+    Пары (tracker_id в a, tracker_id в b, среднее расстояние, см) по общим кадрам.
+    Сравниваем только объекты одной роли с точкой на поле; жадно от ближайших пар,
+    каждый трек — не больше одной пары.
+    """
+    a = a[(a["tracker_id"] >= 0) & np.isfinite(a["px"]) & np.isfinite(a["py"])]
+    b = b[(b["tracker_id"] >= 0) & np.isfinite(b["px"]) & np.isfinite(b["py"])]
+    ids_a, ids_b = np.unique(a["tracker_id"]), np.unique(b["tracker_id"])
+    if not len(ids_a) or not len(ids_b):
+        return []
+
+    total = np.zeros((len(ids_a), len(ids_b)))
+    count = np.zeros((len(ids_a), len(ids_b)), dtype=int)
+    for f in np.intersect1d(a["frame"], b["frame"]):
+        ra, rb = a[a["frame"] == f], b[b["frame"] == f]
+        d = np.hypot(ra["px"][:, None] - rb["px"][None, :], ra["py"][:, None] - rb["py"][None, :])
+        same = ra["role"][:, None] == rb["role"][None, :]
+        # в кадре tracker_id уникальны — повторов индексов нет
+        cell = np.ix_(np.searchsorted(ids_a, ra["tracker_id"]), np.searchsorted(ids_b, rb["tracker_id"]))
+        total[cell] += np.where(same, d, 0.0)
+        count[cell] += same
+
+    mean = total / np.maximum(count, 1)
+    ok = (count >= min_frames) & (mean <= max_dist)
+    cand = np.flatnonzero(ok.ravel())
+    cand = cand[np.argsort(mean.ravel()[cand], kind="stable")]
+    used_a, used_b, pairs = set(), set(), []
+    for flat in cand:
+        i, j = divmod(int(flat), len(ids_b))
+        if i in used_a or j in used_b:
+            continue
+        used_a.add(i)
+        used_b.add(j)
+        pairs.append((int(ids_a[i]), int(ids_b[j]), float(mean[i, j])))
+    return pairs
+
+
+def _track_team(rows: np.ndarray, tid: int) -> int:
+    # большинство меток 0/1 полевого игрока в окне; -1 — меток нет
+    t = rows["team"][(rows["tracker_id"] == tid) & (rows["role"] == PLAYER_CLASS_ID)]
+    t = t[(t == 0) | (t == 1)]
+    return int(np.bincount(t, minlength=2).argmax()) if len(t) else -1
+
+
+def teams_swapped(a: np.ndarray, b: np.ndarray, pairs: list[tuple[int, int, float]]) -> bool:
+    """Совпавшие треки голосуют: у b команды 0/1 переставлены относительно a?"""
+    agree = disagree = 0
+    for ta, tb, _ in pairs:
+        ka, kb = _track_team(a, ta), _track_team(b, tb)
+        if ka < 0 or kb < 0:
+            continue
+        agree += ka == kb
+        disagree += ka != kb
+    return disagree > agree
+
+
+def _swap_teams(rows: np.ndarray) -> None:
+    m = (rows["team"] == 0) | (rows["team"] == 1)  # судья (2) и мяч (-1) не трогаем
+    rows["team"][m] = 1 - rows["team"][m]
+
+
+def stitch_shards(specs: list[ShardSpec], out_dir: str | Path,
+                  max_dist: float = STITCH_MAX_DIST_CM,
+                  min_frames: int = STITCH_MIN_FRAMES) -> dict[str, Any]:
+    """
+    Траектории шардов -> одно хранилище в out_dir: глобальные tracker_id,
+    единые команды, кадры разгона выброшены. Возвращает статистику сшивки.
+    """
+    report = []
+    next_id = 1  # как у ByteTrack
+    prev = None  # (reader, local -> global, swapped) предыдущего шарда
+    with TrajectoryWriter(out_dir) as writer:
+        for spec in specs:
+            reader = TrajectoryReader(spec.out_dir)
+            mapping: dict[int, int] = {}
+            pairs, swapped = [], False
+            if prev is not None and spec.start < spec.keep_from:
+                p_reader, p_map, p_swapped = prev
+                a = p_reader.window(spec.start, spec.keep_from)
+                b = reader.window(spec.start, spec.keep_from)
+                if p_swapped:  # сравниваем с уже приведёнными метками
+                    _swap_teams(a)
+                pairs = match_tracks(a, b, max_dist, min_frames)
+                swapped = teams_swapped(a, b, pairs)
+                mapping = {tb: p_map[ta] for ta, tb, _ in pairs if ta in p_map}
+            for tid in reader.tracker_ids().tolist():
+                if tid >= 0 and tid not in mapping:
+                    mapping[tid] = next_id
+                    next_id += 1
+
+            keys = np.array(sorted(mapping), dtype=np.int64)
+            vals = np.array([mapping[k] for k in keys.tolist()], dtype=np.int32)
+            for chunk in reader.iter_chunks():
+                rows = np.array(chunk[chunk["frame"] >= spec.keep_from])
+                tracked = rows["tracker_id"] >= 0
+                rows["tracker_id"][tracked] = vals[np.searchsorted(keys, rows["tracker_id"][tracked])]
+                if swapped:
+                    _swap_teams(rows)
+                writer.append_rows(rows)
+
+            report.append({"index": spec.index, "tracks": len(mapping),
+                           "stitched": len(pairs), "teams_swapped": swapped})
+            prev = (reader, mapping, swapped)
+    return {"tracks": next_id - 1, "shards": report}
+
+
+# итоговое видео
+def _frames_rows(reader: TrajectoryReader) -> Iterator[tuple[int, np.ndarray]]:
+    # строки хранилища, сгруппированные по кадрам (куски идут по возрастанию frame)
+    for chunk in reader.iter_chunks():
+        frames, first = np.unique(chunk["frame"], return_index=True)
+        bounds = [*first.tolist(), len(chunk)]
+        for f, s, e in zip(frames.tolist(), bounds[:-1], bounds[1:]):
+            yield f, np.array(chunk[s:e])
+
+
+def render_match(video_path: str | Path, trajectory_dir: str | Path,
+                 out_dir: str | Path = ".") -> int:
+    """detect_out.mp4 + radars_out.mp4 по хранилищу траекторий. Возвращает число кадров."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    cfg, annotators = CFG(), build_annotators()
+    video = VideoSource(video_path)
+    rows_iter = _frames_rows(TrajectoryReader(trajectory_dir))
+    pending = next(rows_iter, None)
+    empty = np.empty(0, TRAJECTORY_DTYPE)
+
+    n, radar = 0, None
+    with ExitStack() as stack:
+        detect_sink = stack.enter_context(VideoWriter(out_dir / DETECT_OUT_NAME, video.index.fps))
+        radar_sink = stack.enter_context(VideoWriter(out_dir / RADARS_OUT_NAME, video.index.fps))
+        for i, frame in stack.enter_context(video).indexed():
+            rows = empty
+            if pending is not None and pending[0] == i:
+                rows = pending[1]
+                pending = next(rows_iter, None)
+            ball_det, all_det, proj = rows_to_detections(rows)
+            # запись синхронная — кадр и один буфер радара переиспользуются
+            detect_sink.write_frame(annotate_frame(annotators, frame, ball_det, all_det, out=frame))
+            radar = render_radar(cfg, ball_det, all_det, proj, out=radar)
+            radar_sink.write_frame(radar)
+            n += 1
+    return n
+
+
+def run_match(
+        video_path: str | Path,
+        player_weights: str | Path,
+        field_weights: str | Path,
+        out_dir: str | Path = ".",
+        workers: int | None = None,
+        shards: int | None = None,
+        overlap: int = MATCH_SHARD_OVERLAP,
+        threads_per_worker: int | None = 1,
+        detector_type: str = "yolo",
+        device: str | None = None,
+        detector_options: dict | None = None,
+        team_backend: str = "siglip",
+        team_model: str | None = None,
+        batch_size: int = DEFAULT_INFER_BATCH,
+        render: bool = True,
+        cache_dir: str | Path | None = None,
+        build: Callable[[ShardSpec], tuple[Any, Any]] = build_shard_models
+) -> dict[str, Any]:
+    """
+    Шарды в пуле процессов -> сшивка -> (опционально) итоговое видео.
+    out_dir/shards/NNN — траектории шардов, out_dir/trajectory — итог.
+    build — фабрика (processor, projector) в воркере (должна пиклиться).
+    cache_dir — общий для шардов кэш детекций и точек поля (detector.cache).
+    """
+    out_dir = Path(out_dir)
+    workers = workers or os.cpu_count() or 1
+    total = len(VideoSource(video_path))  # по индексу — точнее CAP_PROP_FRAME_COUNT
+    specs = [
+        ShardSpec(index=k, start=s, keep_from=keep, end=e, video_path=str(video_path),
+                  out_dir=str(out_dir / "shards" / f"{k:03d}"),
+                  player_weights=str(player_weights), field_weights=str(field_weights),
+                  detector_type=detector_type, device=device,
+                  detector_options=detector_options or {}, team_backend=team_backend,
+                  team_model=team_model, batch_size=batch_size,
+                  cache_dir=str(cache_dir) if cache_dir else None)
+        for k, (s, keep, e) in enumerate(plan_shards(total, shards or workers, overlap))
+    ]
+
+    t0 = time.perf_counter()
+    # spawn: torch / cv2 не любят fork с уже поднятыми потоками
+    with _worker_threads_env(threads_per_worker), \
+            ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                                initializer=_init_worker, initargs=(threads_per_worker,)) as pool:
+        shard_stats = list(pool.map(process_shard, specs, [build] * len(specs)))
+    t_shards = time.perf_counter() - t0
+
+    stitch = stitch_shards(specs, out_dir / "trajectory")
+    t_stitch = time.perf_counter() - t0 - t_shards
+    frames = render_match(video_path, out_dir / "trajectory", out_dir) if render else 0
+    return {
+        "frames": total,
+        "shards": shard_stats,
+        "stitch": stitch,
+        "rendered": frames,
+        "seconds": {"shards": t_shards, "stitch": t_stitch,
+                    "render": time.perf_counter() - t0 - t_shards - t_stitch}
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    ap = argparse.ArgumentParser(description="RUT-FUT-AI: матч по шардам на нескольких процессах")
+    ap.add_argument("video")
+    ap.add_argument("player_weights")
+    ap.add_argument("field_weights")
+    ap.add_argument("--out-dir", default=".")
+    ap.add_argument("--workers", type=int, default=None, help="процессов (по умолчанию — все ядра)")
+    ap.add_argument("--shards", type=int, default=None, help="шардов (по умолчанию = workers)")
+    ap.add_argument("--overlap", type=int, default=MATCH_SHARD_OVERLAP, help="кадров перекрытия")
+    ap.add_argument("--threads", type=int, default=1, help="потоков BLAS / cv2 на воркер")
+    ap.add_argument("--device", default=None)
+    ap.add_argument("--detector", default="yolo", help="yolo | onnx")
+    ap.add_argument("--team-backend", default="siglip", help="siglip | hist")
+    ap.add_argument("--team-model", default=None, help="обученная модель команд (save())")
+    ap.add_argument("--batch", type=int, default=DEFAULT_INFER_BATCH)
+    ap.add_argument("--no-render", action="store_true", help="только траектории, без видео")
+    ap.add_argument("--cache", default=None, help="каталог кэша детекций и точек поля")
+    args = ap.parse_args()
+    print(json.dumps(run_match(args.video, args.player_weights, args.field_weights, args.out_dir,
+                               workers=args.workers, shards=args.shards, overlap=args.overlap,
+                               threads_per_worker=args.threads, detector_type=args.detector,
+                               device=args.device, team_backend=args.team_backend,
+                               team_model=args.team_model, batch_size=args.batch,
+                               render=not args.no_render, cache_dir=args.cache),
+                     indent=2))
@@ -0,0 +1,375 @@
+"""
+Потоковый конвейер: decode -> infer -> render -> encode в отдельных потоках.
+
+Стадии связаны ограниченными очередями (backpressure): если энкодер не
+успевает, рендер встаёт на put(), за ним детектор и декодер. cv2 / ffmpeg
+отпускают GIL, поэтому декодирование и запись видео идут параллельно с моделью.
+На выходе два файла: detect_out.mp4 (кадр + боксы) и radars_out.mp4 (радар).
+Кадры рисуются без matplotlib и лишних копий: аннотации — прямо в декодированный
+кадр, радар — в буферы по кругу (visualizer.BufferRing); inset=True — радар
+ещё и вставкой в detect_out.mp4 (visualizer.Compositor).
+"""
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+import supervision as sv
+
+from .constants import (
+    DEFAULT_INFER_BATCH,
+    DEFAULT_QUEUE_SIZE,
+    DETECT_OUT_NAME,
+    MATCH_FIT_FRAMES,
+    RADARS_OUT_NAME
+)
+from .detector.cache import CachedDetector, flush_cached, infer_indexed
+from .pitch.config import SoccerPitchConfiguration as CFG
+from .utils.metrics import Metrics, JsonLinesSink, PrometheusFileSink
+from .utils.trajectory import TrajectoryWriter
+from .utils.video import VideoSource, VideoWriter
+from .visualizer.visualizer import BufferRing, Compositor, draw_radar, radar_shape
+
+# маркер конца потока, идёт по всем очередям следом за последним кадром
+_STOP = object()
+
+
+def render_radar(cfg: CFG, ball_det: sv.Detections, all_det: sv.Detections,
+                 proj: dict[str, np.ndarray], out: np.ndarray | None = None) -> np.ndarray:
+    """Радар одного кадра: мяч, две команды и судьи (BGR-картинка, в out если задан)."""
+    return draw_radar(cfg, proj["ball"], proj["player"], all_det.class_id, out=out)
+
+
+class PipelineRunner:
+    """
+    Четыре потока-стадии поверх готового TeamVideoProcessor:
+      decode  — читает кадры из processor.frame_gen
+      infer   — прогоняет детектор пачками по batch_size кадров
+      render  — трекинг, команды, аннотации, проекция и радар (строго по порядку)
+                + строки траекторий в trajectory_dir, если он задан
+      encode  — пишет detect_out.mp4 и radars_out.mp4
+    inset — радар ещё и вставкой в кадр detect_out.mp4.
+    """
+
+    STAGES = ("decode", "infer", "render", "encode")
+
+    def __init__(
+            self,
+            processor,
+            projector,
+            video_path: str | Path,
+            out_dir: str | Path = ".",
+            batch_size: int = DEFAULT_INFER_BATCH,
+            queue_size: int = DEFAULT_QUEUE_SIZE,
+            trajectory_dir: str | Path | None = None,
+            inset: bool = False
+    ):
+        self.processor = processor
+        self.projector = projector
+        self.batch_size = batch_size
+        self.cfg = CFG()
+
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        self.detect_path = out_dir / DETECT_OUT_NAME
+        self.radars_path = out_dir / RADARS_OUT_NAME
+        self.video_info = VideoSource(video_path).info
+        self.trajectory = TrajectoryWriter(trajectory_dir) if trajectory_dir else None
+        self.compositor = Compositor(processor.annotators, (self.video_info.width, self.video_info.height),
+                                     self.cfg) if inset else None
+        # радар рисуется в буфер, пока прошлые ждут энкодер: очередь + энкодер + рисуемый
+        self._radars = BufferRing(queue_size + 2)
+        self._radar_shape = radar_shape(self.cfg)
+
+        # очередь i лежит между стадиями i и i+1
+        self.queues = {
+            name: queue.Queue(maxsize=queue_size)
+            for name in ("frames", "detections", "rendered")
+        }
+        self._max_depth = dict.fromkeys(self.queues, 0)
+        self._busy = dict.fromkeys(self.STAGES, 0.0)
+        self._stop = threading.Event()
+        self._errors: list[BaseException] = []
+        self.frames_written = 0
+        # номер следующего кадра для детектора (кэш детекций ищет по номеру)
+        self._infer_idx = processor.frame_idx + 1
+
+    # мониторинг
+    def queue_depths(self) -> dict[str, int]:
+        """Текущая заполненность очередей: где копится — там и узкое место."""
+        return {name: q.qsize() for name, q in self.queues.items()}
+
+    def stats(self) -> dict[str, Any]:
+        """Глубина очередей (текущая / максимум / ёмкость) + занятость стадий."""
+        return {
+            "frames": self.frames_written,
+            "queues": {
+                name: {
+                    "depth": q.qsize(),
+                    "max_depth": self._max_depth[name],
+                    "capacity": q.maxsize
+                }
+                for name, q in self.queues.items()
+            },
+            "busy_s": dict(self._busy),
+            "projector": getattr(self.projector, "stats", {}),
+            "cache": {
+                name: det.stats
+                for name, det in (("detections", self.processor.detector),
+                                  ("keypoints", getattr(self.projector, "field_model", None)))
+                if isinstance(det, CachedDetector)
+            },
+            "metrics": self.processor.metrics.summary()
+        }
+
+    # обвязка очередей: put/get не виснут навсегда, если соседняя стадия упала
+    def _put(self, name: str, item) -> None:
+        q = self.queues[name]
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                self._max_depth[name] = max(self._max_depth[name], q.qsize())
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, name: str):
+        q = self.queues[name]
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _STOP
+
+    def _worker(self, stage: str, fn: Callable[[], None]) -> threading.Thread:
+        def target():
+            try:
+                fn()
+            except BaseException as e:  # пробрасываем в run()
+                self._errors.append(e)
+                self._stop.set()
+        return threading.Thread(target=target, name=f"futai-{stage}", daemon=True)
+
+    # стадии
+    def _decode(self) -> None:
+        frames = iter(self.processor.frame_gen)
+        while not self._stop.is_set():
+            t0 = time.perf_counter()
+            frame = next(frames, _STOP)
+            self._busy["decode"] += time.perf_counter() - t0
+            self._put("frames", frame)
+            if frame is _STOP:
+                return
+
+    def _infer(self) -> None:
+        done = False
+        while not done:
+            frames = []
+            while len(frames) < self.batch_size:
+                frame = self._get("frames")
+                if frame is _STOP:
+                    done = True
+                    break
+                frames.append(frame)
+            if not frames:
+                break
+            t0 = time.perf_counter()
+            results = infer_indexed(self.processor.detector, frames, self._infer_idx,
+                                    self.processor.confidence)
+            self._infer_idx += len(frames)
+            dt = time.perf_counter() - t0
+            self._busy["infer"] += dt
+            # время батча делим поровну; в метрики пишет render — у них один поток
+            for frame, res in zip(frames, results):
+                self._put("detections", (frame, res, dt / len(frames)))
+        self._put("detections", _STOP)
+
+    def _render(self) -> None:
+        metrics = self.processor.metrics
+        while (item := self._get("detections")) is not _STOP:
+            frame, res, detect_s = item
+            t0 = time.perf_counter()
+            metrics.observe("detect", detect_s)
+            ball_det, all_det = self.processor._track(frame, res)
+            # проекция — по чистому кадру, потом аннотации прямо в него (кадр больше никому не нужен)
+            proj = self.projector.project(frame, {
+                "ball": ball_det.get_anchors_coordinates(sv.Position.BOTTOM_CENTER),
+                "player": all_det.get_anchors_coordinates(sv.Position.BOTTOM_CENTER)
+            }, frame_idx=self.processor.frame_idx)
+            if self.trajectory is not None:
+                self.trajectory.append(self.processor.frame_idx, ball_det, all_det, proj)
+            if self.compositor is None:
+                annotated = self.processor._annotate(frame, ball_det, all_det, out=frame)
+            else:
+                with metrics.stage("annotate"):
+                    annotated = self.compositor.compose(frame, ball_det, all_det, proj, out=frame)
+            with metrics.stage("radar"):
+                radar = render_radar(self.cfg, ball_det, all_det, proj,
+                                     out=self._radars.next(self._radar_shape))
+            metrics.end_frame(self.processor.frame_idx)
+            self._busy["render"] += time.perf_counter() - t0
+            self._put("rendered", (annotated, radar))
+        self._put("rendered", _STOP)
+
+    def _encode(self) -> None:
+        # размер кадра VideoWriter берёт по первому кадру — радару своя VideoInfo не нужна
+        first = self._get("rendered")
+        if first is _STOP:
+            return
+        fps = self.video_info.fps
+        with VideoWriter(self.detect_path, fps) as detect_sink, \
+                VideoWriter(self.radars_path, fps) as radar_sink:
+            item = first
+            while item is not _STOP:
+                t0 = time.perf_counter()
+                detect_sink.write_frame(item[0])
+                radar_sink.write_frame(item[1])
+                self._busy["encode"] += time.perf_counter() - t0
+                self.frames_written += 1
+                item = self._get("rendered")
+
+    def run(self) -> dict[str, Any]:
+        """Прогнать всё видео. Возвращает stats() по окончании."""
+        threads = [
+            self._worker("decode", self._decode),
+            self._worker("infer", self._infer),
+            self._worker("render", self._render),
+            self._worker("encode", self._encode)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        flush_cached(self.processor.detector, getattr(self.projector, "field_model", None))
+        if self.trajectory is not None:
+            self.trajectory.close()
+        if self._errors:
+            raise self._errors[0]
+        return self.stats()
+
+
+def fit_team_classifier(processor, video_path: str | Path, start: int = 0, end: int | None = None,
+                        fit_frames: int = MATCH_FIT_FRAMES,
+                        batch_size: int = DEFAULT_INFER_BATCH) -> dict[str, Any]:
+    """
+    Fit модели команд процессора до прогона: до fit_frames кадров равномерно по
+    [start, end), потоково — как у шардов futai.match. Без этого первый же кадр
+    с игроками упадёт на необученном KMeans.
+    """
+    from .handmodel.streaming import fit_from_video
+
+    end = len(VideoSource(video_path)) if end is None else end
+    stride = max((end - start) // max(fit_frames, 1), 1)
+    return fit_from_video(processor.team_clf, str(video_path), processor.detector, stride=stride,
+                          start=start, end=end, max_frames=fit_frames,
+                          confidence=processor.confidence, batch_size=batch_size)
+
+
+def run_pipeline(
+        video_path: str | Path,
+        player_weights: str | Path,
+        field_weights: str | Path,
+        out_dir: str | Path = ".",
+        detector_type: str = "yolo",
+        device: str | None = None,
+        batch_size: int = DEFAULT_INFER_BATCH,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        detector_options: dict | None = None,
+        trajectory_dir: str | Path | None = None,
+        metrics_dir: str | Path | None = None,
+        start: int = 0,
+        end: int | None = None,
+        inset: bool = False,
+        cache_dir: str | Path | None = None,
+        team_backend: str = "siglip",
+        team_model: str | Path | None = None,
+        fit_frames: int = MATCH_FIT_FRAMES
+) -> dict[str, Any]:
+    """
+    End-to-end: видео -> detect_out.mp4 + radars_out.mp4 в out_dir
+    (+ траектории в координатах поля в trajectory_dir, см. utils.trajectory).
+    detector_type / detector_options — общие для модели игроков и модели поля.
+    metrics_dir — метрики стадий: metrics.jsonl (строка на кадр) и futai.prom.
+    [start, end) — только это окно кадров (до него ролик не декодируется).
+    inset — радар вставкой и в detect_out.mp4.
+    cache_dir — кэш детекций и точек поля (detector.cache): повторный прогон
+    того же ролика с теми же весами не запускает модели.
+    team_model — обученная модель команд (TeamClassifier.save); без неё —
+    fit по fit_frames кадрам окна перед прогоном (fit_team_classifier).
+    """
+    from .detector import build_detector
+    from .pitch.pitch_projector import PitchProjector
+    from .processor import TeamVideoProcessor
+
+    options = detector_options or {}
+    metrics, sinks = None, []
+    if metrics_dir is not None:
+        Path(metrics_dir).mkdir(parents=True, exist_ok=True)
+        metrics = Metrics()
+        sinks = [metrics.add_callback(JsonLinesSink(Path(metrics_dir) / "metrics.jsonl")),
+                 metrics.add_callback(PrometheusFileSink(metrics, Path(metrics_dir) / "futai.prom"))]
+    processor = TeamVideoProcessor(str(player_weights), str(video_path),
+                                   detector_type=detector_type, device=device,
+                                   detector_options=options, metrics=metrics, start=start, end=end,
+                                   cache_dir=cache_dir, team_backend=team_backend,
+                                   team_model=str(team_model) if team_model else None)
+    team_fit = None if team_model else fit_team_classifier(processor, video_path, start, end,
+                                                           fit_frames, batch_size)
+    projector = PitchProjector(build_detector(detector_type, str(field_weights), device,
+                                              **options), temporal=True, metrics=metrics,
+                               cache_dir=cache_dir, video_path=str(video_path))
+    runner = PipelineRunner(processor, projector, video_path, out_dir,
+                            batch_size=batch_size, queue_size=queue_size,
+                            trajectory_dir=trajectory_dir, inset=inset)
+    try:
+        stats = runner.run()
+        return {**stats, "team_fit": team_fit} if team_fit is not None else stats
+    finally:
+        for sink in sinks:
+            sink.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    ap = argparse.ArgumentParser(description="RUT-FUT-AI: видео -> detect_out.mp4 + radars_out.mp4")
+    ap.add_argument("video")
+    ap.add_argument("player_weights")
+    ap.add_argument("field_weights")
+    ap.add_argument("--out-dir", default=".")
+    ap.add_argument("--device", default=None)
+    ap.add_argument("--detector", default="yolo", help="yolo | onnx")
+    ap.add_argument("--int8", action="store_true", help="onnx: INT8-квантизация")
+    ap.add_argument("--threads", type=int, default=None, help="onnx: intra-op потоки")
+    ap.add_argument("--batch", type=int, default=DEFAULT_INFER_BATCH)
+    ap.add_argument("--queue", type=int, default=DEFAULT_QUEUE_SIZE)
+    ap.add_argument("--trajectory", default=None, help="каталог для траекторий (.npy куски)")
+    ap.add_argument("--metrics", default=None, help="каталог для метрик (JSON lines + Prometheus)")
+    ap.add_argument("--start", type=float, default=0.0, help="начало окна, секунды")
+    ap.add_argument("--end", type=float, default=None, help="конец окна, секунды")
+    ap.add_argument("--inset", action="store_true", help="радар вставкой в detect_out.mp4")
+    ap.add_argument("--cache", default=None, help="каталог кэша детекций и точек поля")
+    ap.add_argument("--team-backend", default="siglip", help="siglip | hist")
+    ap.add_argument("--team-model", default=None, help="обученная модель команд (save())")
+    ap.add_argument("--fit-frames", type=int, default=MATCH_FIT_FRAMES,
+                    help="кадров для fit модели команд, если нет --team-model")
+    args = ap.parse_args()
+    start, end = VideoSource(args.video).window(args.start, args.end)
+    onnx_opts = {"quantize": args.int8, "intra_op_threads": args.threads} \
+        if args.detector == "onnx" else {}
+    print(json.dumps(run_pipeline(args.video, args.player_weights, args.field_weights,
+                                  args.out_dir, detector_type=args.detector,
+                                  device=args.device, batch_size=args.batch,
+                                  queue_size=args.queue, detector_options=onnx_opts,
+                                  trajectory_dir=args.trajectory,
+                                  metrics_dir=args.metrics, start=start, end=end,
+                                  inset=args.inset, cache_dir=args.cache,
+                                  team_backend=args.team_backend, team_model=args.team_model,
+                                  fit_frames=args.fit_frames),
+                     indent=2))
@@ -0,0 +1,207 @@
+"""
+Контроль пространства без растра: точные площади ячеек Вороного в см².
+
+Раньше долю поля команды давал только подсчёт пикселей маски
+draw_pitch_voronoi_diagram — на каждый кадр, с точностью до пикселя радара.
+Здесь ячейка каждого игрока — прямоугольник поля, отсечённый полуплоскостями
+«ближе ко мне, чем к j» (как voronoi_cell), а площадь — формула шнурков.
+Отсечение идёт сразу для всех игроков всех кадров пачки: N шагов numpy на
+пачку вместо N² вызовов clip_polygon на кадр.
+
+  - control_areas    — (F, N) площади ячеек по (F, N, 2) координатам (NaN — нет игрока)
+  - team_control     — площади игроков и команд + доля поля по кадрам (ControlSeries)
+  - control_from_trajectory — то же по хранилищу траекторий (utils.trajectory)
+
+Судьи и всё, что не команда 0..n_teams-1, пространством не владеют — как на
+диаграмме Вороного, где делят поле только две команды.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from .config import SoccerPitchConfiguration as CFG
+from ..constants import CONTROL_CHUNK_FRAMES
+
+
+def pitch_rect(cfg: CFG | None = None) -> tuple[float, float, float, float]:
+    """(x0, y0, x1, y1) поля в см."""
+    cfg = cfg or CFG()
+    return 0.0, 0.0, float(cfg.length), float(cfg.width)
+
+
+def _next_index(cnt: np.ndarray, width: int) -> np.ndarray:
+    # номер следующей вершины по кругу внутри первых cnt
+    idx = np.arange(width)
+    return np.where(idx[None, :] + 1 < cnt[:, None], idx[None, :] + 1, 0)
+
+
+def _clip_batch(poly: np.ndarray, cnt: np.ndarray, a: np.ndarray, b: np.ndarray,
+                c: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    clip_polygon для M многоугольников сразу: poly (M, V, 2), первые cnt вершин
+    настоящие; полуплоскость a*x + b*y <= c своя у каждого. Возвращает новые
+    (poly, cnt) — вершины сдвинуты в начало, ширина по самому длинному.
+    """
+    m, width = poly.shape[:2]
+    valid = np.arange(width)[None, :] < cnt[:, None]
+    side = poly[..., 0] * a[:, None] + poly[..., 1] * b[:, None] - c[:, None]
+    nxt = _next_index(cnt, width)
+    q = np.take_along_axis(poly, nxt[..., None], axis=1)
+    sq = np.take_along_axis(side, nxt, axis=1)
+    inside = side <= 0
+    keep = valid & inside
+    cross = valid & (inside != (sq <= 0))  # ребро пересекает границу
+    t = side / np.where(cross, side - sq, 1.0)
+    inter = poly + (q - poly) * t[..., None]
+    # на каждое ребро: вершина (если внутри) и точка пересечения — в этом порядке
+    cand = np.stack([poly, inter], axis=2).reshape(m, 2 * width, 2)
+    mask = np.stack([keep, cross], axis=2).reshape(m, 2 * width)
+    new_cnt = mask.sum(axis=1)
+    new_width = max(int(new_cnt.max(initial=0)), 1)
+    order = np.argsort(~mask, axis=1, kind="stable")[:, :new_width]
+    return np.take_along_axis(cand, order[..., None], axis=1), new_cnt
+
+
+def _shoelace(poly: np.ndarray, cnt: np.ndarray) -> np.ndarray:
+    width = poly.shape[1]
+    valid = np.arange(width)[None, :] < cnt[:, None]
+    q = np.take_along_axis(poly, _next_index(cnt, width)[..., None], axis=1)
+    cross = poly[..., 0] * q[..., 1] - q[..., 0] * poly[..., 1]
+    return 0.5 * np.abs(np.where(valid, cross, 0.0).sum(axis=1))
+
+
+def _areas_chunk(xy: np.ndarray, rect: tuple[float, float, float, float]) -> np.ndarray:
+    f, n = xy.shape[:2]
+    alive = np.isfinite(xy).all(axis=2)  # (F, N)
+    p = np.where(alive[..., None], xy, 0.0)
+    pp = (p ** 2).sum(axis=2)
+    x0, y0, x1, y1 = rect
+    poly = np.broadcast_to(np.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], float),
+                           (f * n, 4, 2)).copy()
+    cnt = np.where(alive.ravel(), 4, 0)
+    i = np.arange(n)
+    for j in range(n):
+        # |x - p_i|^2 <= |x - p_j|^2  <=>  (p_j - p_i)·x <= (|p_j|^2 - |p_i|^2) / 2
+        a = p[:, j, None, 0] - p[..., 0]
+        b = p[:, j, None, 1] - p[..., 1]
+        c = (pp[:, j, None] - pp) / 2
+        same = (a == 0) & (b == 0)
+        # совпавшие точки: пока вся ячейка меньшему номеру; j == i и пустой j — не режут
+        c = np.where(same, np.where(i[None, :] > j, -1.0, 1.0), c)
+        c = np.where(alive[:, j, None] & (i[None, :] != j), c, 1.0)
+        a = np.where(alive[:, j, None], a, 0.0)
+        b = np.where(alive[:, j, None], b, 0.0)
+        poly, cnt = _clip_batch(poly, cnt, a.ravel(), b.ravel(), c.ravel())
+    areas = _shoelace(poly, cnt).reshape(f, n)
+    # ячейку совпавших игроков (куча у бровки, один бокс на двоих) делим поровну
+    same = (p[:, :, None] == p[:, None]).all(axis=3) & alive[:, :, None] & alive[:, None]
+    return np.einsum("fij,fj->fi", same, areas) / np.maximum(same.sum(axis=2), 1)
+
+
+def control_areas(xy: np.ndarray, rect: tuple[float, float, float, float] | None = None,
+                  chunk: int = CONTROL_CHUNK_FRAMES) -> np.ndarray:
+    """
+    xy — (F, N, 2) или (N, 2) координаты на поле, см; NaN — игрока в кадре нет.
+    Возвращает (F, N) / (N,) площади ячеек Вороного внутри rect (по умолчанию
+    поле), см²; сумма по живым игрокам кадра — площадь rect, игроки в одной
+    точке делят ячейку поровну. chunk — кадров за один проход (память ~ chunk × N × N).
+    """
+    xy = np.asarray(xy, dtype=float)
+    single = xy.ndim == 2
+    xy = xy[None] if single else xy
+    rect = rect or pitch_rect()
+    out = np.zeros(xy.shape[:2])
+    if xy.shape[1]:
+        for s in range(0, len(xy), max(chunk, 1)):
+            out[s:s + chunk] = _areas_chunk(xy[s:s + chunk], rect)
+    return out[0] if single else out
+
+
+@dataclass(slots=True)
+class ControlSeries:
+    """Контроль пространства по кадрам: площади в см², доли — от суммы по командам."""
+
+    frames: np.ndarray  # (F,) номера кадров
+    player_area: np.ndarray  # (F, N) площадь ячейки игрока, 0 — нет в кадре
+    team: np.ndarray  # (F, N) команда игрока, -1 — нет
+    team_area: np.ndarray  # (F, n_teams)
+    tracker_id: np.ndarray | None = None  # (F, N), если известны
+
+    @property
+    def share(self) -> np.ndarray:
+        """(F, n_teams) доля поля команды; NaN — в кадре нет ни одного игрока."""
+        total = self.team_area.sum(axis=1, keepdims=True)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(total > 0, self.team_area / total, np.nan)
+
+    def rolling(self, window: int) -> np.ndarray:
+        """share, сглаженная скользящим средним по window кадрам (кадры без игроков не в счёт)."""
+        share = self.share
+        ok = np.isfinite(share[:, :1])
+        csum = np.cumsum(np.vstack([np.zeros((1, share.shape[1])), np.where(ok, share, 0.0)]), axis=0)
+        ccnt = np.cumsum(np.concatenate([[0], ok[:, 0]]))
+        hi = np.arange(1, len(share) + 1)
+        lo = np.maximum(hi - max(window, 1), 0)
+        n = (ccnt[hi] - ccnt[lo])[:, None]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(n > 0, (csum[hi] - csum[lo]) / n, np.nan)
+
+    def summary(self) -> dict:
+        share = self.share
+        return {
+            "frames": len(self.frames),
+            "mean_share": np.nanmean(share, axis=0).tolist() if np.isfinite(share).any() else None,
+            "mean_player_area_m2": float(self.player_area[self.team >= 0].mean() / 1e4)
+            if (self.team >= 0).any() else None
+        }
+
+
+def team_control(xy: np.ndarray, team: np.ndarray, n_teams: int = 2,
+                 frames: np.ndarray | None = None, tracker_id: np.ndarray | None = None,
+                 rect: tuple[float, float, float, float] | None = None,
+                 chunk: int = CONTROL_CHUNK_FRAMES) -> ControlSeries:
+    """
+    xy (F, N, 2), team (F, N) или (N,) — команда каждого игрока. Поле делят
+    только игроки команд 0..n_teams-1 (вратари — со своей командой), остальные
+    (судьи, -1) выкидываются до разбиения.
+    """
+    xy = np.asarray(xy, dtype=float)
+    team = np.broadcast_to(np.asarray(team), xy.shape[:2]).astype(np.int64)
+    owner = (team >= 0) & (team < n_teams) & np.isfinite(xy).all(axis=2)
+    areas = control_areas(np.where(owner[..., None], xy, np.nan), rect, chunk)
+    team = np.where(owner, team, -1)
+    team_area = np.stack([np.where(team == k, areas, 0.0).sum(axis=1) for k in range(n_teams)], axis=1)
+    frames = np.arange(len(xy)) if frames is None else np.asarray(frames)
+    return ControlSeries(frames, areas, team, team_area, tracker_id)
+
+
+def control_from_trajectory(root, start: int | None = None, end: int | None = None,
+                            cfg: CFG | None = None, n_teams: int = 2,
+                            chunk: int = CONTROL_CHUNK_FRAMES) -> ControlSeries:
+    """
+    team_control по хранилищу траекторий (каталог или TrajectoryReader) за [start, end).
+    Кадры без единой строки с координатой на поле в ряд не попадают.
+    """
+    from ..utils.trajectory import TrajectoryReader
+
+    reader = root if isinstance(root, TrajectoryReader) else TrajectoryReader(Path(root))
+    lo, hi = reader.frame_range
+    rows = reader.window(lo if start is None else start, hi if end is None else end)
+    rows = rows[(rows["tracker_id"] >= 0) & (rows["team"] >= 0) & (rows["team"] < n_teams)
+                & np.isfinite(rows["px"]) & np.isfinite(rows["py"])]
+    rows = rows[np.argsort(rows["frame"], kind="stable")]
+
+    # строки -> (F, N): номер кадра в ряду и место игрока внутри кадра
+    frames, first, inv = np.unique(rows["frame"], return_index=True, return_inverse=True)
+    slot = np.arange(len(rows)) - first[inv]
+    n = int(slot.max()) + 1 if len(rows) else 0
+    xy = np.full((len(frames), n, 2), np.nan)
+    team = np.full((len(frames), n), -1, np.int64)
+    tids = np.full((len(frames), n), -1, np.int64)
+    xy[inv, slot] = np.stack([rows["px"], rows["py"]], axis=1)
+    team[inv, slot] = rows["team"]
+    tids[inv, slot] = rows["tracker_id"]
+    return team_control(xy, team, n_teams, frames, tids, pitch_rect(cfg), chunk)
@@ -3,12 +3,25 @@
 """
 from __future__ import annotations
 
+import dataclasses
+from functools import lru_cache
+
 import cv2
 import numpy as np
 import supervision as sv
 from typing import Optional, List
 from .config import SoccerPitchConfiguration as CFG
-from ..constants import FIELD_SCALE, FIELD_PADDING
+from .voronoi import VoronoiEngine
+from ..constants import FIELD_SCALE, FIELD_PADDING, PITCH_TEMPLATE_CACHE_SIZE
+
+
+def _cfg_key(cfg: CFG) -> tuple:
+    # dataclass со списком рёбер не хэшируется — собираем ключ из полей
+    return tuple(
+        (f.name, tuple(map(tuple, v)) if isinstance(v, list) else v)
+        for f in dataclasses.fields(cfg)
+        for v in [getattr(cfg, f.name)]
+    )
 
 
 class PitchDrawer:
@@ -25,31 +38,55 @@ class PitchDrawer:
             line_color: sv.Color = sv.Color.WHITE,  # линии белые
             padding: int = FIELD_PADDING,  # отступы по краям
             line_thickness: int = 4,  # толщина линий
-            scale: float = FIELD_SCALE  # коэффициент масштаба
+            scale: float = FIELD_SCALE,  # коэффициент масштаба
+            out: Optional[np.ndarray] = None  # куда копировать (переиспользуемый буфер)
+    ) -> np.ndarray:
+        # поле рисуется один раз на набор параметров, дальше — только копия шаблона
+        template = PitchDrawer._pitch_template(
+            _cfg_key(cfg), background.as_bgr(), line_color.as_bgr(),
+            padding, line_thickness, scale
+        )
+        if out is None:
+            return template.copy()
+        np.copyto(out, template)
+        return out
+
+    @staticmethod
+    @lru_cache(maxsize=PITCH_TEMPLATE_CACHE_SIZE)
+    def _pitch_template(
+            cfg_key: tuple,
+            background: tuple[int, int, int],
+            line_color: tuple[int, int, int],
+            padding: int,
+            line_thickness: int,
+            scale: float
     ) -> np.ndarray:
+        cfg = CFG(**{k: list(v) if isinstance(v, tuple) else v for k, v in cfg_key})
+
         # создаём канву необходимого размера
         h = PitchDrawer._s(cfg.width, scale) + 2 * padding
         w = PitchDrawer._s(cfg.length, scale) + 2 * padding
-        img = np.full((h, w, 3), background.as_bgr(), np.uint8)
+        img = np.full((h, w, 3), background, np.uint8)
 
-        # проводим все линии
+        # проводим все линии (vertices — property, считаем один раз)
+        vertices = cfg.vertices
         for a, b in cfg.edges:
             p1 = (
-                PitchDrawer._s(cfg.vertices[a - 1][0], scale) + padding,
-                PitchDrawer._s(cfg.vertices[a - 1][1], scale) + padding
+                PitchDrawer._s(vertices[a - 1][0], scale) + padding,
+                PitchDrawer._s(vertices[a - 1][1], scale) + padding
             )
             p2 = (
-                PitchDrawer._s(cfg.vertices[b - 1][0], scale) + padding,
-                PitchDrawer._s(cfg.vertices[b - 1][1], scale) + padding
+                PitchDrawer._s(vertices[b - 1][0], scale) + padding,
+                PitchDrawer._s(vertices[b - 1][1], scale) + padding
             )
-            cv2.line(img, p1, p2, line_color.as_bgr(), line_thickness)
+            cv2.line(img, p1, p2, line_color, line_thickness)
 
         # центр поля (круг + точка)
         cv2.circle(
             img,
             (w // 2, h // 2),
             PitchDrawer._s(cfg.centre_circle_radius, scale),
-            line_color.as_bgr(),
+            line_color,
             line_thickness
         )
 
@@ -58,8 +95,9 @@ class PitchDrawer:
                 PitchDrawer._s(cfg.penalty_spot_distance, scale),
                 w - PitchDrawer._s(cfg.penalty_spot_distance, scale)
         ):
-            cv2.circle(img, (x, h // 2), 8, line_color.as_bgr(), -1)
+            cv2.circle(img, (x, h // 2), max(1, round(8 * scale / FIELD_SCALE)), line_color, -1)
 
+        img.flags.writeable = False  # шаблон общий — портить его нельзя
         return img
 
     # выводим точки на поле сверху на уже нарисованное ставит кружочки-игроки/мяч/судью
@@ -79,16 +117,45 @@ class PitchDrawer:
             # если нет — рисуем новое
             pitch = PitchDrawer.draw_pitch(cfg, padding=padding, scale=scale)
 
-        # рисуем каждую точку
-        for x, y in xy:
-            pt = (
-                PitchDrawer._s(x, scale) + padding,
-                PitchDrawer._s(y, scale) + padding
-            )
-            cv2.circle(pitch, pt, radius, face.as_bgr(), -1)  # заливка
-            cv2.circle(pitch, pt, radius, edge.as_bgr(), thickness)  # контур
+        # все точки разом: штампуем заранее растеризованный кружок
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        xy = xy[np.isfinite(xy).all(axis=1)]
+        if not len(xy):
+            return pitch
+        dy, dx, colors = PitchDrawer._disc_stamp(radius, thickness,
+                                                 face.as_bgr(), edge.as_bgr())
+        # int() как в _s: отбрасываем дробную часть
+        cx = np.trunc(xy[:, 0] * scale).astype(np.int64) + padding
+        cy = np.trunc(xy[:, 1] * scale).astype(np.int64) + padding
+        ys = cy[:, None] + dy[None, :]  # (N, K) пиксели всех кружков
+        xs = cx[:, None] + dx[None, :]
+        h, w = pitch.shape[:2]
+        inside = (ys >= 0) & (ys < h) & (xs >= 0) & (xs < w)
+        # более поздняя точка перекрывает раннюю — как при поочерёдных cv2.circle
+        pitch[ys[inside], xs[inside]] = np.broadcast_to(colors, (*ys.shape, 3))[inside]
         return pitch
 
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _disc_stamp(
+            radius: int,
+            thickness: int,
+            face: tuple[int, int, int],
+            edge: tuple[int, int, int]
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # кружок (заливка + контур) рисуется тем же cv2.circle на маленьком патче;
+        # возвращаем смещения закрашенных пикселей от центра и их цвета
+        r = radius + max(thickness, 0)
+        size = 2 * r + 1
+        patch = np.zeros((size, size, 3), np.uint8)
+        mask = np.zeros((size, size), np.uint8)
+        cv2.circle(patch, (r, r), radius, face, -1)  # заливка
+        cv2.circle(mask, (r, r), radius, 255, -1)
+        cv2.circle(patch, (r, r), radius, edge, thickness)  # контур
+        cv2.circle(mask, (r, r), radius, 255, thickness)
+        ys, xs = np.nonzero(mask)
+        return ys - r, xs - r, patch[ys, xs]
+
     # Диаграмма Вороного
     # Исходя из логики: чья территория ближе к этому пикселю для обеих команд
     @staticmethod
@@ -101,29 +168,22 @@ class PitchDrawer:
             opacity: float = 0.5,
             padding: int = FIELD_PADDING,
             scale: float = FIELD_SCALE,
-            pitch: Optional[np.ndarray] = None
+            pitch: Optional[np.ndarray] = None,
+            out: Optional[np.ndarray] = None,  # можно смешивать прямо в pitch
+            engine: Optional[VoronoiEngine] = None  # общий движок — инкрементальный режим
     ) -> np.ndarray:
         if pitch is None:
             pitch = PitchDrawer.draw_pitch(cfg, padding=padding, scale=scale)
 
-        # сеточка всех пикселей изображения
-        h, w, _ = pitch.shape
-        grid_y, grid_x = np.mgrid[0:h, 0:w]
-        grid_y -= padding
-        grid_x -= padding
-
-        # функция для определения мин дистанции от пикселя до ближайшего игрока
-        def _dist(pts: np.ndarray) -> np.ndarray:
-            return np.min(
-                (
-                        (PitchDrawer._s(pts[:, 0][:, None, None], scale) - grid_x) ** 2 +
-                        (PitchDrawer._s(pts[:, 1][:, None, None], scale) - grid_y) ** 2
-                ),
-                axis=0
-            )
+        # кто ближе: точно, но без тензора N × H × W (см. VoronoiEngine);
+        # пиксели сетки сдвинуты на padding, как и точки в _s(...) + padding
+        def _px(pts: np.ndarray) -> np.ndarray:
+            pts = np.asarray(pts, dtype=float).reshape(-1, 2)
+            pts = pts[np.isfinite(pts).all(axis=1)]
+            return np.trunc(pts * scale).astype(np.int64) + padding
 
-        # где ближе игроки первой / второй команды
-        mask = _dist(team1_xy) < _dist(team2_xy)
+        engine = engine if engine is not None else VoronoiEngine()
+        mask = engine.team_mask(_px(team1_xy), _px(team2_xy), pitch.shape)
 
         # готовим двухцветную заливку
         color1 = np.array(team1_color.as_bgr(), np.uint8)
@@ -131,4 +191,4 @@ class PitchDrawer:
         overlay = np.where(mask[..., None], color1, color2)
 
         # прозрачный бленд поверх поля
-        return cv2.addWeighted(overlay, opacity, pitch, 1 - opacity, 0)
+        return cv2.addWeighted(overlay, opacity, pitch, 1 - opacity, 0, dst=out)
@@ -1,28 +1,214 @@
 """
 PitchProjector — безопасная гомография frame -> модель поля.
+
+temporal=True включает режим с состоянием: камера на трансляции едет плавно,
+поэтому модель точек поля запускаем не каждый кадр. Между запусками гомографию
+переносим по движению камеры (оптический поток по уменьшенному кадру), а модель
+зовём, когда накопленное движение велико, накопленная ошибка предсказанной H
+(точки потока, перенесённые на поле) велика, прошло max_skip кадров или поток потерян.
 """
 from __future__ import annotations
-import cv2, numpy as np, supervision as sv
+import cv2, numpy as np
 from src.futai.pitch.config import SoccerPitchConfiguration as CFG
+from src.futai.detector import as_keypoints
+from src.futai.detector.cache import cached_detector, infer_indexed
+from src.futai.utils.metrics import NULL_METRICS
+from src.futai.constants import (
+    FIELD_DET_CONFIDENCE,
+    FIELD_KP_CONFIDENCE,
+    HOMOGRAPHY_DRIFT_CM,
+    HOMOGRAPHY_MAX_SKIP,
+    HOMOGRAPHY_MOTION_PX,
+    HOMOGRAPHY_REPROJ_CM,
+    HOMOGRAPHY_SMOOTHING,
+    MOTION_FRAME_WIDTH,
+    MOTION_MIN_POINTS
+)
+
+# 32 вершины поля считаем один раз, а не на каждом кадре
+_VERTICES = np.asarray(CFG().vertices, dtype=np.float32)
 
 
 class PitchProjector:
-    def __init__(self, field_model):
+    def __init__(
+            self,
+            field_model,
+            temporal: bool = False,
+            max_skip: int = HOMOGRAPHY_MAX_SKIP,
+            motion_threshold: float = HOMOGRAPHY_MOTION_PX,
+            reproj_threshold: float = HOMOGRAPHY_REPROJ_CM,
+            drift_threshold: float = HOMOGRAPHY_DRIFT_CM,
+            smoothing: float = HOMOGRAPHY_SMOOTHING,
+            metrics=None,
+            cache_dir: str | None = None,
+            video_path: str | None = None
+    ):
+        # cache_dir + video_path — точки поля кадров ролика на диске (detector.cache);
+        # кэш работает, когда project() знает номер кадра (frame_idx)
+        if cache_dir and video_path:
+            field_model = cached_detector(field_model, cache_dir, video_path, "keypoints",
+                                          FIELD_DET_CONFIDENCE)
         self.field_model = field_model
+        self.temporal = temporal
+        self.max_skip = max_skip  # не дольше стольких кадров без модели
+        self.motion_threshold = motion_threshold  # px накопленного сдвига камеры
+        self.reproj_threshold = reproj_threshold  # см: хуже — гомографию не берём
+        self.drift_threshold = drift_threshold  # см накопленной ошибки предсказания
+        self.smoothing = smoothing  # вес предсказания при смешивании с новой H
+        self.metrics = metrics if metrics is not None else NULL_METRICS  # см. utils.metrics
+        self.reset()
+
+    def reset(self) -> None:
+        """Сбросить состояние (новое видео / смена камеры)."""
+        self._H: np.ndarray | None = None
+        self._prev_gray: np.ndarray | None = None
+        self._since_kp = 0  # кадров с последнего запуска модели
+        self._frame_idx: int | None = None  # номер текущего кадра ролика (для кэша)
+        self._motion = 0.0  # накопленный сдвиг камеры, px
+        self._drift = 0.0  # накопленная ошибка предсказанной H на поле, см
+        self.last_recomputed = False  # на последнем кадре запускали модель точек
+        self._stats = dict.fromkeys(("frames", "keypoint_runs", "skipped", "rejected", "drift_runs"), 0)
+
+    @property
+    def stats(self) -> dict[str, float]:
+        """Сколько кадров обошлись без модели точек поля."""
+        st = dict(self._stats)
+        st["skip_ratio"] = st["skipped"] / st["frames"] if st["frames"] else 0.0
+        return st
 
     def _homography(self, src, dst):
         return None if len(src) < 4 else cv2.findHomography(src, dst, 0)[0]
-    def project(self, frame, points: dict[str, np.ndarray]):
-        res = self.field_model.infer(frame, conf=0.3)[0]
-        kpts = sv.KeyPoints.from_ultralytics(res)
-        good = kpts.confidence[0] > .5
-        H = self._homography(kpts.xy[0][good], np.asarray(CFG().vertices)[good])
-
-        out = {}
-        for k, v in points.items():
-            if H is None or len(v) == 0:
-                out[k] = np.empty((0, 2))
-            else:
-                out[k] = cv2.perspectiveTransform(
-                    v.reshape(-1, 1, 2).astype(np.float32), H).reshape(-1, 2)
+
+    def _keypoint_homography(self, frame) -> tuple[np.ndarray | None, float]:
+        # полный прогон модели точек поля; вторым — ошибка репроекции в см
+        if self._frame_idx is None:
+            res = self.field_model.infer(frame, confidence=FIELD_DET_CONFIDENCE)[0]
+        else:
+            res = infer_indexed(self.field_model, [frame], self._frame_idx, FIELD_DET_CONFIDENCE)[0]
+        kpts = as_keypoints(res)
+        if not len(kpts):  # поле могло не попасть в кадр
+            return None, np.inf
+        good = kpts.confidence[0] > FIELD_KP_CONFIDENCE
+        src, dst = kpts.xy[0][good].astype(np.float32), _VERTICES[good]
+        H = self._homography(src, dst)
+        if H is None:
+            return None, np.inf
+        proj = cv2.perspectiveTransform(src.reshape(-1, 1, 2), H).reshape(-1, 2)
+        return H, float(np.linalg.norm(proj - dst, axis=1).mean())
+
+    def _camera_motion(self, gray: np.ndarray, scale: float
+                       ) -> tuple[np.ndarray | None, float, np.ndarray | None, np.ndarray | None]:
+        """
+        Сдвиг камеры prev -> текущий кадр: similarity по LK-потоку углов
+        на уменьшенном в scale раз кадре.
+        Возвращает (M 3×3 в пикселях полного кадра, медианный сдвиг px,
+        инлайеры RANSAC prev / cur в пикселях полного кадра).
+        """
+        prev = self._prev_gray
+        p0 = cv2.goodFeaturesToTrack(prev, maxCorners=200, qualityLevel=0.01, minDistance=8)
+        if p0 is None or len(p0) < MOTION_MIN_POINTS:
+            return None, np.inf, None, None
+        p1, status, _ = cv2.calcOpticalFlowPyrLK(prev, gray, p0, None)
+        ok = status.ravel() == 1
+        if ok.sum() < MOTION_MIN_POINTS:
+            return None, np.inf, None, None
+        A, inl = cv2.estimateAffinePartial2D(p0[ok], p1[ok], method=cv2.RANSAC)
+        if A is None:
+            return None, np.inf, None, None
+
+        # в координаты полного кадра: M = S^-1 · A · S
+        S = np.diag([scale, scale, 1.0])
+        M = np.linalg.inv(S) @ np.vstack([A, [0, 0, 1]]) @ S
+        shift = np.linalg.norm((p1[ok] - p0[ok]).reshape(-1, 2), axis=1)
+        inl = inl.ravel() == 1
+        return M, float(np.median(shift)) / scale, p0[ok][inl] / scale, p1[ok][inl] / scale
+
+    def _prediction_error(self, H_pred: np.ndarray, p0: np.ndarray, p1: np.ndarray) -> float:
+        """
+        Ошибка предсказанной H на этом шаге, см: точка потока на поле по прошлой H
+        против той же точки по H_pred. Точки вне поля (трибуны у горизонта
+        растягиваются гомографией) не в счёт; мало точек на поле — 0 (судить не по чему).
+        """
+        a = cv2.perspectiveTransform(p0.reshape(-1, 1, 2).astype(np.float64), self._H).reshape(-1, 2)
+        b = cv2.perspectiveTransform(p1.reshape(-1, 1, 2).astype(np.float64), H_pred).reshape(-1, 2)
+        lo, hi = _VERTICES.min(axis=0), _VERTICES.max(axis=0)
+        on_pitch = ((a >= lo) & (a <= hi)).all(axis=1)
+        if on_pitch.sum() < MOTION_MIN_POINTS:
+            return 0.0
+        return float(np.median(np.linalg.norm(a[on_pitch] - b[on_pitch], axis=1)))
+
+    def _temporal_homography(self, frame) -> np.ndarray | None:
+        scale = MOTION_FRAME_WIDTH / frame.shape[1]
+        small_h = round(frame.shape[0] * scale)
+        gray = cv2.cvtColor(cv2.resize(frame, (MOTION_FRAME_WIDTH, small_h),
+                                       interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+
+        # предсказание: переносим прошлую H по движению камеры
+        H_pred = None
+        if self._H is not None and self._prev_gray is not None:
+            M, shift, p0, p1 = self._camera_motion(gray, scale)
+            if M is not None:
+                self._motion += shift
+                # пиксель текущего кадра -> прошлого (M^-1) -> поле (H)
+                H_pred = self._H @ np.linalg.inv(M)
+                H_pred /= H_pred[2, 2]
+                # движение не similarity (зум, перспектива) — предсказание уезжает
+                self._drift += self._prediction_error(H_pred, p0, p1)
+        self._prev_gray = gray
+
+        drifted = H_pred is not None and self._drift > self.drift_threshold
+        need_kp = (
+            H_pred is None
+            or self._since_kp >= self.max_skip
+            or self._motion > self.motion_threshold
+            or drifted
+        )
+        self.last_recomputed = need_kp
+        if not need_kp:
+            self._since_kp += 1
+            self._stats["skipped"] += 1
+            self._H = H_pred
+            return self._H
+
+        self._stats["keypoint_runs"] += 1
+        self._stats["drift_runs"] += int(drifted)
+        H_kp, err = self._keypoint_homography(frame)
+        if H_kp is None or err > self.reproj_threshold:
+            # модель ошиблась — держимся за предсказание (если оно есть); счётчики
+            # не сбрасываем: на следующем кадре модель зовём снова
+            self._stats["rejected"] += 1
+            self._H = H_pred
+            return self._H
+
+        self._since_kp, self._motion, self._drift = 0, 0.0, 0.0
+        H_kp /= H_kp[2, 2]
+        # сглаживание: новая H смешивается с предсказанием
+        self._H = H_kp if H_pred is None else \
+            (1 - self.smoothing) * H_kp + self.smoothing * H_pred
+        return self._H
+
+    def project(self, frame, points: dict[str, np.ndarray], frame_idx: int | None = None):
+        self._frame_idx = frame_idx
+        with self.metrics.stage("project"):
+            out = self._project(frame, points)
+        self.metrics.count("homography_recomputed", int(self.last_recomputed))
         return out
+
+    def _project(self, frame, points: dict[str, np.ndarray]):
+        self._stats["frames"] += 1
+        if self.temporal:
+            H = self._temporal_homography(frame)
+        else:
+            self._stats["keypoint_runs"] += 1
+            self.last_recomputed = True
+            H = self._keypoint_homography(frame)[0]
+
+        # все группы точек — одним вызовом perspectiveTransform
+        keys = list(points)
+        sizes = [len(points[k]) for k in keys]
+        if H is None or not sum(sizes):
+            return {k: np.empty((0, 2)) for k in keys}
+        flat = np.concatenate([np.asarray(points[k], np.float32).reshape(-1, 2) for k in keys])
+        proj = cv2.perspectiveTransform(flat.reshape(-1, 1, 2), H).reshape(-1, 2)
+        parts = np.split(proj, np.cumsum(sizes)[:-1])
+        return {k: (p if len(p) else np.empty((0, 2))) for k, p in zip(keys, parts)}
@@ -0,0 +1,207 @@
+"""
+VoronoiEngine — точная разметка «чей игрок ближе» для каждого пикселя радара.
+
+Раньше каждый игрок сравнивался с полной сеткой np.mgrid: тензор N × H × W int64
+дважды за кадр. Здесь на команду хранится только (H, W) минимальных квадратов
+расстояний и номер ближайшего игрока — память не зависит от числа игроков.
+Квадраты расстояний — int32, пока в него влезает максимум по канве и игрокам
+(игрок далеко за канвой от плохой гомографии переводит поля в int64), номер
+игрока — int16.
+
+Инкрементальный режим: между кадрами почти все игроки сдвигаются на пару
+пикселей. Для ушедшего игрока пересчитываем только пиксели его старой ячейки,
+для пришедшего — только окно вокруг его новой ячейки (ячейка Вороного выпуклая,
+её рамку даёт отсечение прямоугольника полуплоскостями). Результат бит-в-бит
+совпадает с полным пересчётом.
+"""
+from __future__ import annotations
+
+from collections import Counter
+
+import numpy as np
+
+from ..constants import VORONOI_MAX_CHANGED_RATIO
+
+
+
+def _dist_dtype(shape: tuple[int, int], *sites: np.ndarray) -> np.dtype:
+    """
+    int32, если максимальный квадрат расстояния от пикселя канвы до игрока в
+    него влезает. Игроки не обязаны лежать на канве — берём общий охват.
+    """
+    xs = np.concatenate([[0, shape[1] - 1], *(s[:, 0] for s in sites)])
+    ys = np.concatenate([[0, shape[0] - 1], *(s[:, 1] for s in sites)])
+    # python int — без переполнения на самом охвате
+    reach = int(xs.max() - xs.min()) ** 2 + int(ys.max() - ys.min()) ** 2
+    return np.dtype(np.int32 if reach < np.iinfo(np.int32).max else np.int64)
+
+
+def clip_polygon(poly: np.ndarray, a: float, b: float, c: float) -> np.ndarray:
+    """
+    Sutherland–Hodgman для одной полуплоскости a*x + b*y <= c.
+    poly — (V, 2) вершины выпуклого многоугольника по порядку.
+    """
+    if not len(poly):
+        return poly
+    side = poly @ np.array([a, b]) - c  # <= 0 — внутри
+    out = []
+    for i in range(len(poly)):
+        p, q = poly[i], poly[(i + 1) % len(poly)]
+        sp, sq = side[i], side[(i + 1) % len(poly)]
+        if sp <= 0:
+            out.append(p)
+        if (sp <= 0) != (sq <= 0):  # ребро пересекает границу
+            out.append(p + (q - p) * (sp / (sp - sq)))
+    return np.asarray(out, dtype=float).reshape(-1, 2)
+
+
+def voronoi_cell(site: np.ndarray, others: np.ndarray, rect: tuple[float, float, float, float]) -> np.ndarray:
+    """
+    Замкнутая ячейка site среди others внутри rect = (x0, y0, x1, y1):
+    точки, которые к site не дальше, чем к любому из others.
+    """
+    x0, y0, x1, y1 = rect
+    poly = np.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], dtype=float)
+    p = np.asarray(site, dtype=float)
+    for q in np.asarray(others, dtype=float):
+        # |x - p|^2 <= |x - q|^2  <=>  (q - p)·x <= (|q|^2 - |p|^2) / 2
+        n = q - p
+        poly = clip_polygon(poly, n[0], n[1], (q @ q - p @ p) / 2)
+        if not len(poly):
+            break
+    return poly
+
+
+class _TeamField:
+    """Минимальное расстояние до игроков одной команды + чей это минимум."""
+
+    def __init__(self, shape: tuple[int, int], dtype: np.dtype):
+        self.shape = shape
+        self.dtype = dtype
+        self.far = np.iinfo(self.dtype).max  # «бесконечность» для пикселей без игрока команды
+        self.dist = np.empty(shape, self.dtype)
+        self.owner = np.empty(shape, np.int16)  # слотов — не больше игроков команды
+        self.sites = np.empty((0, 2), np.int64)  # слот -> (x, y) в пикселях
+        self.alive = np.empty(0, bool)
+        # индексы строк/колонок для сепарабельного (y - r)^2 + (x - c)^2
+        self._cols = np.arange(shape[1], dtype=self.dtype)
+        self._rows = np.arange(shape[0], dtype=self.dtype)
+
+    def rebuild(self, sites: np.ndarray) -> None:
+        """Полный пересчёт: по одному игроку за раз, (H, W) на команду."""
+        self.sites = sites.copy()
+        self.alive = np.ones(len(sites), bool)
+        self.dist.fill(self.far)
+        self.owner.fill(-1)
+        tmp = np.empty(self.shape, self.dtype)
+        closer = np.empty(self.shape, bool)
+        for slot, (x, y) in enumerate(sites.astype(self.dtype)):
+            # d = (y - r)^2 + (x - c)^2 — сепарабельно, без N × H × W
+            np.add(((self._rows - y) ** 2)[:, None], ((self._cols - x) ** 2)[None, :], out=tmp)
+            np.less(tmp, self.dist, out=closer)
+            np.copyto(self.dist, tmp, where=closer)
+            np.copyto(self.owner, slot, where=closer)
+
+    def update(self, sites: np.ndarray, max_changed_ratio: float) -> None:
+        """Инкрементально перейти к новому набору позиций (порядок не важен)."""
+        old = Counter(map(tuple, self.sites[self.alive].tolist()))
+        new = Counter(map(tuple, sites.tolist()))
+        removed, added = old - new, new - old
+        n_changed = sum(removed.values()) + sum(added.values())
+        if not n_changed:
+            return
+        if n_changed > max_changed_ratio * max(len(sites), 1):
+            self.rebuild(sites)
+            return
+
+        # 1) освобождаем слоты ушедших
+        freed = []
+        for (x, y), cnt in removed.items():
+            idx = np.flatnonzero(self.alive & (self.sites[:, 0] == x) & (self.sites[:, 1] == y))[:cnt]
+            self.alive[idx] = False
+            freed.extend(idx.tolist())
+        orphan = np.isin(self.owner, freed) if freed else None
+
+        # 2) занимаем слоты пришедшими
+        new_slots = []
+        for (x, y), cnt in added.items():
+            for _ in range(cnt):
+                if freed:
+                    slot = freed.pop()
+                else:
+                    slot = len(self.sites)
+                    self.sites = np.vstack([self.sites, [[0, 0]]])
+                    self.alive = np.append(self.alive, False)
+                self.sites[slot] = (x, y)
+                self.alive[slot] = True
+                new_slots.append(slot)
+
+        # 3) пиксели ушедших: честный минимум по всем живым игрокам
+        if orphan is not None and orphan.any():
+            rows, cols = np.nonzero(orphan)
+            rows, cols = rows.astype(self.dtype), cols.astype(self.dtype)
+            best = np.full(len(rows), self.far, self.dtype)
+            owner = np.full(len(rows), -1, np.int16)
+            for slot in np.flatnonzero(self.alive):
+                x, y = self.sites[slot].astype(self.dtype)
+                d = (rows - y) ** 2 + (cols - x) ** 2
+                closer = d < best
+                best[closer] = d[closer]
+                owner[closer] = slot
+            self.dist[rows, cols] = best
+            self.owner[rows, cols] = owner
+
+        # 4) пришедшие: только внутри рамки их новой ячейки
+        h, w = self.shape
+        alive = np.flatnonzero(self.alive)
+        for slot in new_slots:
+            others = self.sites[alive[alive != slot]]
+            cell = voronoi_cell(self.sites[slot], others, (0, 0, w - 1, h - 1))
+            if not len(cell):
+                continue
+            x0 = max(int(np.floor(cell[:, 0].min())) - 1, 0)
+            x1 = min(int(np.ceil(cell[:, 0].max())) + 1, w - 1)
+            y0 = max(int(np.floor(cell[:, 1].min())) - 1, 0)
+            y1 = min(int(np.ceil(cell[:, 1].max())) + 1, h - 1)
+            x, y = self.sites[slot].astype(self.dtype)
+            d = ((self._rows[y0:y1 + 1] - y) ** 2)[:, None] + ((self._cols[x0:x1 + 1] - x) ** 2)[None, :]
+            win_d = self.dist[y0:y1 + 1, x0:x1 + 1]
+            closer = d < win_d
+            win_d[closer] = d[closer]
+            self.owner[y0:y1 + 1, x0:x1 + 1][closer] = slot
+
+
+class VoronoiEngine:
+    """
+    Маска «пиксель ближе к команде 1, чем к команде 2» (строгое <, как раньше).
+    Держит состояние между кадрами; один экземпляр — на один размер радара.
+    """
+
+    def __init__(self, max_changed_ratio: float = VORONOI_MAX_CHANGED_RATIO):
+        # если сдвинулось больше этой доли игроков — дешевле пересчитать целиком
+        self.max_changed_ratio = max_changed_ratio
+        self._teams: list[_TeamField] | None = None
+
+    def reset(self) -> None:
+        self._teams = None
+
+    def team_mask(self, team1_px: np.ndarray, team2_px: np.ndarray,
+                  shape: tuple[int, int]) -> np.ndarray:
+        """
+        team*_px — целые (x, y) игроков в пикселях канвы (N, 2).
+        Возвращает bool (H, W): True там, где ближе команда 1.
+        """
+        shape = tuple(shape[:2])
+        sites = [np.asarray(px, dtype=np.int64).reshape(-1, 2) for px in (team1_px, team2_px)]
+        # dtype общий на обе команды (far сравнивается с чужими расстояниями);
+        # игрок за пределами int32 — полный пересчёт в int64, дальше по-прежнему
+        dtype = _dist_dtype(shape, *sites)
+        fresh = self._teams is None or self._teams[0].shape != shape or self._teams[0].dtype != dtype
+        if fresh:
+            self._teams = [_TeamField(shape, dtype), _TeamField(shape, dtype)]
+        for field, px in zip(self._teams, sites):
+            if fresh:
+                field.rebuild(px)
+            else:
+                field.update(px, self.max_changed_ratio)
+        return self._teams[0].dist < self._teams[1].dist
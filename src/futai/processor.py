@@ -1,22 +1,35 @@
 """
 Главный конвейер: от кадра до аннотированного output’а.
 """
+from __future__ import annotations
 
+import time
+from itertools import islice
+from typing import Iterator
+
+import cv2
 import supervision as sv
 import numpy as np
 
-from src.futai.detector.detection import PlayerDetectionModel
-from src.futai.handmodel.classification import TeamClassifier
+from src.futai.handmodel import build_team_classifier
+from src.futai.handmodel.team_cache import TrackTeamCache
 from src.futai.detector.tracking import Tracker
-from src.futai.detector.annotation import build_annotators
+from src.futai.detector.annotation import build_annotators, annotate_frame
+from src.futai.detector.cache import cached_detector, infer_indexed
+from src.futai.detector.stride import AdaptiveStride, flow_boxes
+from src.futai.detector.ball import BallTracker
+from src.futai.utils.gk_resolver import GoalkeeperResolver as GKRes
+from src.futai.utils.metrics import NULL_METRICS
+from src.futai.utils.video import VideoSource
 from .constants import (
     BALL_CLASS_ID,
     GK_CLASS_ID,
     PLAYER_CLASS_ID,
     REFEREE_CLASS_ID,
-    DEFAULT_CONFIDENCE_THRESHOLD  # он тут дефолтный!! 0.3 !
+    DEFAULT_CONFIDENCE_THRESHOLD,  # он тут дефолтный!! 0.3 !
+    DEFAULT_INFER_BATCH
 )
-from .detector import build_detector
+from .detector import build_detector, as_detections
 
 
 class TeamVideoProcessor:
@@ -31,23 +44,68 @@ class TeamVideoProcessor:
 
     def __init__(
             self,
-            weights_path: str,
-            video_path: str,
+            weights_path: str | None,
+            video_path: str | None,
             detector_type: str = "yolo",
             device: str = None,
-            confidence: float = DEFAULT_CONFIDENCE_THRESHOLD
+            confidence: float = DEFAULT_CONFIDENCE_THRESHOLD,
+            team_cache: bool = True,
+            team_backend: str = "siglip",
+            team_model: str | None = None,
+            detector_options: dict | None = None,
+            metrics=None,
+            detector=None,
+            team_clf=None,
+            stride: int | None = None,
+            ball: bool = False,
+            start: int = 0,
+            end: int | None = None,
+            cache_dir: str | None = None
     ):
         # Детектор + трекер + классификатор
-        self.detector = build_detector(detector_type, weights_path, device)
+        # detector / team_clf — готовые экземпляры, общие для нескольких потоков (см. server);
+        # тогда weights_path / detector_type / team_backend не нужны
+        # detector_options — в конструктор backend'а (напр. {"quantize": True} для onnx)
+        self.detector = detector or build_detector(detector_type, weights_path, device,
+                                                   **(detector_options or {}))
+        # cache_dir — детекции кадров ролика на диске (detector.cache): повторный
+        # прогон того же видео с теми же весами и параметрами не зовёт модель
+        if cache_dir and video_path:
+            self.detector = cached_detector(self.detector, cache_dir, video_path, "detections",
+                                            confidence, weights=weights_path,
+                                            params={"options": detector_options or {}})
         self.tracker = Tracker()
-        self.team_clf = TeamClassifier(device=device)
-        # Генератор фреймов
-        self.frame_gen = sv.get_video_frames_generator(video_path)
+        # team_backend: "siglip" (SigLIP+UMAP+KMeans) или "hist" (цвет формы)
+        self.team_clf = team_clf or build_team_classifier(team_backend, device=device)
+        if team_model:  # заранее обученная модель команд (см. TeamClassifier.save)
+            self.team_clf.load(team_model)
+        # Генератор фреймов (без video_path кадры подаёт вызывающий — _track/_postprocess).
+        # [start, end) — окно ролика: VideoSource прыгает к нему по индексу, не декодируя всё до него
+        self.video = VideoSource(video_path) if video_path else None
+        self.frame_gen = self.video.frames(start, end) if self.video else iter(())
         self.confidence = confidence
-        # Мапа GK tracker_id -> команда (0/1)
-        self.gk_team_map: dict[int, int] = {}
+        self.frame_idx = start - 1  # номера кадров — от начала ролика, а не окна
+        # Кэш tracker_id -> команда: SigLIP только для новых/сомнительных треков
+        # (team_cache=False — классифицируем всех на каждом кадре, как раньше)
+        self.team_cache = TrackTeamCache() if team_cache else None
+        # вратарям голоса даёт GKRes, а не классификатор
+        self.gk_cache = TrackTeamCache()
         # Annotators
         self.annotators = build_annotators()
+        # Метрики стадий (utils.metrics.Metrics); по умолчанию — заглушка без накладных
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        # stride=K — детекция не чаще раза в K кадров, между ними боксы двигает
+        # оптический поток (data["interpolated"] = True); K подстраивается сам
+        self.stride = AdaptiveStride(stride) if stride else None
+        self._prev = None  # (серый кадр, мяч, остальные) — последний выход в режиме stride
+        # ball=True — мяч, не найденный на полном кадре, ищем детектором в окне вокруг
+        # предсказанной позиции (потерян — обходом плитками), см. detector.ball
+        self.ball = BallTracker(self.detector, confidence) if ball else None
+
+    @property
+    def gk_team_map(self) -> dict[int, int]:
+        """Мапа GK tracker_id -> команда (0/1), закрепленная голосованием."""
+        return self.gk_cache.committed()
 
     def process_next(self) -> tuple[np.ndarray, np.ndarray]:
         """
@@ -57,18 +115,71 @@ class TeamVideoProcessor:
         """
         # берем кадр и детектимё
         frame = next(self.frame_gen)
+        if self.stride is not None:
+            return frame, self._finish(frame, *self._strided(frame))
 
         # 1] Детекция
-        res = self.detector.infer(frame, confidence=self.confidence)[0]
-        dets = sv.Detections.from_ultralytics(res)
+        with self.metrics.stage("detect"):
+            res = infer_indexed(self.detector, [frame], self.frame_idx + 1, self.confidence)[0]
+        return frame, self._postprocess(frame, res)
+
+    def process_batch(self, n: int = DEFAULT_INFER_BATCH) -> list[tuple[np.ndarray, np.ndarray]]:
+        """
+        Обработать до *n* следующих фреймов за один вызов детектора.
+        YOLO получает список кадров целиком, а NMS / трекинг / классификация
+        идут строго в порядке кадров — результат тот же, что у process_next.
+        Пустой список -> видео закончилось.
+        """
+        frames = list(islice(self.frame_gen, n))
+        if not frames:
+            return []
+        if self.stride is not None:
+            # опорный кадр или нет — решается по ходу, батч детектору не собрать
+            return [(frame, self._finish(frame, *self._strided(frame))) for frame in frames]
+
+        # 1] Детекция сразу на всей пачке
+        t0 = time.perf_counter()
+        results = infer_indexed(self.detector, frames, self.frame_idx + 1, self.confidence)
+        per_frame = (time.perf_counter() - t0) / len(frames)  # делим батч поровну
+        out = []
+        for frame, res in zip(frames, results):
+            self.metrics.observe("detect", per_frame)
+            out.append((frame, self._postprocess(frame, res)))
+        return out
+
+    def iter_batches(self, n: int = DEFAULT_INFER_BATCH) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        """
+        Итератор по всему видео в батч-режиме: отдает (оригинал, аннотированный)
+        кадр за кадром, пока генератор фреймов не кончится.
+        """
+        while batch := self.process_batch(n):
+            yield from batch
+
+    def _track(self, frame: np.ndarray, res) -> tuple[sv.Detections, sv.Detections]:
+        """
+        Шаги 2-6 для одного кадра: NMS, трекинг, команды, GK и судья.
+        Возвращаем (мяч, все остальные) — уже с tracker_id и class_id команды.
+        """
+        self.frame_idx += 1
+        m = self.metrics
+        dets = as_detections(res)
+        m.count("detections", len(dets))
 
         # 2] делим на мяч и остальных (остальных трекаем)
         ball_det = dets[dets.class_id == BALL_CLASS_ID]
+        if self.ball is not None:
+            with m.stage("ball"):
+                ball_det = self.ball.update(frame, ball_det, self.frame_idx)
         ball_det.xyxy = sv.pad_boxes(ball_det.xyxy, px=10)  # чуть-чуть расширяем
 
         others = dets[dets.class_id != BALL_CLASS_ID]  # без мяча
-        others = others.with_nms(0.5, class_agnostic=True)  # NMS
-        others = self.tracker.update(others)  # ByteTrack
+        with m.stage("nms"):
+            others = others.with_nms(0.5, class_agnostic=True)  # NMS
+        with m.stage("track"):
+            others = self.tracker.update(others)  # ByteTrack
+        m.count("tracks", len(others))
+        # роль запоминаем: ниже class_id перезапишется номером команды
+        others.data["role"] = others.class_id.copy()
 
         # 3] раскладываем остальных по  своим ролям
         gk_det = others[others.class_id == GK_CLASS_ID]
@@ -76,23 +187,120 @@ class TeamVideoProcessor:
         ref_det = others[others.class_id == REFEREE_CLASS_ID]
 
         # 4] классифицируем игроков по цвету формы (0 или 1)
-        crops = [sv.crop_image(frame, xy) for xy in player_det.xyxy]
-        player_det.class_id = self.team_clf.predict(crops)
+        with m.stage("classify"):
+            player_det.class_id = self._classify_players(frame, player_det)
 
         # 5] назначаем вратарей в ту же команду, что и ближайший кластер
-        gk_det.class_id = GKRes.resolve(player_det, gk_det)
+        with m.stage("goalkeepers"):
+            gk_det.class_id = self._resolve_goalkeepers(player_det, gk_det)
 
         # 6] referee: делаем class_id - 0 - команда A; или 1 - команда B
         ref_det.class_id -= 1  # было 3 -> станет 2 -> 1
 
-        # 7] собираем всех вместе и рисуем
         all_det = sv.Detections.merge([player_det, gk_det, ref_det])
         all_det.class_id = all_det.class_id.astype(int)  # точно int32
+        return ball_det, all_det
+
+    def _classify_players(self, frame: np.ndarray, player_det: sv.Detections) -> np.ndarray:
+        if self.team_cache is None:
+            crops = [sv.crop_image(frame, xy) for xy in player_det.xyxy]
+            self.metrics.count("crops_embedded", len(crops))
+            return self.team_clf.predict(crops)
+
+        # кропаем и эмбеддим только треки, которым кэш не доверяет
+        tids = _tracker_ids(player_det)
+        need = self.team_cache.pending(tids, self.frame_idx)
+        if need.any():
+            crops = [sv.crop_image(frame, xy) for xy in player_det.xyxy[need]]
+            self.metrics.count("crops_embedded", len(crops))
+            teams, conf = self.team_clf.predict_with_confidence(crops)
+            self.team_cache.vote(tids[need], teams, conf, self.frame_idx)
+        self.team_cache.evict(self.frame_idx)
+        return self.team_cache.teams(tids)
+
+    def _resolve_goalkeepers(self, player_det: sv.Detections, gk_det: sv.Detections) -> np.ndarray:
+        tids = _tracker_ids(gk_det)
+        need = self.gk_cache.pending(tids, self.frame_idx)
+        if need.any():
+            teams = GKRes.resolve(player_det, gk_det[need])
+            self.gk_cache.vote(tids[need], teams, np.ones(len(teams)), self.frame_idx)
+        self.gk_cache.evict(self.frame_idx)
+        return self.gk_cache.teams(tids)
+
+    def _annotate(self, frame: np.ndarray, ball_det: sv.Detections,
+                  all_det: sv.Detections, out: np.ndarray | None = None) -> np.ndarray:
+        # 7] рисуем всех вместе (out=frame — без копии кадра)
+        with self.metrics.stage("annotate"):
+            return annotate_frame(self.annotators, frame, ball_det, all_det, out=out)
+
+    def _finish(self, frame: np.ndarray, ball_det: sv.Detections, all_det: sv.Detections) -> np.ndarray:
+        annotated = self._annotate(frame, ball_det, all_det)
+        self.metrics.end_frame(self.frame_idx)
+        return annotated
+
+    def _postprocess(self, frame: np.ndarray, res) -> np.ndarray:
+        return self._finish(frame, *self._track(frame, res))
+
+    def _strided(self, frame: np.ndarray) -> tuple[sv.Detections, sv.Detections]:
+        """
+        Кадр в режиме stride: на опорном — детекция + _track, на промежуточном —
+        прошлые боксы, сдвинутые оптическим потоком (команды и tracker_id те же).
+        """
+        m = self.metrics
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.stride.keyframe() or self._prev is None:
+            with m.stage("detect"):
+                res = infer_indexed(self.detector, [frame], self.frame_idx + 1, self.confidence)[0]
+            ball_det, all_det = self._track(frame, res)
+            if self._prev is not None:
+                self._score_keyframe(gray, all_det)
+            interpolated = False
+        else:
+            ball_det, all_det = self._propagate(gray)
+            interpolated = True
+            m.count("interpolated")
+        ball_det.data["interpolated"] = np.full(len(ball_det), interpolated)
+        all_det.data["interpolated"] = np.full(len(all_det), interpolated)
+        self._prev = (gray, ball_det, all_det)
+        return ball_det, all_det
+
+    def _propagate(self, gray: np.ndarray) -> tuple[sv.Detections, sv.Detections]:
+        self.frame_idx += 1
+        prev_gray, ball_det, all_det = self._prev
+        with self.metrics.stage("flow"):
+            n = len(all_det)
+            xyxy, ok, shift = flow_boxes(prev_gray, gray, np.vstack([all_det.xyxy, ball_det.xyxy]))
+            all_det = all_det[:]
+            all_det.xyxy = xyxy[:n]
+            # мяч мелкий и смазанный — оставляем, только если поток нашёл его сам
+            ball_det = ball_det[ok[n:]]
+            ball_det.xyxy = xyxy[n:][ok[n:]]
+            ok, shift = ok[:n], shift[:n]
+        self.stride.observe_flow(shift[ok], all_det.xyxy[ok])
+        # ByteTrack видит сдвинутые боксы — его Калман не отстаёт на K кадров
+        with self.metrics.stage("track"):
+            self.tracker.update(sv.Detections(xyxy=all_det.xyxy, confidence=all_det.confidence,
+                                              class_id=all_det.data["role"]))
+        return ball_det, all_det
+
+    def _score_keyframe(self, gray: np.ndarray, all_det: sv.Detections) -> None:
+        # что дал бы поток на этом кадре против свежей детекции, по tracker_id
+        prev_gray, _, prev_det = self._prev
+        xyxy, ok, shift = flow_boxes(prev_gray, gray, prev_det.xyxy)
+        pred = dict(zip(_tracker_ids(prev_det).tolist(), xyxy))
+        tids = _tracker_ids(all_det)
+        both = np.array([tid in pred for tid in tids.tolist()], dtype=bool)
+        got = all_det.xyxy[both]
+        want = np.array([pred[tid] for tid in tids[both].tolist()]).reshape(-1, 4)
+        err = np.linalg.norm(_centers(want) - _centers(got), axis=1)
+        lost = 1.0 - both.sum() / len(prev_det) if len(prev_det) else 0.0
+        self.stride.observe_keyframe(err, got[:, 3] - got[:, 1], lost, shift[ok], prev_det.xyxy[ok])
+
+
+def _centers(xyxy: np.ndarray) -> np.ndarray:
+    return (xyxy[:, :2] + xyxy[:, 2:]) / 2
 
-        annotated = frame.copy()
-        annotated = self.annotators["ellipse"].annotate(annotated, all_det)
-        labels = [f"#{tid}" for tid in all_det.tracker_id]
-        annotated = self.annotators["label"].annotate(annotated, all_det, labels)
-        annotated = self.annotators["triangle"].annotate(annotated, ball_det)
 
-        return frame, annotated
+def _tracker_ids(det: sv.Detections) -> np.ndarray:
+    # у пустых Detections tracker_id бывает None
+    return det.tracker_id if det.tracker_id is not None else np.empty(0, dtype=int)
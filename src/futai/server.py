@@ -0,0 +1,444 @@
+"""
+Мультипоточный сервер: много видеопотоков (камеры, матчи) на одних моделях.
+
+Детектор и классификатор команд — по одному экземпляру на все потоки.
+Перед каждым стоит DynamicBatcher: кадры (кропы) разных потоков собираются
+в один вызов модели, пока не наберётся max_batch или первый запрос не
+прождёт max_latency_ms. Трекинг, кэш команд и вратари — свои у каждого
+потока (TeamVideoProcessor без собственных моделей).
+
+    python -m src.futai.server weights/players.pt a.mp4 b.mp4 --team-model team.pkl --realtime
+"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Sequence
+
+import numpy as np
+import supervision as sv
+
+from .constants import (
+    DEFAULT_CONFIDENCE_THRESHOLD,
+    SERVER_MAX_BATCH,
+    SERVER_CROP_BATCH,
+    SERVER_MAX_LATENCY_MS,
+    SERVER_SLO_MS,
+    SERVER_LATENCY_WINDOW
+)
+from .processor import TeamVideoProcessor
+
+
+@dataclass(slots=True)
+class _Request:
+    key: str  # поток-источник
+    items: list
+    future: asyncio.Future
+    arrived: float  # loop.time() постановки в очередь
+
+
+class DynamicBatcher:
+    """
+    Общий вход в модель: submit(key, items) от разных потоков -> один fn(items).
+    Батч уходит, когда набрано max_batch элементов или старейший запрос
+    ждёт дольше max_latency_ms. У каждого потока своя очередь, батч набирается
+    по кругу (round-robin) — поток с большим потоком запросов не вытесняет остальных.
+    Запрос не режется: если он один больше max_batch, уходит целиком.
+    Если запрос уже есть от каждого зарегистрированного потока (register),
+    ждать добора некому — батч уходит сразу, не дожидаясь дедлайна.
+    fn работает в отдельном потоке ОС и не блокирует event loop.
+    """
+
+    def __init__(self, fn: Callable[[list], Sequence], max_batch: int,
+                 max_latency_ms: float, name: str = "batcher"):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_latency = max_latency_ms / 1e3
+        self.name = name
+        self._queues: dict[str, deque[_Request]] = {}
+        self._order: deque[str] = deque()  # round-robin по потокам
+        self._producers: set[str] = set()  # потоки, которые ещё могут прислать запрос
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._inflight: list[_Request] = []  # батч, который сейчас в модели
+        self._closed = False
+        # модель одна — вызовы строго по одному
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"futai-{name}")
+        # статистика
+        self.batches = 0
+        self.items = 0
+        self.full_flushes = 0  # батч ушёл по размеру (остальные — по дедлайну)
+        self.busy_s = 0.0
+        self._served: dict[str, int] = defaultdict(int)
+        self._wait_s: dict[str, float] = defaultdict(float)
+        self._requests: dict[str, int] = defaultdict(int)
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name=f"futai-{self.name}")
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        # всё недоотвеченное падает: иначе его ждут вечно — в т.ч. рабочие
+        # потоки ОС через run_coroutine_threadsafe (_StreamClassifier)
+        err = RuntimeError(f"{self.name} batcher is closed")
+        for req in [*self._inflight, *(r for q in self._queues.values() for r in q)]:
+            if not req.future.done():
+                req.future.set_exception(err)
+        self._inflight = []
+        for q in self._queues.values():
+            q.clear()
+        self._executor.shutdown(wait=False)
+
+    def register(self, key: str) -> None:
+        self._producers.add(key)
+
+    def unregister(self, key: str) -> None:
+        self._producers.discard(key)
+        if self._wakeup is not None:
+            self._wakeup.set()  # возможно, ждали только его
+
+    async def submit(self, key: str, items: Sequence) -> list:
+        """Поставить items потока key в очередь и дождаться их результатов (по порядку)."""
+        if not len(items):
+            return []
+        if self._closed:
+            raise RuntimeError(f"{self.name} batcher is closed")
+        loop = asyncio.get_running_loop()
+        req = _Request(key, list(items), loop.create_future(), loop.time())
+        if key not in self._queues:
+            self._queues[key] = deque()
+            self._order.append(key)
+        self._queues[key].append(req)
+        self._wakeup.set()
+        return await req.future
+
+    def _pending_items(self) -> int:
+        return sum(len(r.items) for q in self._queues.values() for r in q)
+
+    def _everyone_waiting(self) -> bool:
+        return bool(self._producers) and all(self._queues.get(k) for k in self._producers)
+
+    def _oldest(self) -> float:
+        return min(q[0].arrived for q in self._queues.values() if q)
+
+    def _take(self) -> list[_Request]:
+        # по кругу: по одному запросу от каждого потока, пока влезает
+        batch, size = [], 0
+        progress = True
+        while progress:
+            progress = False
+            for _ in range(len(self._order)):
+                key = self._order[0]
+                self._order.rotate(-1)
+                q = self._queues[key]
+                if q and (not batch or size + len(q[0].items) <= self.max_batch):
+                    req = q.popleft()
+                    batch.append(req)
+                    size += len(req.items)
+                    progress = True
+                if size >= self.max_batch:
+                    return batch
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            while not self._pending_items():
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            # добираем батч до max_batch, но не дольше дедлайна старейшего запроса
+            deadline = self._oldest() + self.max_latency
+            while self._pending_items() < self.max_batch and not self._everyone_waiting():
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            self.full_flushes += self._pending_items() >= self.max_batch
+
+            batch = self._inflight = self._take()
+            items = [x for r in batch for x in r.items]
+            start = loop.time()
+            for r in batch:
+                self._wait_s[r.key] += start - r.arrived
+                self._requests[r.key] += 1
+                self._served[r.key] += len(r.items)
+            try:
+                results = await loop.run_in_executor(self._executor, self.fn, items)
+            except Exception as e:  # ошибку модели отдаём всем запросам батча
+                for r in batch:
+                    if not r.future.done():
+                        r.future.set_exception(e)
+                continue
+            finally:
+                self.busy_s += loop.time() - start
+            self.batches += 1
+            self.items += len(items)
+            pos = 0
+            for r in batch:
+                n = len(r.items)
+                if not r.future.done():  # запрос могли отменить
+                    r.future.set_result(list(results[pos: pos + n]))
+                pos += n
+            self._inflight = []
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch": self.items / self.batches if self.batches else 0.0,
+            "full_ratio": self.full_flushes / self.batches if self.batches else 0.0,
+            "busy_s": self.busy_s,
+            "per_stream": {
+                key: {
+                    "items": self._served[key],
+                    "mean_wait_ms": self._wait_s[key] / self._requests[key] * 1e3
+                    if self._requests[key] else 0.0
+                }
+                for key in self._queues
+            }
+        }
+
+
+class _StreamClassifier:
+    """
+    Классификатор команд для processor одного потока: вызывается из рабочего
+    потока ОС, кропы уходят в общий батчер на event loop, поток ждёт ответ.
+    """
+
+    def __init__(self, batcher: DynamicBatcher, key: str):
+        self.batcher = batcher
+        self.key = key
+        self.loop: asyncio.AbstractEventLoop | None = None  # выставляет сервер в run()
+
+    def predict_with_confidence(self, crops: list[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+        if not crops:
+            return np.array([], dtype=int), np.array([], dtype=float)
+        res = asyncio.run_coroutine_threadsafe(self.batcher.submit(self.key, crops), self.loop).result()
+        teams, conf = zip(*res)
+        return np.asarray(teams, dtype=int), np.asarray(conf, dtype=float)
+
+    def predict(self, crops: list[np.ndarray]) -> np.ndarray:
+        return self.predict_with_confidence(crops)[0]
+
+
+class FileSource:
+    """
+    Видеофайл вместо живого потока: async-итератор (кадр, время поступления).
+    realtime=True — кадры «приходят» с частотой fps; если сервер не успевает,
+    латентность считается от момента, когда кадр должен был прийти.
+    """
+
+    def __init__(self, path: str | Path, realtime: bool = False,
+                 fps: float | None = None, max_frames: int | None = None):
+        self.path = str(path)
+        self.realtime = realtime
+        self.fps = fps or sv.VideoInfo.from_video_path(self.path).fps
+        self.max_frames = max_frames
+
+    async def __aiter__(self) -> AsyncIterator[tuple[np.ndarray, float]]:
+        loop = asyncio.get_running_loop()
+        gen = sv.get_video_frames_generator(self.path)
+        t0 = time.monotonic()
+        i = 0
+        while self.max_frames is None or i < self.max_frames:
+            frame = await loop.run_in_executor(None, next, gen, None)  # декодирование вне loop
+            if frame is None:
+                return
+            arrived = time.monotonic()
+            if self.realtime:
+                arrived = t0 + i / self.fps
+                if arrived > time.monotonic():
+                    await asyncio.sleep(arrived - time.monotonic())
+            yield frame, arrived
+            i += 1
+
+
+class _Stream:
+    def __init__(self, key: str, source, processor: TeamVideoProcessor,
+                 on_result: Callable | None, slo_ms: float, window: int):
+        self.key = key
+        self.source = source
+        self.processor = processor
+        self.on_result = on_result
+        self.slo = slo_ms / 1e3
+        self.latency: deque[float] = deque(maxlen=window)
+        self.frames = 0
+        self.violations = 0
+        self.started = self.finished = None
+
+    def record(self, latency: float) -> None:
+        self.latency.append(latency)
+        self.frames += 1
+        self.violations += latency > self.slo
+
+    def stats(self) -> dict[str, Any]:
+        lat = np.asarray(self.latency) * 1e3
+        p50, p95, p99 = np.percentile(lat, [50, 95, 99]) if len(lat) else (0.0, 0.0, 0.0)
+        end = self.finished or time.monotonic()
+        elapsed = end - self.started if self.started else 0.0
+        return {
+            "frames": self.frames,
+            "fps": self.frames / elapsed if elapsed else 0.0,
+            "latency_ms": {"p50": float(p50), "p95": float(p95), "p99": float(p99),
+                           "max": float(lat.max()) if len(lat) else 0.0},
+            "slo_ms": self.slo * 1e3,
+            "slo_violations": self.violations,
+            "slo_ok_ratio": 1 - self.violations / self.frames if self.frames else 1.0,
+            "done": self.finished is not None
+        }
+
+
+class MultiStreamServer:
+    """
+    add_stream(...) для каждого источника, затем await run().
+    on_result(key, frame_idx, frame, ball_det, all_det) — на каждый кадр потока
+    (может быть корутиной). stats() — латентность / SLO по потокам, батчеры
+    и индекс справедливости Джейна по кадрам/с (1 — все потоки наравне).
+    """
+
+    def __init__(
+            self,
+            detector,
+            team_clf,
+            *,
+            confidence: float = DEFAULT_CONFIDENCE_THRESHOLD,
+            max_batch: int = SERVER_MAX_BATCH,
+            crop_batch: int = SERVER_CROP_BATCH,
+            max_latency_ms: float = SERVER_MAX_LATENCY_MS,
+            slo_ms: float = SERVER_SLO_MS,
+            team_cache: bool = True
+    ):
+        self.detector = detector
+        self.team_clf = team_clf
+        self.confidence = confidence
+        self.slo_ms = slo_ms
+        self.team_cache = team_cache
+        self.detect_batcher = DynamicBatcher(self._detect, max_batch, max_latency_ms, "detect")
+        self.crop_batcher = DynamicBatcher(self._classify, crop_batch, max_latency_ms, "classify")
+        self.streams: dict[str, _Stream] = {}
+
+    # то, что реально зовёт модели (в потоке батчера)
+    def _detect(self, frames: list[np.ndarray]) -> list:
+        return self.detector.infer(frames, confidence=self.confidence)
+
+    def _classify(self, crops: list[np.ndarray]) -> list[tuple[int, float]]:
+        teams, conf = self.team_clf.predict_with_confidence(crops)
+        return list(zip(teams.tolist(), conf.tolist()))
+
+    def add_stream(self, key: str, source, on_result: Callable | None = None,
+                   slo_ms: float | None = None, metrics=None) -> TeamVideoProcessor:
+        """Зарегистрировать поток. Возвращает его processor (трекер, кэш команд)."""
+        if key in self.streams:
+            raise ValueError(f"Stream {key!r} already exists")
+        processor = TeamVideoProcessor(None, None, confidence=self.confidence,
+                                       team_cache=self.team_cache, metrics=metrics,
+                                       detector=self.detector,
+                                       team_clf=_StreamClassifier(self.crop_batcher, key))
+        self.streams[key] = _Stream(key, source, processor, on_result,
+                                    slo_ms or self.slo_ms, SERVER_LATENCY_WINDOW)
+        return processor
+
+    async def _serve(self, st: _Stream, post: ThreadPoolExecutor) -> None:
+        st.started = time.monotonic()
+        try:
+            await self._loop(st, post)
+        finally:
+            st.finished = time.monotonic()
+            self.detect_batcher.unregister(st.key)
+            self.crop_batcher.unregister(st.key)
+
+    async def _loop(self, st: _Stream, post: ThreadPoolExecutor) -> None:
+        loop = asyncio.get_running_loop()
+        async for frame, arrived in st.source:
+            res, = await self.detect_batcher.submit(st.key, [frame])
+            # трекинг + команды в своём потоке ОС: кропы оттуда идут в crop_batcher
+            ball_det, all_det = await loop.run_in_executor(post, st.processor._track, frame, res)
+            st.record(time.monotonic() - arrived)
+            if st.on_result is not None:
+                out = st.on_result(st.key, st.processor.frame_idx, frame, ball_det, all_det)
+                if inspect.isawaitable(out):
+                    await out
+
+    async def run(self) -> dict[str, Any]:
+        """Обслужить все потоки до конца источников. Возвращает stats()."""
+        loop = asyncio.get_running_loop()
+        for st in self.streams.values():
+            st.processor.team_clf.loop = loop
+            self.detect_batcher.register(st.key)
+            self.crop_batcher.register(st.key)
+        self.detect_batcher.start()
+        self.crop_batcher.start()
+        # по рабочему потоку на видеопоток: пока один ждёт кропы, другие трекают
+        post = ThreadPoolExecutor(max_workers=max(len(self.streams), 1),
+                                  thread_name_prefix="futai-stream")
+        tasks = [asyncio.create_task(self._serve(st, post), name=f"futai-stream-{st.key}")
+                 for st in self.streams.values()]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # упал один поток — гасим остальные; батчеры закрываются раньше пула,
+            # чтобы рабочие потоки, ждущие кропы, получили ошибку, а не висели
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.detect_batcher.close()
+            await self.crop_batcher.close()
+            # shutdown(wait=True) прямо на loop заблокировал бы его — ждём в стороне
+            await loop.run_in_executor(None, post.shutdown)
+        return self.stats()
+
+    def stats(self) -> dict[str, Any]:
+        streams = {key: st.stats() for key, st in self.streams.items()}
+        fps = np.array([s["fps"] for s in streams.values()])
+        jain = float(fps.sum() ** 2 / (len(fps) * (fps ** 2).sum())) if fps.any() else 1.0
+        return {
+            "streams": streams,
+            "fairness_jain": jain,
+            "detect": self.detect_batcher.stats(),
+            "classify": self.crop_batcher.stats()
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from .detector import build_detector
+    from .handmodel import build_team_classifier
+
+    ap = argparse.ArgumentParser(description="RUT-FUT-AI: несколько видеопотоков на общих моделях")
+    ap.add_argument("player_weights")
+    ap.add_argument("videos", nargs="+")
+    ap.add_argument("--team-model", required=True, help="обученная модель команд (save())")
+    ap.add_argument("--team-backend", default="siglip", help="siglip | hist")
+    ap.add_argument("--detector", default="yolo", help="yolo | onnx")
+    ap.add_argument("--device", default=None)
+    ap.add_argument("--max-batch", type=int, default=SERVER_MAX_BATCH)
+    ap.add_argument("--max-latency-ms", type=float, default=SERVER_MAX_LATENCY_MS)
+    ap.add_argument("--slo-ms", type=float, default=SERVER_SLO_MS)
+    ap.add_argument("--realtime", action="store_true", help="подавать кадры с частотой видео")
+    args = ap.parse_args()
+
+    clf = build_team_classifier(args.team_backend, device=args.device).load(args.team_model)
+    server = MultiStreamServer(build_detector(args.detector, args.player_weights, args.device), clf,
+                               max_batch=args.max_batch, max_latency_ms=args.max_latency_ms,
+                               slo_ms=args.slo_ms)
+    for i, path in enumerate(args.videos):
+        server.add_stream(f"{i}:{Path(path).name}", FileSource(path, realtime=args.realtime))
+    print(json.dumps(asyncio.run(server.run()), indent=2))
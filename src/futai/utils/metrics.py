@@ -0,0 +1,224 @@
+"""
+Метрики горячего пути: таймеры стадий, счётчики на кадр, скользящие гистограммы.
+
+    metrics = Metrics()
+    metrics.add_callback(JsonLinesSink("metrics.jsonl"))        # строка на кадр
+    metrics.add_callback(PrometheusFileSink(metrics, "futai.prom"))  # textfile collector
+    proc = TeamVideoProcessor(..., metrics=metrics)
+
+Кадр собирается из stage()/observe()/count() и закрывается end_frame():
+запись кадра уходит во все callback'и. Без metrics везде стоит NULL_METRICS —
+stage() отдаёт один и тот же nullcontext, остальное — пустые методы.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+
+from src.futai.constants import METRICS_WINDOW, METRICS_BUCKETS_S, METRICS_EXPORT_EVERY
+
+FrameCallback = Callable[[dict[str, Any]], None]
+
+
+class Metrics:
+    """
+    Таймеры и счётчики по кадрам.
+      - stage(name)          — контекст-таймер стадии (за кадр время суммируется)
+      - observe(name, sec)   — время, измеренное снаружи (напр. доля батча детектора)
+      - count(name, n)       — счётчик кадра: detections, tracks, crops_embedded, ...
+      - end_frame(frame_idx) — закрыть кадр, обновить гистограммы, позвать callback'и
+    Стадия "frame" — сумма всех стадий кадра (латентность кадра без ожидания в очередях).
+    """
+
+    enabled = True
+
+    def __init__(self, window: int = METRICS_WINDOW,
+                 buckets: tuple[float, ...] = METRICS_BUCKETS_S):
+        self.window = window
+        self.buckets = np.asarray(sorted(buckets), dtype=float)
+        self._lock = threading.Lock()
+        self._callbacks: list[FrameCallback] = []
+        # текущий (незакрытый) кадр
+        self._stages: dict[str, float] = {}
+        self._counts: Counter = Counter()
+        # накопленное: скользящее окно, кумулятивные бакеты, суммы
+        self._recent: dict[str, deque] = {}
+        self._hist: dict[str, np.ndarray] = {}
+        self._sum: dict[str, float] = {}
+        self._n: Counter = Counter()
+        self.totals: Counter = Counter()
+        self.frames = 0
+        self.last: dict[str, Any] | None = None
+
+    # сбор
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def observe(self, name: str, seconds: float) -> None:
+        self._stages[name] = self._stages.get(name, 0.0) + seconds
+
+    def count(self, name: str, n: int = 1) -> None:
+        self._counts[name] += int(n)
+
+    def add_callback(self, fn: FrameCallback) -> FrameCallback:
+        """fn(record) после каждого кадра. Возвращает fn (можно как декоратор)."""
+        self._callbacks.append(fn)
+        return fn
+
+    def end_frame(self, frame_idx: int) -> dict[str, Any]:
+        stages, counts = self._stages, dict(self._counts)
+        stages["frame"] = sum(stages.values())
+        self._stages, self._counts = {}, Counter()
+        record = {
+            "frame": int(frame_idx),
+            "time": time.time(),
+            "stages_ms": {k: v * 1e3 for k, v in stages.items()},
+            "counts": counts
+        }
+        with self._lock:
+            for name, sec in stages.items():
+                if name not in self._recent:
+                    self._recent[name] = deque(maxlen=self.window)
+                    self._hist[name] = np.zeros(len(self.buckets) + 1, dtype=np.int64)
+                    self._sum[name] = 0.0
+                self._recent[name].append(sec)
+                # бакет le: первая граница >= sec (последний — +Inf)
+                self._hist[name][np.searchsorted(self.buckets, sec)] += 1
+                self._sum[name] += sec
+                self._n[name] += 1
+            self.totals.update(counts)
+            self.frames += 1
+            self.last = record
+        for fn in self._callbacks:
+            fn(record)
+        return record
+
+    # чтение
+    def histogram(self, name: str) -> dict[str, list]:
+        """Скользящая гистограмма стадии за последние window кадров (не кумулятивная)."""
+        with self._lock:
+            recent = np.asarray(self._recent.get(name, ()), dtype=float)
+        counts = np.bincount(np.searchsorted(self.buckets, recent),
+                             minlength=len(self.buckets) + 1)
+        return {"le": [*self.buckets.tolist(), float("inf")], "counts": counts.tolist()}
+
+    def summary(self) -> dict[str, Any]:
+        """Квантили по окну + итоговые счётчики: для stats() / логов."""
+        with self._lock:
+            recent = {k: np.asarray(v, dtype=float) for k, v in self._recent.items()}
+            n, totals, frames = dict(self._n), dict(self.totals), self.frames
+        stages = {}
+        for name, s in recent.items():  # в окне всегда есть хотя бы один замер
+            p50, p95, p99 = np.percentile(s, [50, 95, 99]) * 1e3
+            stages[name] = {
+                "count": n[name],
+                "mean_ms": float(s.mean() * 1e3),
+                "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99),
+                "max_ms": float(s.max() * 1e3)
+            }
+        return {"frames": frames, "counts": totals, "stages": stages}
+
+    def to_prometheus(self, prefix: str = "futai") -> str:
+        """Текстовый формат Prometheus: счётчики, кумулятивная гистограмма, квантили окна."""
+        with self._lock:
+            hist = {k: v.copy() for k, v in self._hist.items()}
+            sums, n = dict(self._sum), dict(self._n)
+            totals, frames = dict(self.totals), self.frames
+            recent = {k: np.asarray(v, dtype=float) for k, v in self._recent.items()}
+
+        lines = [f"# TYPE {prefix}_frames_total counter", f"{prefix}_frames_total {frames}"]
+        for name, value in sorted(totals.items()):
+            lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {value}"]
+
+        lines.append(f"# TYPE {prefix}_stage_seconds histogram")
+        for name in sorted(hist):
+            cum = np.cumsum(hist[name])
+            for le, c in zip([*self.buckets.tolist(), "+Inf"], cum):
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="{le}"}} {c}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {sums[name]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {n[name]}')
+
+        lines.append(f"# TYPE {prefix}_stage_window_seconds gauge")
+        for name in sorted(recent):
+            for q, v in zip((0.5, 0.95, 0.99), np.percentile(recent[name], [50, 95, 99])):
+                lines.append(f'{prefix}_stage_window_seconds{{stage="{name}",quantile="{q}"}} {v:.6f}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str | Path, prefix: str = "futai") -> None:
+        """Атомарно переписать файл (node_exporter не увидит недописанный)."""
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(self.to_prometheus(prefix))
+        os.replace(tmp, path)
+
+
+class NullMetrics:
+    """Заглушка с тем же API: ничего не меряет и не хранит."""
+
+    enabled = False
+    _null = nullcontext()
+
+    def stage(self, name: str):
+        return self._null
+
+    def observe(self, name: str, seconds: float) -> None:
+        pass
+
+    def count(self, name: str, n: int = 1) -> None:
+        pass
+
+    def add_callback(self, fn: FrameCallback) -> FrameCallback:
+        return fn
+
+    def end_frame(self, frame_idx: int) -> None:
+        return None
+
+    def summary(self) -> dict[str, Any]:
+        return {}
+
+
+NULL_METRICS = NullMetrics()
+
+
+class JsonLinesSink:
+    """Callback: одна JSON-строка на кадр."""
+
+    def __init__(self, path: str | Path):
+        self._f = open(path, "a", buffering=1)  # построчная буферизация
+
+    def __call__(self, record: dict[str, Any]) -> None:
+        self._f.write(json.dumps(record) + "\n")
+
+    def close(self) -> None:
+        self._f.close()
+
+
+class PrometheusFileSink:
+    """Callback: переписывает файл для textfile collector раз в every кадров."""
+
+    def __init__(self, metrics: Metrics, path: str | Path, every: int = METRICS_EXPORT_EVERY):
+        self.metrics = metrics
+        self.path = Path(path)
+        self.every = every
+        self._seen = 0
+
+    def __call__(self, record: dict[str, Any]) -> None:
+        self._seen += 1
+        if self._seen % self.every == 0:
+            self.metrics.write_prometheus(self.path)
+
+    def close(self) -> None:
+        self.metrics.write_prometheus(self.path)
@@ -0,0 +1,211 @@
+"""
+Траектории в координатах поля: потоковая запись кусками .npy + чтение через memmap.
+
+Каталог хранилища:
+    chunk_00000.npy, chunk_00001.npy, ...  — структурные массивы TRAJECTORY_DTYPE,
+                                             строки по возрастанию frame
+    index.json                             — по каждому куску: диапазон кадров
+                                             и список tracker_id
+
+Читатель открывает только нужные куски (np.load(mmap_mode="r")), поэтому
+окно по времени или один трек не требуют загрузки всего матча.
+"""
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import supervision as sv
+
+from src.futai.constants import BALL_CLASS_ID, TRAJECTORY_CHUNK_ROWS
+
+# одна строка = один объект на одном кадре
+TRAJECTORY_DTYPE = np.dtype([
+    ("frame", np.int32),
+    ("tracker_id", np.int32),  # -1 у мяча (его не трекаем)
+    ("role", np.int8),  # BALL / GK / PLAYER / REFEREE_CLASS_ID
+    ("team", np.int8),  # 0/1, 2 — судья, -1 — мяч
+    ("x1", np.float32), ("y1", np.float32),  # бокс на кадре, px
+    ("x2", np.float32), ("y2", np.float32),
+    ("px", np.float32), ("py", np.float32),  # точка на поле, см (NaN — нет гомографии)
+    ("confidence", np.float32),
+])
+INDEX_NAME = "index.json"
+
+
+def detections_to_rows(frame_idx: int, ball_det: sv.Detections, all_det: sv.Detections,
+                       proj: dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Кадр конвейера -> строки TRAJECTORY_DTYPE.
+    all_det — как из TeamVideoProcessor._track: class_id = команда, data["role"] = роль.
+    proj — ответ PitchProjector.project с ключами "ball" и "player".
+    """
+    n_ball, n_all = len(ball_det), len(all_det)
+    rows = np.zeros(n_ball + n_all, dtype=TRAJECTORY_DTYPE)
+    rows["frame"] = frame_idx
+
+    def _fill(sl: slice, det: sv.Detections, xy: np.ndarray) -> None:
+        rows["x1"][sl], rows["y1"][sl] = det.xyxy[:, 0], det.xyxy[:, 1]
+        rows["x2"][sl], rows["y2"][sl] = det.xyxy[:, 2], det.xyxy[:, 3]
+        rows["confidence"][sl] = det.confidence if det.confidence is not None else np.nan
+        if len(xy) == len(det):
+            rows["px"][sl], rows["py"][sl] = xy[:, 0], xy[:, 1]
+        else:  # гомография не нашлась
+            rows["px"][sl] = rows["py"][sl] = np.nan
+
+    ball = slice(0, n_ball)
+    rows["tracker_id"][ball] = -1
+    rows["role"][ball] = BALL_CLASS_ID
+    rows["team"][ball] = -1
+    _fill(ball, ball_det, proj.get("ball", np.empty((0, 2))))
+
+    rest = slice(n_ball, None)
+    if n_all:
+        rows["tracker_id"][rest] = all_det.tracker_id
+        rows["role"][rest] = all_det.data.get("role", np.full(n_all, -1))
+        rows["team"][rest] = all_det.class_id
+        _fill(rest, all_det, proj.get("player", np.empty((0, 2))))
+    return rows
+
+
+def rows_to_detections(rows: np.ndarray) -> tuple[sv.Detections, sv.Detections, dict[str, np.ndarray]]:
+    """
+    Обратно к detections_to_rows для строк одного кадра: (мяч, все остальные, proj).
+    Если у кого-то нет точки на поле (NaN) — proj["player"] пустой, как у PitchProjector.
+    """
+    def _det(r: np.ndarray) -> sv.Detections:
+        if not len(r):
+            return sv.Detections.empty()
+        return sv.Detections(
+            xyxy=np.stack([r["x1"], r["y1"], r["x2"], r["y2"]], axis=1).astype(np.float32),
+            confidence=r["confidence"].astype(np.float32),
+            class_id=r["team"].astype(int),
+            tracker_id=r["tracker_id"].astype(int),
+            data={"role": r["role"].astype(int)}
+        )
+
+    def _xy(r: np.ndarray) -> np.ndarray:
+        xy = np.stack([r["px"], r["py"]], axis=1).astype(float)
+        return xy if np.isfinite(xy).all() else np.empty((0, 2))
+
+    is_ball = rows["role"] == BALL_CLASS_ID
+    ball, rest = rows[is_ball], rows[~is_ball]
+    ball_det = _det(ball)
+    ball_det.tracker_id = None  # мяч не трекаем
+    return ball_det, _det(rest), {"ball": _xy(ball), "player": _xy(rest)}
+
+
+class TrajectoryWriter:
+    """
+    Копит строки в памяти и сбрасывает кусок на диск каждые chunk_rows строк.
+    index.json переписывается после каждого куска — недописанный матч читается.
+    """
+
+    def __init__(self, root: str | Path, chunk_rows: int = TRAJECTORY_CHUNK_ROWS):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.chunk_rows = chunk_rows
+        self._pending: list[np.ndarray] = []
+        self._n_pending = 0
+        self._chunks: list[dict] = []
+
+    def append(self, frame_idx: int, ball_det: sv.Detections, all_det: sv.Detections,
+               proj: dict[str, np.ndarray]) -> None:
+        self.append_rows(detections_to_rows(frame_idx, ball_det, all_det, proj))
+
+    def append_rows(self, rows: np.ndarray) -> None:
+        if not len(rows):
+            return
+        self._pending.append(rows.astype(TRAJECTORY_DTYPE, copy=False))
+        self._n_pending += len(rows)
+        if self._n_pending >= self.chunk_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        """Записать накопленное отдельным куском и обновить индекс."""
+        if not self._n_pending:
+            return
+        rows = np.concatenate(self._pending)
+        # по кадрам: append идёт по порядку, но сортировка стабильна и дёшева
+        rows = rows[np.argsort(rows["frame"], kind="stable")]
+        name = f"chunk_{len(self._chunks):05d}.npy"
+        np.save(self.root / name, rows)
+        self._chunks.append({
+            "file": name,
+            "rows": int(len(rows)),
+            "frame_min": int(rows["frame"][0]),
+            "frame_max": int(rows["frame"][-1]),
+            "tracker_ids": np.unique(rows["tracker_id"]).tolist()
+        })
+        self._pending, self._n_pending = [], 0
+        self._write_index()
+
+    def _write_index(self) -> None:
+        tmp = self.root / (INDEX_NAME + ".tmp")
+        tmp.write_text(json.dumps({"dtype": TRAJECTORY_DTYPE.descr, "chunks": self._chunks}))
+        os.replace(tmp, self.root / INDEX_NAME)
+
+    def close(self) -> None:
+        self.flush()
+        self._write_index()
+
+    def __enter__(self) -> "TrajectoryWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class TrajectoryReader:
+    """Чтение хранилища TrajectoryWriter: окно кадров или один трек через memmap."""
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        index = json.loads((self.root / INDEX_NAME).read_text())
+        self.chunks: list[dict] = index["chunks"]
+
+    def __len__(self) -> int:
+        return sum(c["rows"] for c in self.chunks)
+
+    @property
+    def frame_range(self) -> tuple[int, int]:
+        """(первый кадр, последний кадр + 1)."""
+        if not self.chunks:
+            return 0, 0
+        return (min(c["frame_min"] for c in self.chunks),
+                max(c["frame_max"] for c in self.chunks) + 1)
+
+    def tracker_ids(self) -> np.ndarray:
+        ids = [tid for c in self.chunks for tid in c["tracker_ids"]]
+        return np.unique(np.asarray(ids, dtype=np.int64))
+
+    def _load(self, chunk: dict) -> np.ndarray:
+        return np.load(self.root / chunk["file"], mmap_mode="r")
+
+    def iter_chunks(self) -> Iterator[np.ndarray]:
+        for chunk in self.chunks:
+            yield self._load(chunk)
+
+    def window(self, start: int, end: int) -> np.ndarray:
+        """Все строки с start <= frame < end."""
+        parts = []
+        for chunk in self.chunks:
+            if chunk["frame_max"] < start or chunk["frame_min"] >= end:
+                continue
+            rows = self._load(chunk)
+            # строки отсортированы по frame — бинпоиск читает только нужные страницы
+            lo, hi = np.searchsorted(rows["frame"], [start, end])
+            parts.append(np.array(rows[lo:hi]))
+        return np.concatenate(parts) if parts else np.empty(0, TRAJECTORY_DTYPE)
+
+    def track(self, tracker_id: int) -> np.ndarray:
+        """Все строки одного трека (только из кусков, где он встречается)."""
+        parts = [
+            np.array(rows[rows["tracker_id"] == tracker_id])
+            for chunk in self.chunks if tracker_id in chunk["tracker_ids"]
+            for rows in [self._load(chunk)]
+        ]
+        return np.concatenate(parts) if parts else np.empty(0, TRAJECTORY_DTYPE)
@@ -0,0 +1,432 @@
+"""
+Видео с произвольным доступом: индекс кадров, seek, выборка с шагом,
+декодирование в уменьшенном разрешении и потоковая запись.
+
+  - VideoIndex  — pts и ключевые кадры всех кадров ролика. Строится один раз
+                  демуксом (пакеты без декодирования, PyAV) и кладётся рядом
+                  с видео (<video>.futai-index.npz); без PyAV — только
+                  метаданные контейнера (кол-во кадров, fps)
+  - VideoSource — кадры [start, end) с шагом stride: до далёкого кадра не
+                  декодируем всё подряд, а прыгаем на ближайший ключевой
+                  кадр перед ним; size=(w, h) — кадры сразу в уменьшенном
+                  разрешении (один проход swscale вместо bgr24 + cv2.resize),
+                  pairs() — полный кадр для рендера + маленький для детекции
+  - VideoWriter — кадры в энкодер по мере поступления (H.264 через PyAV,
+                  без него — mp4v через cv2.VideoWriter, как sv.VideoSink)
+
+Окно в 5 минут из 90-минутного файла стоит индекса (один раз) + декодирования
+от ключевого кадра перед окном, а не всего, что до него.
+PyAV — необязательная зависимость (pip install av, extras "video").
+"""
+from __future__ import annotations
+
+import importlib.util
+from dataclasses import dataclass
+from fractions import Fraction
+from pathlib import Path
+from typing import Any, Iterator
+
+import cv2
+import numpy as np
+import supervision as sv
+
+from src.futai.constants import (
+    VIDEO_INDEX_SUFFIX,
+    VIDEO_SEEK_MIN_GAP,
+    VIDEO_CODEC,
+    VIDEO_CRF,
+    VIDEO_PRESET,
+    VIDEO_FALLBACK_FOURCC
+)
+
+
+def _has_av() -> bool:
+    return importlib.util.find_spec("av") is not None
+
+
+@dataclass(slots=True)
+class VideoIndex:
+    """
+    pts — pts кадров в порядке показа (пусто без PyAV), keyframes — номера
+    ключевых кадров (пусто — неизвестны). size / mtime_ns — чтобы не взять
+    индекс от другого файла с тем же именем.
+    """
+    size: int
+    mtime_ns: int
+    fps: float
+    width: int
+    height: int
+    total_frames: int
+    time_base: float
+    pts: np.ndarray
+    keyframes: np.ndarray
+
+    @classmethod
+    def build(cls, path: str | Path) -> "VideoIndex":
+        path = Path(path)
+        st = path.stat()
+        if not _has_av():
+            cap = cv2.VideoCapture(str(path))
+            try:
+                return cls(st.st_size, st.st_mtime_ns, cap.get(cv2.CAP_PROP_FPS) or 25.0,
+                           int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                           int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 0.0,
+                           np.empty(0, np.int64), np.empty(0, np.int64))
+            finally:
+                cap.release()
+
+        import av
+        with av.open(str(path)) as container:
+            stream = container.streams.video[0]
+            pts, key = [], []
+            for packet in container.demux(stream):  # только пакеты — без декодирования
+                if packet.pts is not None and packet.size:
+                    pts.append(packet.pts)
+                    key.append(packet.is_keyframe)
+            # пакеты идут в порядке декодирования (B-кадры), номер кадра — ранг pts
+            order = np.argsort(pts, kind="stable")
+            pts = np.asarray(pts, dtype=np.int64)[order]
+            keyframes = np.flatnonzero(np.asarray(key, dtype=bool)[order])
+            fps = float(stream.average_rate or stream.guessed_rate or 25)
+            return cls(st.st_size, st.st_mtime_ns, fps, stream.codec_context.width,
+                       stream.codec_context.height, len(pts), float(stream.time_base), pts, keyframes)
+
+    @property
+    def exact(self) -> bool:
+        """Есть pts и ключевые кадры (индекс от PyAV), а не только метаданные."""
+        return len(self.pts) > 0
+
+    def save(self, path: str | Path) -> None:
+        np.savez(path, pts=self.pts, keyframes=self.keyframes,
+                 meta=np.array([self.size, self.mtime_ns, self.width, self.height, self.total_frames]),
+                 rates=np.array([self.fps, self.time_base]))
+
+    @classmethod
+    def load(cls, path: str | Path) -> "VideoIndex":
+        with np.load(path) as z:
+            size, mtime_ns, width, height, total = (int(v) for v in z["meta"])
+            fps, time_base = (float(v) for v in z["rates"])
+            return cls(size, mtime_ns, fps, width, height, total, time_base, z["pts"], z["keyframes"])
+
+    def matches(self, path: str | Path) -> bool:
+        st = Path(path).stat()
+        return (self.size, self.mtime_ns) == (st.st_size, st.st_mtime_ns)
+
+    def time_of(self, idx: int) -> float:
+        """Время кадра idx, секунды от начала ролика."""
+        if self.exact:
+            return float(self.pts[idx] - self.pts[0]) * self.time_base
+        return idx / self.fps
+
+    def frame_at(self, seconds: float) -> int:
+        """Первый кадр не раньше seconds."""
+        if self.exact:
+            t = (self.pts - self.pts[0]) * self.time_base
+            return int(np.searchsorted(t, seconds - 1e-9))
+        return int(np.ceil(seconds * self.fps - 1e-9))
+
+    def keyframe_before(self, idx: int) -> int:
+        """Последний ключевой кадр <= idx (0, если ключевые кадры неизвестны)."""
+        if not len(self.keyframes):
+            return 0
+        i = int(np.searchsorted(self.keyframes, idx, side="right")) - 1
+        return int(self.keyframes[max(i, 0)])
+
+
+def load_index(path: str | Path, cache: bool = True) -> VideoIndex:
+    """
+    Индекс из файла рядом с видео, если он от этого же файла; иначе строим
+    и (cache=True) пробуем сохранить. Каталог только на чтение — не беда.
+    """
+    path = Path(path)
+    sidecar = path.with_name(path.name + VIDEO_INDEX_SUFFIX)
+    if cache and sidecar.exists():
+        try:
+            index = VideoIndex.load(sidecar)
+            if index.matches(path):
+                return index
+        except (OSError, KeyError, ValueError):
+            pass  # битый / старый файл — просто перестроим
+    index = VideoIndex.build(path)
+    if cache and index.exact:
+        try:
+            tmp = sidecar.with_name(sidecar.name + ".tmp.npz")
+            index.save(tmp)
+            tmp.replace(sidecar)
+        except OSError:
+            pass
+    return index
+
+
+class _CV2Reader:
+    """cv2.VideoCapture: seek через CAP_PROP_POS_FRAMES, пропуск — grab() без retrieve."""
+
+    def __init__(self, path: Path, index: VideoIndex):
+        self.cap = cv2.VideoCapture(str(path))
+        self.pos = 0  # номер кадра, который вернёт следующий read()
+
+    def seek(self, idx: int) -> None:
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+        self.pos = idx
+
+    def skip(self) -> bool:
+        self.pos += 1
+        return self.cap.grab()
+
+    def read(self) -> np.ndarray | None:
+        ok, frame = self.cap.read()
+        self.pos += 1
+        return frame if ok else None
+
+    @staticmethod
+    def convert(frame: np.ndarray, size: tuple[int, int] | None) -> np.ndarray:
+        if size is None or (frame.shape[1], frame.shape[0]) == size:
+            return frame
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+    def close(self) -> None:
+        self.cap.release()
+
+
+class _AVReader:
+    """
+    PyAV: seek на ключевой кадр по pts, номер кадра после seek — по pts
+    первого декодированного кадра. read() отдаёт av.VideoFrame, перевод в
+    BGR (и уменьшение) — в convert(), только для нужных кадров.
+    """
+
+    def __init__(self, path: Path, index: VideoIndex):
+        import av
+        from av.video.reformatter import VideoReformatter
+
+        self.container = av.open(str(path))
+        # один контекст swscale на ролик: frame.to_ndarray / reformat создают его на каждый кадр
+        self._reformatter = VideoReformatter()
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = "AUTO"  # кадровые потоки декодера
+        self.pts = index.pts
+        self._frames = self.container.decode(self.stream)
+        self._next = None
+        self.pos = 0
+
+    def _peek(self):
+        if self._next is None:
+            self._next = next(self._frames, None)
+            if self._next is not None and self._next.pts is not None:
+                self.pos = int(np.searchsorted(self.pts, self._next.pts))
+        return self._next
+
+    def seek(self, idx: int) -> None:
+        self.container.seek(int(self.pts[idx]), stream=self.stream, backward=True, any_frame=False)
+        self._frames = self.container.decode(self.stream)
+        self._next = None
+        self._peek()
+
+    def skip(self) -> bool:
+        ok = self._peek() is not None
+        self._next = None
+        self.pos += 1
+        return ok
+
+    def read(self):
+        frame = self._peek()
+        self._next = None
+        self.pos += 1
+        return frame
+
+    def convert(self, frame, size: tuple[int, int] | None) -> np.ndarray:
+        width, height = size or (None, None)
+        return self._reformatter.reformat(frame, width=width, height=height, format="bgr24",
+                                          interpolation="BILINEAR").to_ndarray()
+
+    def close(self) -> None:
+        self.container.close()
+
+
+class VideoSource:
+    """
+    Кадры ролика с произвольным доступом.
+    size=(w, h) — разрешение отдаваемых кадров (None — как в файле).
+    backend: "auto" (PyAV, если есть, иначе cv2) | "av" | "cv2".
+    """
+
+    def __init__(self, path: str | Path, size: tuple[int, int] | None = None,
+                 backend: str = "auto", cache_index: bool = True):
+        self.path = Path(path)
+        self.size = size
+        if backend == "auto":
+            backend = "av" if _has_av() else "cv2"
+        if backend not in {"av", "cv2"}:
+            raise ValueError(f"Unknown video backend: {backend!r}")
+        self.index = load_index(self.path, cache_index)
+        if backend == "av" and not self.index.exact:
+            backend = "cv2"  # pts нет — seek по pts невозможен
+        self.backend = backend
+        self._reader = None
+        # decoded — кадры, отданные наружу; skipped — декодированы впустую; seeks — прыжки
+        self.decoded = self.skipped = self.seeks = 0
+
+    @property
+    def info(self) -> sv.VideoInfo:
+        """VideoInfo исходного разрешения — для VideoWriter / sv.VideoSink."""
+        return sv.VideoInfo(width=self.index.width, height=self.index.height,
+                            fps=self.index.fps, total_frames=self.index.total_frames)
+
+    def __len__(self) -> int:
+        return self.index.total_frames
+
+    def window(self, start_s: float = 0.0, end_s: float | None = None) -> tuple[int, int]:
+        """Секунды -> диапазон кадров [start, end) для frames()."""
+        end = len(self) if end_s is None else min(self.index.frame_at(end_s), len(self))
+        return self.index.frame_at(start_s), end
+
+    def frames(self, start: int = 0, end: int | None = None, stride: int = 1,
+               size: tuple[int, int] | None = None) -> Iterator[np.ndarray]:
+        """Кадры start, start + stride, ... < end (как sv.get_video_frames_generator)."""
+        for _, frame in self.indexed(start, end, stride, size):
+            yield frame
+
+    def indexed(self, start: int = 0, end: int | None = None, stride: int = 1,
+                size: tuple[int, int] | None = None) -> Iterator[tuple[int, np.ndarray]]:
+        """(номер кадра, кадр) — то же, что frames(), но с номерами."""
+        size = size or self.size
+        for idx, raw in self._raw(start, end, stride):
+            yield idx, self._reader.convert(raw, size)
+
+    def pairs(self, size: tuple[int, int], start: int = 0, end: int | None = None,
+              stride: int = 1) -> Iterator[tuple[int, np.ndarray, np.ndarray]]:
+        """(номер, полный кадр, кадр size) — один декод на оба: рендер + детекция."""
+        for idx, raw in self._raw(start, end, stride):
+            yield idx, self._reader.convert(raw, None), self._reader.convert(raw, size)
+
+    def read(self, idx: int, size: tuple[int, int] | None = None) -> np.ndarray | None:
+        """Один кадр по номеру (None — за концом ролика)."""
+        return next(self.frames(idx, idx + 1, size=size), None)
+
+    def _raw(self, start: int, end: int | None, stride: int) -> Iterator[tuple[int, Any]]:
+        end = len(self) if end is None else min(end, len(self))
+        reader = self._open()
+        for target in range(max(start, 0), end, max(stride, 1)):
+            if reader.pos != target:
+                if self._should_seek(reader.pos, target):
+                    reader.seek(target)
+                    self.seeks += 1
+                while reader.pos < target:
+                    if not reader.skip():
+                        return
+                    self.skipped += 1
+            raw = reader.read()
+            if raw is None:
+                return
+            self.decoded += 1
+            yield target, raw
+
+    def _should_seek(self, pos: int, target: int) -> bool:
+        if target < pos:
+            return True
+        if self.index.exact:
+            # между текущей позицией и целью есть ключевой кадр — с него декодировать дешевле
+            return self.index.keyframe_before(target) > pos
+        return target - pos > VIDEO_SEEK_MIN_GAP
+
+    def _open(self):
+        if self._reader is None:
+            cls = _AVReader if self.backend == "av" else _CV2Reader
+            self._reader = cls(self.path, self.index)
+        return self._reader
+
+    def stats(self) -> dict[str, Any]:
+        return {"backend": self.backend, "decoded": self.decoded,
+                "skipped": self.skipped, "seeks": self.seeks}
+
+    def close(self) -> None:
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def __enter__(self) -> "VideoSource":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class VideoWriter:
+    """
+    Потоковая запись кадров: write_frame(frame) как у sv.VideoSink, размер —
+    по первому кадру. PyAV + VIDEO_CODEC (H.264, crf / preset из constants),
+    без PyAV или без кодека — cv2.VideoWriter с VIDEO_FALLBACK_FOURCC.
+    gop — ключевой кадр не реже раза в столько кадров (None — как решит
+    энкодер); чем он меньше, тем дешевле seek в VideoSource. На cv2 не влияет.
+    """
+
+    def __init__(self, path: str | Path, fps: float, codec: str = VIDEO_CODEC,
+                 crf: int = VIDEO_CRF, gop: int | None = None, backend: str = "auto"):
+        self.path = Path(path)
+        self.fps = fps
+        self.codec = codec
+        self.crf = crf
+        self.gop = gop
+        if backend == "auto":
+            backend = "av" if _has_av() else "cv2"
+        if backend == "av":
+            import av
+            if codec not in av.codecs_available:
+                backend = "cv2"
+        self.backend = backend
+        self.frames = 0
+        self._out = self._stream = None
+        self._size: tuple[int, int] | None = None
+
+    def _open(self, width: int, height: int) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.backend == "cv2":
+            self._size = (width, height)
+            self._out = cv2.VideoWriter(str(self.path), cv2.VideoWriter_fourcc(*VIDEO_FALLBACK_FOURCC),
+                                        self.fps, self._size)
+            return
+        import av
+
+        # yuv420p требует чётных сторон — нечётный кадр дополняем краем
+        self._size = (width + width % 2, height + height % 2)
+        self._out = av.open(str(self.path), "w")
+        self._stream = self._out.add_stream(self.codec, rate=Fraction(self.fps).limit_denominator(1001),
+                                            options={"crf": str(self.crf), "preset": VIDEO_PRESET})
+        self._stream.width, self._stream.height = self._size
+        self._stream.pix_fmt = "yuv420p"
+        self._stream.thread_type = "AUTO"
+        if self.gop:
+            self._stream.codec_context.gop_size = int(self.gop)
+
+    def write_frame(self, frame: np.ndarray) -> None:
+        if self._out is None:
+            self._open(frame.shape[1], frame.shape[0])
+        w, h = self._size
+        if (frame.shape[1], frame.shape[0]) != (w, h):
+            frame = cv2.copyMakeBorder(frame, 0, max(h - frame.shape[0], 0), 0, max(w - frame.shape[1], 0),
+                                       cv2.BORDER_REPLICATE)[:h, :w]
+        self.frames += 1
+        if self.backend == "cv2":
+            self._out.write(frame)
+            return
+        import av
+
+        for packet in self._stream.encode(av.VideoFrame.from_ndarray(frame, format="bgr24")):
+            self._out.mux(packet)
+
+    def close(self) -> None:
+        if self._out is None:
+            return
+        if self.backend == "cv2":
+            self._out.release()
+        else:
+            for packet in self._stream.encode():  # дописываем хвост энкодера
+                self._out.mux(packet)
+            self._out.close()
+        self._out = None
+
+    def __enter__(self) -> "VideoWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
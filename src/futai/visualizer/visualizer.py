@@ -1,53 +1,175 @@
 """
 Visualizer — вывод кадра / радара / диаграмм Вороного.
+
+Все методы рисуют в BGR-буфер (переданный out или свой переиспользуемый) и
+возвращают его; headless=True — без sv.plot_image, кадры идут сразу в VideoWriter.
+Переиспользуемый буфер перезаписывается следующим вызовом — кому нужно
+хранить кадр, передаёт свой out.
+
+  - draw_radar — радар в любом масштабе (в т.ч. сразу в вырез другого кадра)
+  - Compositor — кадр с аннотациями + радар-вставка за один проход по out
+  - BufferRing — n буферов по кругу для кадров, которые уходят в очередь
 """
 from __future__ import annotations
 import numpy as np, supervision as sv
+from ..constants import (
+    COLOR_PALETTE_HEX,
+    FIELD_SCALE,
+    FIELD_PADDING,
+    RADAR_INSET_WIDTH,
+    RADAR_INSET_MARGIN
+)
+from ..detector.annotation import annotate_frame
 from ..pitch.config import SoccerPitchConfiguration as CFG
 from ..pitch.draw import PitchDrawer as PD
+from ..pitch.voronoi import VoronoiEngine
+
+_PALETTE = [sv.Color.from_hex(c) for c in COLOR_PALETTE_HEX]
+
+
+def _buffer(buf: np.ndarray | None, shape: tuple, dtype=np.uint8) -> np.ndarray:
+    # старый буфер, если подходит по форме, иначе новый
+    if buf is None or buf.shape != tuple(shape) or buf.dtype != dtype:
+        return np.empty(shape, dtype)
+    return buf
+
+
+def radar_shape(cfg: CFG, scale: float = FIELD_SCALE, padding: int = FIELD_PADDING) -> tuple[int, int, int]:
+    """(h, w, 3) радара — как у PD.draw_pitch с теми же scale / padding."""
+    return (PD._s(cfg.width, scale) + 2 * padding,
+            PD._s(cfg.length, scale) + 2 * padding, 3)
+
+
+def draw_radar(cfg: CFG, ball_xy: np.ndarray, pl_xy: np.ndarray, team_flag: np.ndarray,
+               out: np.ndarray | None = None, scale: float = FIELD_SCALE,
+               padding: int = FIELD_PADDING) -> np.ndarray:
+    """
+    Радар: мяч, две команды и судьи (team_flag == 2) в out формы radar_shape.
+    out может быть вырезом (view) другого кадра. Линии и кружки масштабируются
+    вместе с полем: при scale == FIELD_SCALE — ровно прежний радар.
+    """
+    k = scale / FIELD_SCALE
+    th = max(1, round(2 * k))
+    img = PD.draw_pitch(cfg, padding=padding, line_thickness=max(1, round(4 * k)),
+                        scale=scale, out=out)
+    img = PD.draw_points_on_pitch(cfg, ball_xy, sv.Color.WHITE, sv.Color.BLACK,
+                                  max(2, round(10 * k)), th, padding, scale, img)
+    if len(pl_xy):  # гомография не нашлась -> рисуем пустое поле
+        for team in (0, 1, 2):  # 2 — судья (см. processor._track)
+            img = PD.draw_points_on_pitch(cfg, pl_xy[team_flag == team], _PALETTE[team],
+                                          sv.Color.BLACK, max(2, round(16 * k)), th,
+                                          padding, scale, img)
+    return img
+
+
+class BufferRing:
+    """
+    n буферов по кругу. Кадр, ушедший в очередь ёмкостью q, живёт, пока его не
+    запишет энкодер: хватает n = q + 2 (очередь + кадр в энкодере + рисуемый).
+    """
+
+    def __init__(self, n: int):
+        self._bufs: list[np.ndarray | None] = [None] * max(n, 1)
+        self._i = 0
+
+    def next(self, shape: tuple, dtype=np.uint8) -> np.ndarray:
+        buf = self._bufs[self._i] = _buffer(self._bufs[self._i], shape, dtype)
+        self._i = (self._i + 1) % len(self._bufs)
+        return buf
+
+
+class Compositor:
+    """
+    Кадр с аннотациями и радаром внизу по центру (ширина — inset_width от кадра).
+    compose() рисует аннотации прямо в out, а радар — сразу в нужном масштабе
+    в вырез out: без frame.copy(), промежуточного радара и cv2.resize.
+    """
+
+    def __init__(self, annotators: dict, frame_size: tuple[int, int], cfg: CFG | None = None,
+                 inset_width: float = RADAR_INSET_WIDTH, margin: int = RADAR_INSET_MARGIN):
+        self.annotators = annotators
+        self.cfg = cfg or CFG()
+        w, h = frame_size
+        full_h, full_w, _ = radar_shape(self.cfg)
+        # вставка влезает в кадр и по высоте (с отступом снизу)
+        k = min(inset_width * w / full_w, max(h - margin, 1) / full_h)
+        self.scale = FIELD_SCALE * k
+        self.padding = round(FIELD_PADDING * k)
+        ih, iw, _ = radar_shape(self.cfg, self.scale, self.padding)
+        x0, y0 = (w - iw) // 2, max(h - margin - ih, 0)
+        self.roi = (slice(y0, y0 + ih), slice(x0, x0 + iw))
+        self.frame_size = (w, h)
+        self._buf = None
+
+    def compose(self, frame: np.ndarray, ball_det: sv.Detections, all_det: sv.Detections,
+                proj: dict[str, np.ndarray], out: np.ndarray | None = None) -> np.ndarray:
+        """out=frame — прямо в кадр; out=None — в свой переиспользуемый буфер."""
+        if out is None:
+            out = self._buf = _buffer(self._buf, frame.shape)
+        annotate_frame(self.annotators, frame, ball_det, all_det, out=out)
+        draw_radar(self.cfg, proj["ball"], proj["player"], all_det.class_id,
+                   out=out[self.roi], scale=self.scale, padding=self.padding)
+        return out
 
 
 class Visualizer:
     def __init__(self, ellipse: sv.EllipseAnnotator,
                  triangle: sv.TriangleAnnotator,
-                 label: sv.LabelAnnotator):
+                 label: sv.LabelAnnotator,
+                 headless: bool = False):
         self.e, self.t, self.l = ellipse, triangle, label
         self.cfg = CFG()
+        self.headless = headless  # True — не показываем, только возвращаем буфер
+        # переиспользуемые буферы кадра, радара и Вороного — без аллокации на кадр
+        self._frame_buf = None
+        self._radar_buf = None
+        self._voronoi_buf = None
+        # состояние Вороного между кадрами — пересчитываются только сдвинувшиеся
+        self._voronoi = VoronoiEngine()
+
+    def _show(self, img: np.ndarray) -> np.ndarray:
+        if not self.headless:
+            sv.plot_image(img)
+        return img
 
-    # исходный кадр
-    def frame(self, frame, ball, others):
-        img = frame.copy()
-        img = self.t.annotate(img, ball)
+    # исходный кадр (out=frame — рисуем прямо в него)
+    def frame(self, frame, ball, others, out=None):
+        if out is None:
+            out = self._frame_buf = _buffer(self._frame_buf, frame.shape, frame.dtype)
+        if out is not frame:
+            np.copyto(out, frame)
+        img = self.t.annotate(out, ball)
         img = self.e.annotate(img, others)
         img = self.l.annotate(img, others,
                               [f"#{tid}" for tid in others.tracker_id])
-        sv.plot_image(img)
+        return self._show(img)
 
     # радар
-    def radar(self, ball_xy, pl_xy, team_flag, ref_xy=np.empty((0, 2))):
-        img = PD.draw_pitch(self.cfg)
-        img = PD.draw_points_on_pitch(self.cfg, ball_xy, sv.Color.WHITE,
-                                      sv.Color.BLACK, 10, pitch=img)
-        img = PD.draw_points_on_pitch(self.cfg, pl_xy[team_flag == 0],
-                                      sv.Color.from_hex("00BFFF"), sv.Color.BLACK, 16, pitch=img)
-        img = PD.draw_points_on_pitch(self.cfg, pl_xy[team_flag == 1],
-                                      sv.Color.from_hex("FF1493"), sv.Color.BLACK, 16, pitch=img)
-        sv.plot_image(img)
+    def radar(self, ball_xy, pl_xy, team_flag, ref_xy=np.empty((0, 2)), out=None):
+        if len(ref_xy):  # судьи — тем же радаром, флаг 2
+            pl_xy = np.vstack([np.reshape(pl_xy, (-1, 2)), ref_xy])
+            team_flag = np.concatenate([team_flag, np.full(len(ref_xy), 2)])
+        if out is None:
+            out = self._radar_buf = _buffer(self._radar_buf, radar_shape(self.cfg))
+        return self._show(draw_radar(self.cfg, ball_xy, pl_xy, team_flag, out=out))
 
     # blend диаграммы Воронного + точки
-    def voronoi_blend(self, pl_xy, team_flag, opacity=0.45):
+    def voronoi_blend(self, pl_xy, team_flag, opacity=0.45, out=None):
+        if out is None:
+            out = self._voronoi_buf = _buffer(self._voronoi_buf, radar_shape(self.cfg))
         img = PD.draw_pitch(self.cfg, background=sv.Color.WHITE,
-                            line_color=sv.Color.BLACK)
+                            line_color=sv.Color.BLACK, out=out)
         img = PD.draw_pitch_voronoi_diagram(self.cfg,
                                             pl_xy[team_flag == 0],
                                             pl_xy[team_flag == 1],
-                                            sv.Color.from_hex("00BFFF"),
-                                            sv.Color.from_hex("FF1493"),
-                                            opacity, pitch=img)
+                                            _PALETTE[0],
+                                            _PALETTE[1],
+                                            opacity, pitch=img, out=img,
+                                            engine=self._voronoi)
         img = PD.draw_points_on_pitch(self.cfg, pl_xy[team_flag == 0],
-                                      sv.Color.from_hex("00BFFF"),
-                                      sv.Color.WHITE, 16, 1, img)
+                                      _PALETTE[0],
+                                      sv.Color.WHITE, 16, 1, pitch=img)
         img = PD.draw_points_on_pitch(self.cfg, pl_xy[team_flag == 1],
-                                      sv.Color.from_hex("FF1493"),
-                                      sv.Color.WHITE, 16, 1, img)
-        sv.plot_image(img)
+                                      _PALETTE[1],
+                                      sv.Color.WHITE, 16, 1, pitch=img)
+        return self._show(img)